@@ -0,0 +1,378 @@
+"""
+Base Agent for API
+Shared Bedrock plumbing for the market research and risk assessment agents
+"""
+
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from .bedrock_client import get_bedrock_client
+from .bedrock_limiter import (AdaptiveConcurrencyLimiter, BedrockThrottledError, LimiterSlot, get_bedrock_limiter,
+                              is_throttling_error)
+from .bedrock_executor import BedrockExecutor, get_executor
+from .cache import MOCK_SOURCE, ResultCache, make_cache_key
+from .entities import get_registry
+from .metrics import BEDROCK_FIRST_TOKEN, BEDROCK_LATENCY, PARSE_LATENCY, record_cache_lookup
+from .prompts import PromptTemplate, token_usage
+from .retrieval import Passage, Retriever, format_context, get_retriever
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+AnalysisCall = Callable[[str, str], Dict[str, Any]]
+
+MOCK_STREAM_CHUNK_WORDS = 8
+
+
+class BedrockAgent:
+    """Bedrock client, executor and result cache handling shared by all agents
+
+    Subclasses provide prompt templates per analysis type, a response parser
+    and a deterministic mock, and route their public methods through
+    ``_run`` / ``_run_async``, which add caching and the fallback to mock mode.
+    """
+
+    agent_name = "agent"
+    display_name = "Agent"
+    default_analysis_type = "market"
+    templates: Dict[str, PromptTemplate] = {}
+    retrieval_query: Optional[str] = None  # Search text with {country}/{industry}; None never retrieves
+
+    def __init__(self, executor: Optional[BedrockExecutor] = None, cache: Optional[ResultCache] = None,
+                 bedrock_client: Optional[Any] = None, limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 retriever: Optional[Retriever] = None):
+        """
+        Args:
+            executor: Pool used for non-blocking model calls (defaults to the shared one)
+            cache: Result cache for model-backed analyses; None disables caching
+            bedrock_client: bedrock-runtime client (defaults to the shared pooled one)
+            limiter: Concurrency limit for model calls (defaults to the shared one)
+            retriever: Source of document context for prompts (defaults to the shared one, if configured)
+        """
+        self.model_id = DEFAULT_MODEL_ID
+        try:
+            self.bedrock_client = bedrock_client or get_bedrock_client()
+            logger.info(f"✅ {self.display_name} initialized with Bedrock")
+        except Exception as e:
+            logger.warning(f"⚠️ Bedrock not available, using mock mode: {str(e)}")
+            self.bedrock_client = None
+
+        self.executor = executor or get_executor()
+        self.limiter = limiter or get_bedrock_limiter()
+        self.cache = cache
+        self.retriever = retriever or get_retriever()
+
+        # Identical requests that miss the cache at the same time share one model call
+        self._inflight = SingleFlight()
+        self._inflight_async = AsyncSingleFlight()
+
+    def template(self, analysis_type: Optional[str] = None) -> PromptTemplate:
+        """Prompt template for an analysis type (the agent's default if None)"""
+        analysis_type = analysis_type or self.default_analysis_type
+        try:
+            return self.templates[analysis_type]
+        except KeyError:
+            raise ValueError(f"{self.display_name} does not support analysis type {analysis_type!r}")
+
+    def cache_key(self, country: str, industry: str, analysis_type: Optional[str] = None) -> str:
+        """Cache key for this agent's analysis of a country/industry pair, by canonical IDs so aliases share it"""
+        registry = get_registry()
+        prompt_key = self.template(analysis_type).key
+        if self._retrieves():
+            # Answers grounded in one index version are not reused once the index changes
+            prompt_key = f"{prompt_key}+rag.{self.retriever.version}"
+        return make_cache_key(self.agent_name, registry.country_id(country), registry.industry_id(industry),
+                              self.model_id, prompt_key)
+
+    def _retrieves(self) -> bool:
+        return self.retriever is not None and self.retrieval_query is not None
+
+    def _prompt(self, template: PromptTemplate, country: str, industry: str) -> Tuple[str, List[Passage]]:
+        """The rendered prompt, preceded by retrieved document context when there is any"""
+        prompt = template.render(country, industry)
+        if not self._retrieves():
+            return prompt, []
+        try:
+            passages = self.retriever.retrieve(self.retrieval_query.format(country=country, industry=industry))
+        except Exception as e:
+            # Context improves answers but is never required for one
+            logger.warning(f"{self.display_name} retrieval failed, answering without context: {str(e)}")
+            return prompt, []
+        if not passages:
+            return prompt, []
+        return f"{format_context(passages)}\n\n{prompt}", passages
+
+    def _run(self, country: str, industry: str, analysis_type: Optional[str], mock_call: AnalysisCall) -> Dict[str, Any]:
+        """Serve an analysis from cache, Bedrock or mock mode, in that order"""
+        template = self.template(analysis_type)
+        with span(f"{self.agent_name}.analysis", analysis_type=template.analysis_type) as current:
+            if not self.bedrock_client:
+                current.set_attribute("source", "mock")
+                return self._mock(mock_call, country, industry)
+
+            cache_key = self.cache_key(country, industry, template.analysis_type)
+            cached = self._get_cached(cache_key)
+            if cached is not None:
+                current.set_attribute("source", "cache")
+                return cached
+
+            current.set_attribute("source", "model")
+            return self._inflight.do(cache_key, self._call_and_cache, cache_key, template, mock_call, country, industry)
+
+    async def _run_async(self, country: str, industry: str, analysis_type: Optional[str], mock_call: AnalysisCall) -> Dict[str, Any]:
+        """Non-blocking ``_run``: cache hits return immediately, model calls go to the executor"""
+        template = self.template(analysis_type)
+        with span(f"{self.agent_name}.analysis", analysis_type=template.analysis_type) as current:
+            if not self.bedrock_client:
+                current.set_attribute("source", "mock")
+                return self._mock(mock_call, country, industry)
+
+            cache_key = self.cache_key(country, industry, template.analysis_type)
+            cached = await self._get_cached_async(cache_key)
+            if cached is not None:
+                current.set_attribute("source", "cache")
+                return cached
+
+            # Async waiters coalesce on the event loop
+            current.set_attribute("source", "model")
+            return await self._inflight_async.do(
+                cache_key, lambda: self._call_and_cache_async(cache_key, template, mock_call, country, industry)
+            )
+
+    def _get_cached(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(cache_key)
+        record_cache_lookup(self.agent_name, cached is not None)
+        return cached
+
+    async def _get_cached_async(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        # A Redis-backed cache is read on a worker thread so the event loop keeps running
+        if self.cache is None:
+            return None
+        cached = await self.cache.get_async(cache_key)
+        record_cache_lookup(self.agent_name, cached is not None)
+        return cached
+
+    @staticmethod
+    def _mock(mock_call: AnalysisCall, country: str, industry: str) -> Dict[str, Any]:
+        """The mock answer, marked with source "mock" so that neither the agent nor the chat cache keeps it"""
+        return {**mock_call(country, industry), "source": MOCK_SOURCE}
+
+    async def _call_and_cache_async(self, cache_key: str, template: PromptTemplate, mock_call: AnalysisCall, country: str, industry: str) -> Dict[str, Any]:
+        # The limiter slot is waited for here, on the event loop, so waiting never
+        # holds an executor thread. The executor call also joins the thread-level
+        # flight so sync callers share it too.
+        slot = await self.limiter.acquire_async()
+        try:
+            return await self.executor.run(self._inflight.do, cache_key, self._call_and_cache, cache_key, template,
+                                           mock_call, country, industry, slot)
+        finally:
+            # Unused if the call joined another caller's flight or never left the queue
+            slot.release_unclaimed()
+
+    def _call_and_cache(self, cache_key: str, template: PromptTemplate, mock_call: AnalysisCall, country: str, industry: str,
+                        slot: Optional[LimiterSlot] = None) -> Dict[str, Any]:
+        """Call the model; only successful model answers are cached, never the mock fallback
+
+        Throttling is raised rather than answered from the mock, so callers
+        can tell the client to retry instead of serving made-up figures.
+        """
+        try:
+            result = self._generate(template, country, industry, slot)
+        except BedrockThrottledError:
+            raise
+        except Exception as e:
+            logger.error(f"{self.display_name} Bedrock call failed: {str(e)}")
+            return self._mock(mock_call, country, industry)
+
+        if self.cache is not None:
+            self.cache.set(cache_key, result)
+        return result
+
+    def _generate(self, template: PromptTemplate, country: str, industry: str, slot: Optional[LimiterSlot] = None) -> Dict[str, Any]:
+        """One model call with the template's output budget, parsed and annotated with token usage
+
+        ``slot`` is a limiter slot the caller already holds; None waits for one on this thread.
+        """
+        prompt, passages = self._prompt(template, country, industry)
+        start = time.perf_counter()
+        with span("bedrock.invoke_model", agent=self.agent_name, max_tokens=template.max_tokens) as current:
+            try:
+                text, usage = self.limiter.call_in(slot, self._invoke_model, prompt, template.max_tokens)
+            except Exception:
+                BEDROCK_LATENCY.labels(self.agent_name, template.analysis_type, "error").observe(time.perf_counter() - start)
+                raise
+            BEDROCK_LATENCY.labels(self.agent_name, template.analysis_type, "success").observe(time.perf_counter() - start)
+            current.set_attribute("output_tokens", usage["output_tokens"])
+
+        result = self._parse_timed(text, country, industry)
+        result["usage"] = token_usage.record(self.agent_name, template, model_id=self.model_id, **usage)
+        if passages:
+            result["sources"] = [passage.source() for passage in passages]
+        return result
+
+    def _parse_timed(self, text: str, country: str, industry: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with span(f"{self.agent_name}.parse"):
+            result = self._parse_response(text, country, industry)
+        PARSE_LATENCY.labels(self.agent_name, result.get("extraction", "unknown")).observe(time.perf_counter() - start)
+        return result
+
+    def _parse_response(self, text: str, country: str, industry: str) -> Dict[str, Any]:
+        """Turn the model's answer into the agent's result fields"""
+        raise NotImplementedError
+
+    async def _stream_async(self, country: str, industry: str, analysis_type: Optional[str], mock_call: AnalysisCall) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream an analysis as events: text deltas first, the structured result last
+
+        Mock and cached answers are replayed. A model stream waits for its
+        limiter slot on the event loop, then reads each chunk on the executor.
+
+        Yields:
+            {"event": "delta", "text": ...} for each chunk of analysis text, then
+            {"event": "result", "data": ...} with the same fields as the
+            non-streaming call (scores, recommendation inputs, etc.). The
+            result is always the last event: if the model stream fails after
+            some text was sent, {"event": "error", "error": ...} marks that
+            text as incomplete and the result holds the mock answer.
+
+        Raises:
+            BedrockThrottledError: If Bedrock throttles the stream
+        """
+        template = self.template(analysis_type)
+        if not self.bedrock_client:
+            for event in self._replay(self._mock(mock_call, country, industry)):
+                yield event
+            return
+
+        cache_key = self.cache_key(country, industry, template.analysis_type)
+        cached = await self._get_cached_async(cache_key)
+        if cached is not None:
+            for event in self._replay(cached):
+                yield event
+            return
+
+        slot = await self.limiter.acquire_async()
+        try:
+            async for event in self.executor.iterate(self._stream(template, cache_key, mock_call, country, industry, slot)):
+                yield event
+        finally:
+            # Unused if the stream was abandoned before its first chunk was read
+            slot.release_unclaimed()
+
+    def _stream(self, template: PromptTemplate, cache_key: str, mock_call: AnalysisCall, country: str, industry: str,
+                slot: Optional[LimiterSlot] = None) -> Iterator[Dict[str, Any]]:
+        """Stream a model answer in the ``_stream_async`` event format; ``slot`` as for ``_generate``"""
+        prompt, passages = self._prompt(template, country, industry)
+        chunks = []
+        usage = {"input_tokens": 0, "output_tokens": 0, "stop_reason": None}
+        start = time.perf_counter()
+        # The stream holds one limiter slot until its last chunk
+        slot = self.limiter.claim(slot)
+        outcome = "error"
+        try:
+            for text in self._stream_model(prompt, template.max_tokens, usage):
+                if not chunks:
+                    BEDROCK_FIRST_TOKEN.labels(self.agent_name, template.analysis_type).observe(time.perf_counter() - start)
+                chunks.append(text)
+                yield {"event": "delta", "text": text}
+            outcome = "success"
+        except Exception as e:
+            BEDROCK_LATENCY.labels(self.agent_name, template.analysis_type, "error").observe(time.perf_counter() - start)
+            logger.error(f"{self.display_name} Bedrock stream failed: {str(e)}")
+            if is_throttling_error(e):
+                outcome = "throttled"
+                raise BedrockThrottledError(f"Bedrock is throttling requests: {str(e)}", self.limiter.retry_after()) from e
+            if not chunks:
+                # Nothing sent yet, so the caller can still get the mock answer in full
+                yield from self._replay(self._mock(mock_call, country, industry))
+            else:
+                # The text sent so far is cut short; the mock answer still gives the caller its figures
+                yield {"event": "error", "error": str(e)}
+                yield {"event": "result", "data": self._mock(mock_call, country, industry)}
+            return
+        finally:
+            slot.release(outcome)
+
+        BEDROCK_LATENCY.labels(self.agent_name, template.analysis_type, "success").observe(time.perf_counter() - start)
+        result = self._parse_timed("".join(chunks), country, industry)
+        result["usage"] = token_usage.record(self.agent_name, template, model_id=self.model_id, **usage)
+        if passages:
+            result["sources"] = [passage.source() for passage in passages]
+        if self.cache is not None:
+            self.cache.set(cache_key, result)
+        yield {"event": "result", "data": result}
+
+    def _replay(self, result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Emit an already complete result in the streaming event format"""
+        words = result.get("analysis", "").split(" ")
+        for i in range(0, len(words), MOCK_STREAM_CHUNK_WORDS):
+            yield {"event": "delta", "text": " ".join(words[i:i + MOCK_STREAM_CHUNK_WORDS]) + " "}
+        yield {"event": "result", "data": result}
+
+    def _request_body(self, prompt: str, max_tokens: int) -> str:
+        return json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "temperature": 0.1,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        })
+
+    def _invoke_model(self, prompt: str, max_tokens: int) -> Tuple[str, Dict[str, Any]]:
+        """
+        Send a single-turn prompt to Bedrock
+
+        Returns:
+            (completion text, usage) where usage has input_tokens,
+            output_tokens and stop_reason
+        """
+        response = self.bedrock_client.invoke_model(
+            modelId=self.model_id,
+            body=self._request_body(prompt, max_tokens)
+        )
+
+        response_body = json.loads(response['body'].read())
+        usage = response_body.get('usage', {})
+        return response_body['content'][0]['text'], {
+            "input_tokens": usage.get('input_tokens', 0),
+            "output_tokens": usage.get('output_tokens', 0),
+            "stop_reason": response_body.get('stop_reason')
+        }
+
+    def _stream_model(self, prompt: str, max_tokens: int, usage: Dict[str, Any]) -> Iterator[str]:
+        """Send a prompt with the response-stream API and yield text deltas as they arrive
+
+        Token counts and the stop reason are written into ``usage`` as the
+        message_start and message_delta events come in.
+        """
+        response = self.bedrock_client.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            body=self._request_body(prompt, max_tokens)
+        )
+
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            payload = json.loads(chunk['bytes'])
+            event_type = payload.get('type')
+            if event_type == 'content_block_delta':
+                text = payload['delta'].get('text')
+                if text:
+                    yield text
+            elif event_type == 'message_start':
+                usage["input_tokens"] = payload['message'].get('usage', {}).get('input_tokens', 0)
+            elif event_type == 'message_delta':
+                usage["output_tokens"] = payload.get('usage', {}).get('output_tokens', 0)
+                usage["stop_reason"] = payload.get('delta', {}).get('stop_reason')
@@ -0,0 +1,150 @@
+"""
+Baseline Scores for API
+Deterministic risk and market tables, precomputed once for mock mode and bulk sweeps
+"""
+
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from .entities import get_registry
+
+RISK_SCORE_NAMES = ("political_risk", "economic_risk", "legal_risk", "operational_risk", "market_risk", "technology_risk")
+
+
+class RiskProfile(NamedTuple):
+    """Country risk inputs (simplified)"""
+    base_risk: float
+    political: float
+    economic: float
+    legal: float
+
+
+COUNTRY_RISK_PROFILES: Mapping[str, RiskProfile] = MappingProxyType({
+    "Germany": RiskProfile(2.5, 2.0, 3.0, 2.0),
+    "Japan": RiskProfile(3.0, 2.5, 3.5, 2.5),
+    "Rwanda": RiskProfile(5.5, 6.0, 6.5, 5.0),
+    "Bangladesh": RiskProfile(6.2, 6.5, 7.0, 6.0),
+    "Estonia": RiskProfile(3.2, 3.0, 3.5, 2.8),
+    "Mongolia": RiskProfile(7.1, 7.5, 8.0, 6.5)
+})
+DEFAULT_RISK_PROFILE = RiskProfile(5.0, 5.0, 5.0, 5.0)
+
+INDUSTRY_RISK_MODIFIERS: Mapping[str, float] = MappingProxyType({
+    "fintech": 1.2,        # Higher regulatory risk
+    "healthcare": 1.1,     # Regulatory complexity
+    "technology": 0.9,     # Generally lower risk
+    "energy": 1.3,         # Political/regulatory risk
+    "manufacturing": 1.0,  # Baseline
+    "agriculture": 0.8     # Lower regulatory risk
+})
+DEFAULT_RISK_MODIFIER = 1.0
+
+MARKET_SIZES: Mapping[str, Mapping[str, int]] = MappingProxyType({
+    "Germany": MappingProxyType({"technology": 85000000000, "fintech": 12000000000, "healthcare": 45000000000}),
+    "Japan": MappingProxyType({"technology": 120000000000, "fintech": 8000000000, "healthcare": 65000000000}),
+    "Rwanda": MappingProxyType({"technology": 450000000, "fintech": 120000000, "healthcare": 280000000}),
+    "Estonia": MappingProxyType({"technology": 2100000000, "fintech": 340000000, "healthcare": 890000000})
+})
+DEFAULT_MARKET_SIZE = 2500000000
+
+GROWTH_RATES: Mapping[str, float] = MappingProxyType({
+    "technology": 12.5, "fintech": 18.3, "healthcare": 8.7, "e-commerce": 15.2,
+    "manufacturing": 6.8, "energy": 9.4, "agriculture": 5.1
+})
+DEFAULT_GROWTH_RATE = 10.0
+
+
+def _risk_row(profile: RiskProfile, modifier: float) -> Tuple[float, ...]:
+    """Six category scores followed by their mean, unrounded"""
+    scores = (
+        min(10, profile.political * modifier),
+        min(10, profile.economic * modifier),
+        min(10, profile.legal * modifier),
+        min(10, (profile.base_risk + 1.0) * modifier),
+        min(10, profile.base_risk * modifier),
+        min(10, (profile.base_risk - 0.5) * modifier)
+    )
+    return scores + (sum(scores) / len(scores),)
+
+
+# Grid axes: every country and industry any table knows. The last row and
+# column stand for everything else and hold the defaults.
+COUNTRIES: Tuple[str, ...] = tuple(sorted(set(COUNTRY_RISK_PROFILES) | set(MARKET_SIZES)))
+INDUSTRIES: Tuple[str, ...] = tuple(sorted(
+    set(INDUSTRY_RISK_MODIFIERS) | set(GROWTH_RATES) | {industry for sizes in MARKET_SIZES.values() for industry in sizes}
+))
+COUNTRY_INDEX: Mapping[str, int] = MappingProxyType({country: i for i, country in enumerate(COUNTRIES)})
+INDUSTRY_INDEX: Mapping[str, int] = MappingProxyType({industry: j for j, industry in enumerate(INDUSTRIES)})
+OTHER_COUNTRY = len(COUNTRIES)
+OTHER_INDUSTRY = len(INDUSTRIES)
+
+
+def _build_tables():
+    countries = COUNTRIES + (None,)
+    industries = INDUSTRIES + (None,)
+    risk = np.empty((len(countries), len(industries), len(RISK_SCORE_NAMES) + 1))
+    market_size = np.empty((len(countries), len(industries)), dtype=np.int64)
+    growth_rate = np.empty(len(industries))
+
+    for j, industry in enumerate(industries):
+        growth_rate[j] = GROWTH_RATES.get(industry, DEFAULT_GROWTH_RATE)
+    for i, country in enumerate(countries):
+        profile = COUNTRY_RISK_PROFILES.get(country, DEFAULT_RISK_PROFILE)
+        sizes = MARKET_SIZES.get(country, {})
+        for j, industry in enumerate(industries):
+            # Row by row in Python so the grid matches the per-pair lookups bit for bit
+            risk[i, j] = _risk_row(profile, INDUSTRY_RISK_MODIFIERS.get(industry, DEFAULT_RISK_MODIFIER))
+            market_size[i, j] = sizes.get(industry, DEFAULT_MARKET_SIZE)
+
+    for table in (risk, market_size, growth_rate):
+        table.setflags(write=False)
+    return risk, market_size, growth_rate
+
+
+# RISK_TABLE[country, industry] = six category scores, then the overall score
+RISK_TABLE, MARKET_SIZE_TABLE, GROWTH_RATE_TABLE = _build_tables()
+
+
+def _country_index(country: str) -> int:
+    # Any alias or ISO code finds the row of its canonical name
+    return COUNTRY_INDEX.get(get_registry().canonical_country(country), OTHER_COUNTRY)
+
+
+def _industry_index(industry: str) -> int:
+    return INDUSTRY_INDEX.get(get_registry().canonical_industry(industry), OTHER_INDUSTRY)
+
+
+def risk_scores(country: str, industry: str) -> Tuple[float, ...]:
+    """Unrounded category scores (in RISK_SCORE_NAMES order) followed by the overall score"""
+    return tuple(RISK_TABLE[_country_index(country), _industry_index(industry)].tolist())
+
+
+def market_figures(country: str, industry: str) -> Tuple[int, float]:
+    """(market size in US dollars, annual growth rate in percent)"""
+    j = _industry_index(industry)
+    return MARKET_SIZE_TABLE[_country_index(country), j].item(), GROWTH_RATE_TABLE[j].item()
+
+
+def score_grid(countries: Sequence[str], industries: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    Baseline scores for every country x industry pair in one indexing step
+
+    Args:
+        countries: Row labels; unknown countries get the default profile
+        industries: Column labels; unknown industries get the default modifiers
+
+    Returns:
+        Arrays of shape (len(countries), len(industries)): "overall_risk_score",
+        one per risk category, "market_size" and "growth_rate"
+    """
+    rows = np.fromiter((_country_index(country) for country in countries), dtype=np.intp, count=len(countries))
+    columns = np.fromiter((_industry_index(industry) for industry in industries), dtype=np.intp, count=len(industries))
+    risk = RISK_TABLE[np.ix_(rows, columns)]
+
+    grid = {name: risk[:, :, k] for k, name in enumerate(RISK_SCORE_NAMES)}
+    grid["overall_risk_score"] = risk[:, :, -1]
+    grid["market_size"] = MARKET_SIZE_TABLE[np.ix_(rows, columns)]
+    grid["growth_rate"] = np.broadcast_to(GROWTH_RATE_TABLE[columns], (len(rows), len(columns)))
+    return grid
@@ -0,0 +1,262 @@
+"""
+Batch Analyzer for API
+Runs large country x industry x analysis type grids with cache-first deduplication
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from .baseline_scores import RISK_SCORE_NAMES, score_grid
+from .bedrock_limiter import BedrockThrottledError
+from .entities import get_registry
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_TYPES = ("market", "risk", "comprehensive")
+DEFAULT_MAX_CONCURRENCY = 8
+
+BatchItem = Tuple[str, str, str]
+
+
+def dedupe_items(items: Iterable[BatchItem]) -> Tuple[List[BatchItem], int]:
+    """
+    Drop repeated (country, industry, analysis type) combinations
+
+    Countries and industries are compared by canonical ID, the way cache
+    keys are, so "UK", "gb" and "United Kingdom" are one item; the first
+    spelling is kept.
+
+    Returns:
+        (unique items in their original order, number of duplicates dropped)
+    """
+    registry = get_registry()
+    seen = set()
+    unique = []
+    duplicates = 0
+    for country, industry, analysis_type in items:
+        key = (registry.country_id(country), registry.industry_id(industry), analysis_type)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        unique.append((country, industry, analysis_type))
+    return unique, duplicates
+
+
+class BatchAnalyzer:
+    """Runs single and bulk analyses through the shared agents
+
+    A batch is served in three passes. Every item's cache entries are first
+    fetched in one bulk read, and items that are fully cached are answered
+    straight away. Items whose agents are in mock mode are answered next,
+    from one score_grid lookup over the batch's countries and industries.
+    The rest go through a fixed number of workers, so a grid of thousands of
+    items never has more than ``max_concurrency`` analyses in flight. A
+    failed item becomes an error line; the batch carries on.
+    """
+
+    def __init__(self, market_agent, risk_agent, orchestrator, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Args:
+            market_agent: Agent exposing analyze_market_async
+            risk_agent: Agent exposing comprehensive_risk_assessment_async
+            orchestrator: Object exposing comprehensive_market_entry_analysis_async
+            max_concurrency: Items analyzed at the same time within one batch
+        """
+        self.market_agent = market_agent
+        self.risk_agent = risk_agent
+        self.orchestrator = orchestrator
+        self.max_concurrency = max_concurrency
+
+    async def analyze(self, country: str, industry: str, analysis_type: str) -> Dict[str, Any]:
+        """
+        Run one analysis and return it in the /api/v1/analyze response shape
+
+        Args:
+            country: Target country
+            industry: Industry sector
+            analysis_type: "market", "risk" or "comprehensive"
+        """
+        if analysis_type == "market":
+            result = await self.market_agent.analyze_market_async(country, industry)
+        elif analysis_type == "risk":
+            result = await self.risk_agent.comprehensive_risk_assessment_async(country, industry)
+        else:
+            result = await self.orchestrator.comprehensive_market_entry_analysis_async(country, industry)
+        return self._response(country, industry, analysis_type, result)
+
+    @staticmethod
+    def _response(country: str, industry: str, analysis_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        if analysis_type == "market":
+            return {"response_type": "market_research", "country": country, "industry": industry, **result}
+        if analysis_type == "risk":
+            return {"response_type": "risk_assessment", "country": country, "industry": industry, **result}
+        return {"response_type": "comprehensive", "country": country, "industry": industry, "analysis": result}
+
+    async def run(self, items: List[BatchItem]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Analyze every item and yield one event per item as it finishes
+
+        Yields:
+            A "batch" event with the counts, then one "result" or "error"
+            event per unique item (``index`` is its position among the unique
+            items; cached items come first, then mock-mode ones), then a
+            "summary" event
+        """
+        start = time.perf_counter()
+        unique, duplicates = dedupe_items(items)
+        if getattr(self._shared_cache(), "blocking", False):
+            # The bulk read goes to Redis; keep the network wait off the event loop
+            cached = await asyncio.to_thread(self.cached_indexes, unique)
+        else:
+            cached = self.cached_indexes(unique)
+
+        yield {
+            "event": "batch",
+            "total": len(items),
+            "unique": len(unique),
+            "duplicates": duplicates,
+            "cached": len(cached)
+        }
+
+        completed = failed = 0
+        with span("batch.run", items=len(unique), cached=len(cached)):
+            async for event in self._run_all(unique, cached, self.baseline_indexes(unique)):
+                if event["event"] == "result":
+                    completed += 1
+                else:
+                    failed += 1
+                yield event
+
+        yield {
+            "event": "summary",
+            "completed": completed,
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    async def _run_all(self, unique: List[BatchItem], cached: set, baseline: List[int]) -> AsyncIterator[Dict[str, Any]]:
+        # Cached items are cheap (cache reads and, for comprehensive, combining two sections)
+        for index in sorted(cached):
+            yield await self._run_item(index, unique[index], cached=True)
+        for event in self._baseline_events(unique, baseline):
+            yield event
+
+        answered = cached.union(baseline)
+        pending = iter([index for index in range(len(unique)) if index not in answered])
+        results: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def worker():
+            try:
+                for index in pending:
+                    await results.put(await self._run_item(index, unique[index], cached=False))
+            finally:
+                await results.put(done)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.max_concurrency, len(unique) - len(answered)))]
+        try:
+            running = len(workers)
+            while running:
+                event = await results.get()
+                if event is done:
+                    running -= 1
+                else:
+                    yield event
+        finally:
+            # A client that disconnects must not leave model calls queued
+            for task in workers:
+                task.cancel()
+
+    async def _run_item(self, index: int, item: BatchItem, cached: bool) -> Dict[str, Any]:
+        country, industry, analysis_type = item
+        event = {"index": index, "country": country, "industry": industry, "analysis_type": analysis_type}
+        try:
+            data = await self.analyze(country, industry, analysis_type)
+        except BedrockThrottledError as e:
+            logger.warning(f"Batch {analysis_type} analysis throttled for {industry} in {country}: {str(e)}")
+            return {"event": "error", **event, "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            logger.error(f"Batch {analysis_type} analysis failed for {industry} in {country}: {str(e)}")
+            return {"event": "error", **event, "error": str(e)}
+        return {"event": "result", **event, "cached": cached, "data": data}
+
+    def baseline_indexes(self, items: List[BatchItem]) -> List[int]:
+        """Indexes of the items whose agents are all in mock mode, so their answers come from the score tables"""
+        market = self._in_mock_mode(self.market_agent)
+        risk = self._in_mock_mode(self.risk_agent)
+        answered = {"market": market, "risk": risk, "comprehensive": market and risk and self.orchestrator is not None}
+        return [index for index, (_, _, analysis_type) in enumerate(items) if answered[analysis_type]]
+
+    @staticmethod
+    def _in_mock_mode(agent: Any) -> bool:
+        return agent is not None and not getattr(agent, "bedrock_client", None)
+
+    def _baseline_events(self, items: List[BatchItem], indexes: List[int]) -> Iterator[Dict[str, Any]]:
+        """Mock-mode results for ``indexes``, read from one score_grid over their countries and industries"""
+        if not indexes:
+            return
+        countries = list(dict.fromkeys(items[index][0] for index in indexes))
+        industries = list(dict.fromkeys(items[index][1] for index in indexes))
+        rows = {country: i for i, country in enumerate(countries)}
+        columns = {industry: j for j, industry in enumerate(industries)}
+        with span("batch.baseline", items=len(indexes)):
+            grid = score_grid(countries, industries)
+
+        for index in indexes:
+            country, industry, analysis_type = items[index]
+            i, j = rows[country], columns[industry]
+            sections = {}
+            if analysis_type in ("market", "comprehensive"):
+                figures = (int(grid["market_size"][i, j]), float(grid["growth_rate"][i, j]))
+                sections["market"] = self.market_agent.baseline_analysis(country, industry, figures)
+            if analysis_type in ("risk", "comprehensive"):
+                scores = tuple(float(grid[name][i, j]) for name in RISK_SCORE_NAMES + ("overall_risk_score",))
+                sections["risk"] = self.risk_agent.baseline_assessment(country, industry, scores)
+
+            if analysis_type == "comprehensive":
+                result = self.orchestrator.combine_sections(country, industry, sections["market"], sections["risk"])
+            else:
+                result = sections[analysis_type]
+            yield {"event": "result", "index": index, "country": country, "industry": industry,
+                   "analysis_type": analysis_type, "cached": False, "data": self._response(country, industry, analysis_type, result)}
+
+    def cached_indexes(self, items: List[BatchItem]) -> set:
+        """Indexes of the items whose agent results are all in the cache, found with one bulk read"""
+        needed: Dict[int, List[str]] = {}
+        for index, (country, industry, analysis_type) in enumerate(items):
+            keys = self._cache_keys(country, industry, analysis_type)
+            if keys:
+                needed[index] = keys
+
+        cache = self._shared_cache()
+        if cache is None or not needed:
+            return set()
+
+        try:
+            found = cache.get_many([key for keys in needed.values() for key in keys])
+        except Exception as e:
+            logger.warning(f"⚠️ Batch cache prefetch failed: {str(e)}")
+            return set()
+        return {index for index, keys in needed.items() if all(key in found for key in keys)}
+
+    def _cache_keys(self, country: str, industry: str, analysis_type: str) -> Optional[List[str]]:
+        """Cache keys an item reads, or None if any agent it needs is uncached (e.g. mock mode)"""
+        if analysis_type == "market":
+            agents = [(self.market_agent, "market")]
+        elif analysis_type == "risk":
+            agents = [(self.risk_agent, "risk")]
+        else:
+            agents = [(self.market_agent, "comprehensive"), (self.risk_agent, "comprehensive")]
+
+        keys = []
+        for agent, agent_analysis_type in agents:
+            if getattr(agent, "cache", None) is None or not getattr(agent, "bedrock_client", None):
+                return None
+            keys.append(agent.cache_key(country, industry, agent_analysis_type))
+        return keys
+
+    def _shared_cache(self) -> Optional[Any]:
+        return getattr(self.market_agent, "cache", None) or getattr(self.risk_agent, "cache", None)
@@ -0,0 +1,110 @@
+"""
+Bedrock Client Registry for API
+One pooled bedrock-runtime client per process, shared by every agent
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = "us-east-1"
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 120.0
+DEFAULT_MAX_ATTEMPTS = 4
+
+
+class BedrockClientRegistry:
+    """Process-wide cache of configured ``bedrock-runtime`` clients
+
+    boto3 clients are thread-safe, so a single client (and its urllib3
+    connection pool) serves all agents and executor threads. Building a
+    client resolves credentials and loads service models, which is slow;
+    doing it once also avoids a separate pool of TLS connections per agent.
+
+    Clients are keyed by region and tied to the process that built them, so a
+    worker forked from a preloaded parent builds its own client instead of
+    sharing the parent's sockets.
+    """
+
+    def __init__(self, max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            max_pool_connections: HTTP connections kept open per client; should be
+                at least the executor size so no model call waits for a socket
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for a response (model calls are slow)
+            max_attempts: Total attempts per call with adaptive retry mode, which
+                also rate-limits the client when Bedrock starts throttling
+        """
+        self.config = Config(
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=True,
+            retries={"max_attempts": max_attempts, "mode": "adaptive"}
+        )
+        self._clients: Dict[str, Any] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def get(self, region: str = DEFAULT_REGION) -> Any:
+        """Return the shared client for ``region``, creating it on first use"""
+        if self._pid == os.getpid():
+            client = self._clients.get(region)
+            if client is not None:
+                return client
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked since the clients were built; their sockets belong to the parent
+                self._clients = {}
+                self._pid = os.getpid()
+
+            client = self._clients.get(region)
+            if client is None:
+                # Session creation is not thread-safe, hence the lock
+                client = boto3.session.Session().client("bedrock-runtime", region_name=region, config=self.config)
+                self._clients[region] = client
+                logger.info(f"✅ Bedrock client created for {region} "
+                            f"(pool size {self.config.max_pool_connections})")
+        return client
+
+    def clear(self):
+        """Drop all clients; the next ``get`` builds a fresh one"""
+        with self._lock:
+            self._clients = {}
+
+
+_default_registry: Optional[BedrockClientRegistry] = None
+
+
+def configure_bedrock_clients(max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+                              connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                              read_timeout: float = DEFAULT_READ_TIMEOUT,
+                              max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> BedrockClientRegistry:
+    """Replace the process-wide client registry with one using the given settings"""
+    global _default_registry
+    _default_registry = BedrockClientRegistry(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_attempts=max_attempts
+    )
+    return _default_registry
+
+
+def get_bedrock_client(region: str = DEFAULT_REGION) -> Any:
+    """Return the process-wide Bedrock client, creating the registry with defaults if needed"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = BedrockClientRegistry()
+    return _default_registry.get(region)
@@ -0,0 +1,148 @@
+"""
+Bedrock Executor for API
+Runs blocking boto3 model calls off the asyncio event loop
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from .metrics import QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_TIMEOUT = 120.0
+
+
+class BedrockExecutor:
+    """Bounded thread pool for synchronous Bedrock invocations
+
+    boto3 has no native asyncio support, so every ``invoke_model`` call is
+    handed to a fixed-size pool. The pool size caps how many model calls a
+    worker process makes at once; excess calls wait in the pool queue
+    without blocking the event loop.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, timeout: float = DEFAULT_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # Created lazily so that a pre-forking server never shares threads with its workers
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="bedrock"
+                    )
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and await its result
+
+        Args:
+            func: Blocking callable, typically an agent method
+            timeout: Seconds to wait before giving up (defaults to the executor timeout)
+
+        Returns:
+            The callable's return value
+
+        Raises:
+            asyncio.TimeoutError: If the call does not finish in time. Calls that
+                are still queued are cancelled; calls already running finish in
+                the background and their result is discarded.
+        """
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so tracing spans nest under the caller's span
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(self._get_pool(), partial(context.run, self._timed, time.perf_counter(), func, args, kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Bedrock call {getattr(func, '__qualname__', func)} timed out")
+            raise
+
+    async def iterate(self, iterator: Iterator[Any], timeout: Optional[float] = None) -> AsyncIterator[Any]:
+        """
+        Consume a blocking iterator (e.g. a Bedrock response stream) from async code
+
+        Each ``next()`` runs on the pool, so the event loop is free between chunks.
+
+        Args:
+            iterator: Blocking iterator to consume
+            timeout: Seconds to wait for each item (defaults to the executor timeout)
+
+        Raises:
+            asyncio.TimeoutError: If one ``next()`` does not finish in time
+        """
+        done = object()
+        timeout = timeout if timeout is not None else self.timeout
+        pending: Optional[Future] = None
+        try:
+            while True:
+                pending = self.submit(next, iterator, done)
+                try:
+                    item = await asyncio.wait_for(asyncio.wrap_future(pending), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Reading the next item of {type(iterator).__name__} timed out")
+                    raise
+                if item is done:
+                    return
+                yield item
+        finally:
+            # Release the underlying HTTP stream if the consumer stops early. A
+            # next() still running on the pool owns the iterator, so closing it
+            # here would fail; it is closed from that thread once next() returns.
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                if pending is None or pending.done():
+                    close()
+                else:
+                    pending.add_done_callback(lambda _: close())
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """Schedule a blocking callable from synchronous code"""
+        context = contextvars.copy_context()
+        return self._get_pool().submit(context.run, self._timed, time.perf_counter(), func, args, kwargs)
+
+    @staticmethod
+    def _timed(submitted: float, func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        # Time between scheduling and a pool thread picking the call up
+        QUEUE_WAIT.observe(time.perf_counter() - submitted)
+        return func(*args, **kwargs)
+
+    def shutdown(self, wait: bool = False):
+        """Stop the pool, cancelling calls that have not started yet"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+
+_default_executor: Optional[BedrockExecutor] = None
+
+
+def configure_executor(max_workers: int = DEFAULT_MAX_WORKERS, timeout: float = DEFAULT_TIMEOUT) -> BedrockExecutor:
+    """Replace the process-wide executor with one using the given limits"""
+    global _default_executor
+    if _default_executor is not None:
+        _default_executor.shutdown()
+    _default_executor = BedrockExecutor(max_workers=max_workers, timeout=timeout)
+    return _default_executor
+
+
+def get_executor() -> BedrockExecutor:
+    """Return the process-wide executor, creating it with defaults if needed"""
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = BedrockExecutor()
+    return _default_executor
@@ -0,0 +1,310 @@
+"""
+Bedrock Concurrency Limiter for API
+AIMD limit on concurrent model calls that backs off when Bedrock throttles
+"""
+
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, Set, Tuple
+from .metrics import BEDROCK_THROTTLES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 16
+DEFAULT_QUEUE_TIMEOUT = 30.0
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+# Error codes Bedrock (and boto3's modeled exceptions) use when a caller is over its quota
+THROTTLING_CODES = frozenset((
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ModelNotReadyException"
+))
+
+
+class BedrockThrottledError(Exception):
+    """Bedrock is throttling, or the limiter could not get a call slot in time
+
+    Raised to the caller instead of a mock answer; the API turns it into a
+    429 response with ``retry_after`` as the Retry-After header.
+    """
+
+    def __init__(self, message: str, retry_after: float = DEFAULT_BACKOFF):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """True for botocore ClientErrors and modeled exceptions that mean "slow down" """
+    if isinstance(error, BedrockThrottledError) or type(error).__name__ in THROTTLING_CODES:
+        return True
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code") in THROTTLING_CODES
+    return False
+
+
+class AdaptiveConcurrencyLimiter:
+    """Caps concurrent Bedrock calls with additive-increase / multiplicative-decrease
+
+    Every successful call raises the limit by ``1 / limit`` (about one slot
+    per round of calls). A throttled call cuts it by ``decrease`` and opens a
+    backoff window during which no new call starts; the window doubles with
+    each consecutive throttle. Calls over the limit wait in line for up to
+    ``queue_timeout`` seconds and then fail with BedrockThrottledError.
+
+    boto3's adaptive retries already retry throttled calls a few times; this
+    limiter acts on what is left after those retries, so the whole process
+    slows down instead of every thread retrying on its own.
+
+    Async callers wait with ``acquire_async`` on the event loop and hand the
+    slot to the executor thread that makes the call. A caller waiting for a
+    slot then never holds an executor thread, so a call that already has a
+    slot (a stream reading its next chunk) can always get one.
+
+    Args:
+        min_limit: Lowest concurrency the limit can fall to
+        max_limit: Highest concurrency (keep <= the executor size)
+        initial_limit: Starting concurrency (defaults to max_limit)
+        decrease: Factor applied to the limit on a throttle
+        queue_timeout: Seconds a call may wait for a slot
+        backoff: First backoff window in seconds
+    """
+
+    def __init__(self, min_limit: int = DEFAULT_MIN_LIMIT, max_limit: int = DEFAULT_MAX_LIMIT,
+                 initial_limit: Optional[int] = None, decrease: float = 0.5,
+                 queue_timeout: float = DEFAULT_QUEUE_TIMEOUT, backoff: float = DEFAULT_BACKOFF):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self._limit = float(initial_limit or max_limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._throttle_streak = 0
+        self._backoff_until = 0.0
+        self._condition = threading.Condition()
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking Bedrock call within the limit
+
+        Raises:
+            BedrockThrottledError: If no slot frees up within ``queue_timeout``,
+                or Bedrock throttled the call
+        """
+        return self.call_in(None, func, *args, **kwargs)
+
+    def call_in(self, slot: Optional["LimiterSlot"], func: Callable[..., Any], *args, **kwargs) -> Any:
+        """``call`` in a slot taken beforehand with ``acquire_async`` (None waits for one here)"""
+        slot = self.claim(slot)
+        outcome = "error"
+        try:
+            result = func(*args, **kwargs)
+            outcome = "success"
+            return result
+        except Exception as e:
+            if is_throttling_error(e):
+                outcome = "throttled"
+                raise BedrockThrottledError(f"Bedrock is throttling requests: {str(e)}", self.retry_after()) from e
+            raise
+        finally:
+            slot.release(outcome)
+
+    def claim(self, slot: Optional["LimiterSlot"] = None) -> "LimiterSlot":
+        """
+        The slot for a call starting on this thread
+
+        Args:
+            slot: Slot taken on the event loop; None, or one its coroutine has
+                already given back, means waiting for a new one here
+
+        Returns:
+            A claimed slot; release it with the call's outcome
+        """
+        if slot is not None and slot.claim():
+            return slot
+        self.acquire()
+        slot = LimiterSlot(self)
+        slot.claim()
+        return slot
+
+    def acquire(self):
+        """Wait for a call slot; pair with ``release``"""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wake_at = self._try_acquire(now, deadline)
+                    if wake_at is None:
+                        return
+                    self._condition.wait(max(0.001, wake_at - now))
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self) -> "LimiterSlot":
+        """
+        Wait for a call slot on the event loop, without holding a thread
+
+        Returns:
+            The slot, to pass to ``call_in`` (or ``claim``) on the thread that
+            makes the call
+
+        Raises:
+            BedrockThrottledError: If no slot frees up within ``queue_timeout``
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            self._waiting += 1
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._condition:
+                    now = time.monotonic()
+                    wake_at = self._try_acquire(now, deadline)
+                    if wake_at is None:
+                        return LimiterSlot(self)
+                    # Cleared under the lock, so a release from now on wakes this waiter
+                    waiter[1].clear()
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), max(0.001, wake_at - now))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                self._waiting -= 1
+                self._async_waiters.discard(waiter)
+
+    def _try_acquire(self, now: float, deadline: float) -> Optional[float]:
+        # Takes a slot and returns None, or returns when to look again; call with the condition held
+        if self._in_flight < self.limit and now >= self._backoff_until:
+            self._in_flight += 1
+            return None
+        if now >= deadline:
+            BEDROCK_THROTTLES.labels("queue_timeout").inc()
+            raise BedrockThrottledError(
+                f"No Bedrock capacity within {self.queue_timeout:.0f}s "
+                f"({self._in_flight} calls in flight, {self._waiting} waiting)",
+                self._retry_after(now)
+            )
+        # Wake at the end of a backoff window even if no call finishes
+        return min(deadline, self._backoff_until) if self._backoff_until > now else deadline
+
+    def release(self, outcome: str = "success"):
+        """
+        Free a call slot and adjust the limit
+
+        Args:
+            outcome: "success" (raise the limit), "throttled" (cut it and back
+                off) or "error" (leave it unchanged)
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if outcome == "success":
+                self._throttle_streak = 0
+                self._limit = min(float(self.max_limit), self._limit + 1 / max(self._limit, 1.0))
+            elif outcome == "throttled":
+                BEDROCK_THROTTLES.labels("throttled").inc()
+                self._throttle_streak += 1
+                self._limit = max(float(self.min_limit), self._limit * self.decrease)
+                window = min(MAX_BACKOFF, self.backoff * 2 ** (self._throttle_streak - 1))
+                # Jitter keeps worker processes from resuming in lockstep
+                self._backoff_until = max(self._backoff_until, time.monotonic() + window * random.uniform(0.5, 1.0))
+                logger.warning(f"⚠️ Bedrock throttled; concurrency limit now {self.limit}, backing off {window:.1f}s")
+            self._condition.notify_all()
+            for loop, event in self._async_waiters:
+                try:
+                    loop.call_soon_threadsafe(event.set)
+                except RuntimeError:
+                    pass  # The waiter's loop has closed
+
+    def retry_after(self) -> float:
+        """Seconds a client should wait before retrying"""
+        with self._condition:
+            return self._retry_after(time.monotonic())
+
+    def _retry_after(self, now: float) -> float:
+        return float(max(1, math.ceil(self._backoff_until - now)))
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "backing_off": time.monotonic() < self._backoff_until
+            }
+
+
+class LimiterSlot:
+    """A call slot taken on the event loop and handed to the thread that makes the call
+
+    The thread claims the slot when the call starts and releases it with the
+    call's outcome. If the call never starts (it joined another caller's
+    flight, or was cancelled while queued), the coroutine that took the slot
+    gives it back with ``release_unclaimed``. Each slot is released once.
+    """
+
+    def __init__(self, limiter: AdaptiveConcurrencyLimiter):
+        self.limiter = limiter
+        self._state = "held"  # held -> claimed -> released, or held -> released
+        self._lock = threading.Lock()
+
+    def claim(self) -> bool:
+        """Mark the slot as used by the calling thread; False if it was already given back"""
+        with self._lock:
+            if self._state != "held":
+                return False
+            self._state = "claimed"
+            return True
+
+    def release(self, outcome: str = "success"):
+        """Free the slot after the call, adjusting the limit (see AdaptiveConcurrencyLimiter.release)"""
+        with self._lock:
+            if self._state == "released":
+                return
+            self._state = "released"
+        self.limiter.release(outcome)
+
+    def release_unclaimed(self):
+        """Give the slot back if no call claimed it"""
+        with self._lock:
+            if self._state != "held":
+                return
+            self._state = "released"
+        self.limiter.release("error")
+
+
+_default_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+
+
+def configure_bedrock_limiter(min_limit: int = DEFAULT_MIN_LIMIT, max_limit: int = DEFAULT_MAX_LIMIT,
+                              queue_timeout: float = DEFAULT_QUEUE_TIMEOUT) -> AdaptiveConcurrencyLimiter:
+    """Replace the process-wide limiter with one using the given limits"""
+    global _default_limiter
+    _default_limiter = AdaptiveConcurrencyLimiter(min_limit=min_limit, max_limit=max_limit, queue_timeout=queue_timeout)
+    return _default_limiter
+
+
+def get_bedrock_limiter() -> AdaptiveConcurrencyLimiter:
+    """Return the process-wide limiter, creating it with defaults if needed"""
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = AdaptiveConcurrencyLimiter()
+    return _default_limiter
@@ -0,0 +1,367 @@
+"""
+Result Cache for API
+Caches agent analyses so repeat questions skip the model call
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Optional: only needed for the shared tier
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_KEY_PREFIX = "mra:"
+COMPRESS_THRESHOLD = 512  # Bytes; smaller payloads are not worth compressing
+REMOTE_RETRY_INTERVAL = 30.0
+MGET_CHUNK = 200  # Keys per Redis MGET
+MOCK_SOURCE = "mock"  # "source" of agent results made up by mock mode; no cache keeps them
+
+
+def make_cache_key(agent: str, country: str, industry: str, model_id: str, prompt_key: str) -> str:
+    """
+    Build the cache key for one agent analysis
+
+    Args:
+        agent: Agent name, e.g. "market_research"
+        country: Target country
+        industry: Industry sector
+        model_id: Bedrock model that produced the analysis
+        prompt_key: Key of the prompt template used (``PromptTemplate.key``)
+
+    Returns:
+        Key string; changing the model or prompt template invalidates old entries
+    """
+    return ":".join([
+        agent,
+        prompt_key,
+        model_id,
+        country.strip().lower(),
+        industry.strip().lower()
+    ])
+
+
+class ResultCache:
+    """Interface for analysis result caches
+
+    Cached values are shared between callers and must be treated as read-only.
+    """
+
+    # True when reads and writes wait on the network, so coroutines must not call them directly
+    blocking = False
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss"""
+        raise NotImplementedError
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        """``get`` for coroutines; a blocking cache is read on a worker thread"""
+        if self.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Return the cached values of the keys that are hits"""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a value; ttl overrides the cache default (seconds)"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Remove a single entry if present"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove all entries"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring"""
+        return {}
+
+
+class LRUCache(ResultCache):
+    """In-process cache with least-recently-used eviction and per-entry TTL"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def encode_value(value: Any) -> bytes:
+    """Serialize a JSON-compatible value to compact bytes for the shared tier"""
+    payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(payload) >= COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(payload)
+    return b"j" + payload
+
+
+def decode_value(data: bytes) -> Any:
+    """Inverse of encode_value"""
+    marker, payload = data[:1], data[1:]
+    if marker == b"z":
+        payload = zlib.decompress(payload)
+    elif marker != b"j":
+        raise ValueError(f"Unknown cache encoding: {marker!r}")
+    return json.loads(payload)
+
+
+class RedisCache(ResultCache):
+    """Cache tier shared by every worker and container through Redis
+
+    Errors are raised to the caller; TieredCache turns them into a fallback
+    to the local tier.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, ttl: int = DEFAULT_TTL, max_connections: int = 50,
+                 socket_timeout: float = 0.25, key_prefix: str = DEFAULT_KEY_PREFIX, client=None):
+        """
+        Args:
+            url: Redis URL, e.g. redis://redis:6379/0
+            ttl: Default entry lifetime in seconds
+            max_connections: Size of the connection pool shared by all threads
+            socket_timeout: Seconds before a slow Redis call is treated as a failure
+            key_prefix: Namespace for this service's keys
+            client: Pre-built client (e.g. an in-memory fake for tests)
+        """
+        if client is None:
+            if redis is None:
+                raise ImportError("The redis package is required for RedisCache")
+            pool = redis.ConnectionPool.from_url(
+                url,
+                max_connections=max_connections,
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=socket_timeout
+            )
+            client = redis.Redis(connection_pool=pool)
+
+        self.client = client
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        data = self.client.get(self.key_prefix + key)
+        return decode_value(data) if data is not None else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        # One MGET round trip per chunk instead of one GET per key
+        found = {}
+        for start in range(0, len(keys), MGET_CHUNK):
+            chunk = keys[start:start + MGET_CHUNK]
+            for key, data in zip(chunk, self.client.mget([self.key_prefix + key for key in chunk])):
+                if data is not None:
+                    found[key] = decode_value(data)
+        return found
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.key_prefix + key, encode_value(value), ex=max(1, int(ttl)))
+
+    def delete(self, key: str):
+        self.client.delete(self.key_prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.key_prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis"}
+
+
+class TieredCache(ResultCache):
+    """Local LRU in front of a shared remote cache
+
+    Reads try the local tier first and promote remote hits into it. When the
+    remote tier fails, it is skipped for ``retry_interval`` seconds and the
+    cache keeps working from the local tier alone.
+    """
+
+    def __init__(self, local: ResultCache, remote: ResultCache, retry_interval: float = REMOTE_RETRY_INTERVAL):
+        self.local = local
+        self.remote = remote
+        self.retry_interval = retry_interval
+        self._remote_down_until = 0.0
+
+    @property
+    def remote_available(self) -> bool:
+        return time.monotonic() >= self._remote_down_until
+
+    @property
+    def blocking(self) -> bool:
+        return self.remote.blocking and self.remote_available
+
+    def _remote_failed(self, operation: str, error: Exception):
+        if self.remote_available:
+            logger.warning(f"⚠️ Shared cache {operation} failed, using local cache for {self.retry_interval:.0f}s: {str(error)}")
+        self._remote_down_until = time.monotonic() + self.retry_interval
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None or not self.remote_available:
+            return value
+
+        try:
+            value = self.remote.get(key)
+        except Exception as e:
+            self._remote_failed("read", e)
+            return None
+
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        # Local hits are answered inline; only a remote read goes to a worker thread
+        value = self.local.get(key)
+        if value is not None or not self.blocking:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = self.local.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if not missing or not self.remote_available:
+            return found
+
+        try:
+            remote = self.remote.get_many(missing)
+        except Exception as e:
+            self._remote_failed("read", e)
+            return found
+
+        for key, value in remote.items():
+            self.local.set(key, value)
+        found.update(remote)
+        return found
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.local.set(key, value, ttl)
+        if self.remote_available:
+            try:
+                self.remote.set(key, value, ttl)
+            except Exception as e:
+                self._remote_failed("write", e)
+
+    def delete(self, key: str):
+        self.local.delete(key)
+        if self.remote_available:
+            try:
+                self.remote.delete(key)
+            except Exception as e:
+                self._remote_failed("delete", e)
+
+    def clear(self):
+        self.local.clear()
+        if self.remote_available:
+            try:
+                self.remote.clear()
+            except Exception as e:
+                self._remote_failed("clear", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "tiered",
+            "local": self.local.stats(),
+            "remote": self.remote.stats(),
+            "remote_available": self.remote_available
+        }
+
+
+def create_cache(ttl: int = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 redis_url: Optional[str] = None, redis_max_connections: int = 50,
+                 local_ttl: Optional[int] = None) -> ResultCache:
+    """
+    Build the cache configured for this process
+
+    Args:
+        ttl: Entry lifetime in seconds
+        max_entries: Size of the in-process LRU tier
+        redis_url: Enables the shared Redis tier when set
+        redis_max_connections: Redis connection pool size
+        local_ttl: Lifetime of local copies when a shared tier is in use, so
+            that workers do not serve stale entries for the full ttl
+
+    Returns:
+        An in-process LRU, or a TieredCache when Redis is configured and the
+        redis package is installed
+    """
+    if not redis_url:
+        return LRUCache(max_entries=max_entries, ttl=ttl)
+
+    if redis is None:
+        logger.warning("⚠️ REDIS_URL is set but the redis package is not installed; using local cache only")
+        return LRUCache(max_entries=max_entries, ttl=ttl)
+
+    local = LRUCache(max_entries=max_entries, ttl=min(ttl, local_ttl or ttl))
+    remote = RedisCache(redis_url, ttl=ttl, max_connections=redis_max_connections)
+    logger.info("✅ Shared Redis cache tier enabled")
+    return TieredCache(local, remote)
@@ -0,0 +1,103 @@
+"""
+Comparison Engine for API
+Runs multi-country comparisons with every agent call in flight at once
+"""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List
+from .bedrock_limiter import BedrockThrottledError
+from .cache import MOCK_SOURCE
+from .semantic_cache import is_mock
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+class ComparisonEngine:
+    """Fans a comparison out to the orchestrator and ranks the results
+
+    Each country needs a market analysis and a risk assessment. Instead of
+    analyzing countries one after another, all (country x agent) calls are
+    started together and a semaphore caps how many run at the same time.
+    """
+
+    def __init__(self, orchestrator, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Args:
+            orchestrator: Object exposing comprehensive_market_entry_analysis_async
+            max_concurrency: Maximum agent calls in flight for one comparison
+        """
+        self.orchestrator = orchestrator
+        self.max_concurrency = max_concurrency
+
+    async def compare(self, countries: List[str], industry: str) -> List[Dict[str, Any]]:
+        """
+        Analyze every country concurrently and return the ranked rows
+
+        Args:
+            countries: Countries to compare
+            industry: Industry sector
+
+        Returns:
+            Comparison rows ordered by risk score, lowest first
+        """
+        limiter = asyncio.Semaphore(self.max_concurrency)
+        with span("comparison.compare", countries=len(countries)):
+            rows = await asyncio.gather(*[
+                self._analyze_country(country, industry, limiter) for country in countries
+            ])
+        return self.rank(rows)
+
+    async def iter_rows(self, countries: List[str], industry: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield comparison rows in completion order, as each country finishes"""
+        limiter = asyncio.Semaphore(self.max_concurrency)
+        tasks = [
+            asyncio.ensure_future(self._analyze_country(country, industry, limiter))
+            for country in countries
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # A consumer that stops early must not leave model calls running
+            for task in tasks:
+                task.cancel()
+
+    async def _analyze_country(self, country: str, industry: str, limiter: asyncio.Semaphore) -> Dict[str, Any]:
+        """Run the comprehensive analysis for one country and reduce it to a row"""
+        try:
+            result = await self.orchestrator.comprehensive_market_entry_analysis_async(country, industry, limiter=limiter)
+        except BedrockThrottledError as e:
+            logger.warning(f"Comparison analysis throttled for {industry} in {country}: {str(e)}")
+            return {"country": country, "risk_score": None, "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            logger.error(f"Comparison analysis failed for {industry} in {country}: {str(e)}")
+            return {"country": country, "risk_score": None, "error": str(e)}
+
+        return self._build_row(country, result)
+
+    def _build_row(self, country: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the comparison fields from a comprehensive analysis"""
+        recommendation = result["recommendation"]
+        market_research = result["market_research"]
+        row = {
+            "country": country,
+            "decision": recommendation["decision"],
+            "priority": recommendation["priority"],
+            "risk_score": recommendation["risk_score"],
+            "risk_level": result["risk_assessment"].get("risk_level"),
+            "market_size": market_research.get("market_size"),
+            "growth_rate": market_research.get("growth_rate")
+        }
+        # Rows built from mock fallback figures say so, and are never cached
+        if is_mock(market_research) or is_mock(result["risk_assessment"]):
+            row["source"] = MOCK_SOURCE
+        return row
+
+    @staticmethod
+    def rank(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sort rows by risk score (lower is better); rows without a score go last"""
+        return sorted(rows, key=lambda row: (row["risk_score"] is None, row["risk_score"] or 0))
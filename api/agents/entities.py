@@ -0,0 +1,298 @@
+"""
+Entity Registry for API
+Canonical countries and industries with ISO codes, aliases and regions
+"""
+
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+REGIONS = ("africa", "americas", "asia", "europe", "pacific")
+
+# Place names that contain a country demonym but name no country ("Latin American" is not "American")
+NON_COUNTRY_TERMS = (
+    "Latin America", "Latin American", "South America", "South American", "North America", "North American",
+    "Central America", "Central American", "Indian Ocean",
+)
+
+
+class Country(NamedTuple):
+    """A country under its canonical name"""
+    name: str
+    iso2: str
+    iso3: str
+    region: str
+    aliases: Tuple[str, ...] = ()
+    demonyms: Tuple[str, ...] = ()  # "German market": a country in free text only when none is named outright
+
+
+class Industry(NamedTuple):
+    """An industry sector under its canonical (lowercase) name"""
+    name: str
+    aliases: Tuple[str, ...] = ()
+
+
+COUNTRIES: Tuple[Country, ...] = (
+    # Europe
+    Country("Germany", "DE", "DEU", "europe", demonyms=("German",)),
+    Country("United Kingdom", "GB", "GBR", "europe", ("UK", "Britain", "Great Britain"), ("British",)),
+    Country("France", "FR", "FRA", "europe", demonyms=("French",)),
+    Country("Italy", "IT", "ITA", "europe", demonyms=("Italian",)),
+    Country("Spain", "ES", "ESP", "europe", demonyms=("Spanish",)),
+    Country("Netherlands", "NL", "NLD", "europe", ("Holland",), ("Dutch",)),
+    Country("Sweden", "SE", "SWE", "europe", demonyms=("Swedish",)),
+    Country("Norway", "NO", "NOR", "europe"),
+    Country("Denmark", "DK", "DNK", "europe"),
+    Country("Finland", "FI", "FIN", "europe"),
+    Country("Switzerland", "CH", "CHE", "europe", demonyms=("Swiss",)),
+    Country("Austria", "AT", "AUT", "europe"),
+    Country("Belgium", "BE", "BEL", "europe"),
+    Country("Ireland", "IE", "IRL", "europe", demonyms=("Irish",)),
+    Country("Estonia", "EE", "EST", "europe", demonyms=("Estonian",)),
+    Country("Latvia", "LV", "LVA", "europe"),
+    Country("Lithuania", "LT", "LTU", "europe"),
+    Country("Slovenia", "SI", "SVN", "europe"),
+    Country("Malta", "MT", "MLT", "europe"),
+    Country("Cyprus", "CY", "CYP", "europe"),
+    Country("Moldova", "MD", "MDA", "europe"),
+    Country("Albania", "AL", "ALB", "europe"),
+    Country("North Macedonia", "MK", "MKD", "europe"),
+    Country("Montenegro", "ME", "MNE", "europe"),
+    Country("Bosnia and Herzegovina", "BA", "BIH", "europe", ("Bosnia",)),
+    Country("Serbia", "RS", "SRB", "europe"),
+    Country("Croatia", "HR", "HRV", "europe"),
+    Country("Bulgaria", "BG", "BGR", "europe"),
+    Country("Romania", "RO", "ROU", "europe"),
+    Country("Hungary", "HU", "HUN", "europe"),
+    Country("Czech Republic", "CZ", "CZE", "europe", ("Czechia",)),
+    Country("Slovakia", "SK", "SVK", "europe"),
+    Country("Poland", "PL", "POL", "europe", demonyms=("Polish",)),
+    Country("Ukraine", "UA", "UKR", "europe"),
+    Country("Belarus", "BY", "BLR", "europe"),
+    Country("Russia", "RU", "RUS", "europe"),
+    Country("Georgia", "GE", "GEO", "europe"),
+    Country("Armenia", "AM", "ARM", "europe"),
+
+    # Americas
+    Country("United States", "US", "USA", "americas", ("USA",), ("American",)),
+    Country("Canada", "CA", "CAN", "americas", demonyms=("Canadian",)),
+    Country("Mexico", "MX", "MEX", "americas", demonyms=("Mexican",)),
+    Country("Brazil", "BR", "BRA", "americas", demonyms=("Brazilian",)),
+    Country("Ecuador", "EC", "ECU", "americas"),
+    Country("Uruguay", "UY", "URY", "americas"),
+    Country("Paraguay", "PY", "PRY", "americas"),
+    Country("Costa Rica", "CR", "CRI", "americas"),
+    Country("Panama", "PA", "PAN", "americas"),
+    Country("Jamaica", "JM", "JAM", "americas"),
+    Country("Cuba", "CU", "CUB", "americas"),
+    Country("Guatemala", "GT", "GTM", "americas"),
+    Country("Honduras", "HN", "HND", "americas"),
+    Country("Nicaragua", "NI", "NIC", "americas"),
+    Country("El Salvador", "SV", "SLV", "americas"),
+    Country("Haiti", "HT", "HTI", "americas"),
+    Country("Dominican Republic", "DO", "DOM", "americas"),
+    Country("Trinidad and Tobago", "TT", "TTO", "americas", ("Trinidad",)),
+    Country("Barbados", "BB", "BRB", "americas"),
+    Country("Bahamas", "BS", "BHS", "americas"),
+    Country("Belize", "BZ", "BLZ", "americas"),
+    Country("Guyana", "GY", "GUY", "americas"),
+    Country("Suriname", "SR", "SUR", "americas"),
+    Country("Venezuela", "VE", "VEN", "americas"),
+    Country("Colombia", "CO", "COL", "americas"),
+    Country("Peru", "PE", "PER", "americas"),
+    Country("Bolivia", "BO", "BOL", "americas"),
+    Country("Chile", "CL", "CHL", "americas"),
+    Country("Argentina", "AR", "ARG", "americas"),
+
+    # Asia
+    Country("Japan", "JP", "JPN", "asia", demonyms=("Japanese",)),
+    Country("China", "CN", "CHN", "asia", demonyms=("Chinese",)),
+    Country("India", "IN", "IND", "asia", demonyms=("Indian",)),
+    Country("South Korea", "KR", "KOR", "asia", ("Korea",), ("Korean",)),
+    Country("Singapore", "SG", "SGP", "asia"),
+    Country("Hong Kong", "HK", "HKG", "asia"),
+    Country("Bangladesh", "BD", "BGD", "asia"),
+    Country("Nepal", "NP", "NPL", "asia"),
+    Country("Myanmar", "MM", "MMR", "asia"),
+    Country("Sri Lanka", "LK", "LKA", "asia"),
+    Country("Maldives", "MV", "MDV", "asia"),
+    Country("Bhutan", "BT", "BTN", "asia"),
+    Country("Mongolia", "MN", "MNG", "asia"),
+    Country("Kazakhstan", "KZ", "KAZ", "asia"),
+    Country("Uzbekistan", "UZ", "UZB", "asia"),
+    Country("Afghanistan", "AF", "AFG", "asia"),
+    Country("Pakistan", "PK", "PAK", "asia"),
+    Country("Cambodia", "KH", "KHM", "asia"),
+    Country("Laos", "LA", "LAO", "asia"),
+    Country("Vietnam", "VN", "VNM", "asia", demonyms=("Vietnamese",)),
+    Country("Thailand", "TH", "THA", "asia"),
+    Country("Philippines", "PH", "PHL", "asia"),
+    Country("Indonesia", "ID", "IDN", "asia", demonyms=("Indonesian",)),
+    Country("Malaysia", "MY", "MYS", "asia"),
+    Country("Brunei", "BN", "BRN", "asia"),
+    Country("Taiwan", "TW", "TWN", "asia"),
+    Country("North Korea", "KP", "PRK", "asia"),
+    Country("Kyrgyzstan", "KG", "KGZ", "asia"),
+    Country("Tajikistan", "TJ", "TJK", "asia"),
+
+    # Africa
+    Country("Rwanda", "RW", "RWA", "africa", demonyms=("Rwandan",)),
+    Country("Kenya", "KE", "KEN", "africa", demonyms=("Kenyan",)),
+    Country("Ghana", "GH", "GHA", "africa"),
+    Country("Nigeria", "NG", "NGA", "africa", demonyms=("Nigerian",)),
+    Country("Egypt", "EG", "EGY", "africa"),
+    Country("Morocco", "MA", "MAR", "africa"),
+    Country("South Africa", "ZA", "ZAF", "africa"),
+    Country("Madagascar", "MG", "MDG", "africa"),
+    Country("Ethiopia", "ET", "ETH", "africa"),
+    Country("Tanzania", "TZ", "TZA", "africa"),
+    Country("Uganda", "UG", "UGA", "africa"),
+    Country("Botswana", "BW", "BWA", "africa"),
+    Country("Mauritius", "MU", "MUS", "africa"),
+    Country("Senegal", "SN", "SEN", "africa"),
+    Country("Mali", "ML", "MLI", "africa"),
+    Country("Burkina Faso", "BF", "BFA", "africa"),
+    Country("Niger", "NE", "NER", "africa"),
+    Country("Chad", "TD", "TCD", "africa"),
+    Country("Sudan", "SD", "SDN", "africa"),
+    Country("Libya", "LY", "LBY", "africa"),
+    Country("Algeria", "DZ", "DZA", "africa"),
+    Country("Tunisia", "TN", "TUN", "africa"),
+    Country("Cameroon", "CM", "CMR", "africa"),
+    Country("Ivory Coast", "CI", "CIV", "africa", ("Cote d'Ivoire",)),
+    Country("Zambia", "ZM", "ZMB", "africa"),
+    Country("Zimbabwe", "ZW", "ZWE", "africa"),
+
+    # Pacific
+    Country("Australia", "AU", "AUS", "pacific", demonyms=("Australian",)),
+    Country("New Zealand", "NZ", "NZL", "pacific"),
+    Country("Fiji", "FJ", "FJI", "pacific"),
+    Country("Samoa", "WS", "WSM", "pacific"),
+    Country("Tonga", "TO", "TON", "pacific"),
+    Country("Vanuatu", "VU", "VUT", "pacific"),
+    Country("Papua New Guinea", "PG", "PNG", "pacific"),
+    Country("Solomon Islands", "SB", "SLB", "pacific"),
+    Country("Palau", "PW", "PLW", "pacific"),
+    Country("Micronesia", "FM", "FSM", "pacific"),
+    Country("Marshall Islands", "MH", "MHL", "pacific"),
+    Country("Kiribati", "KI", "KIR", "pacific"),
+    Country("Tuvalu", "TV", "TUV", "pacific"),
+    Country("Nauru", "NR", "NRU", "pacific"),
+)
+
+INDUSTRIES: Tuple[Industry, ...] = (
+    Industry("technology", ("tech",)),
+    Industry("fintech", ("financial technology",)),
+    Industry("e-commerce", ("ecommerce", "online retail")),
+    Industry("healthcare", ("health care",)),
+    Industry("manufacturing"),
+    Industry("retail"),
+    Industry("automotive"),
+    Industry("energy"),
+    Industry("telecommunications", ("telecom",)),
+    Industry("media"),
+    Industry("banking"),
+    Industry("insurance"),
+    Industry("real estate"),
+    Industry("education"),
+    Industry("gaming"),
+    Industry("artificial intelligence", ("AI",)),
+    Industry("machine learning", ("ML",)),
+    Industry("blockchain"),
+    Industry("cybersecurity"),
+    Industry("cloud computing"),
+    Industry("software"),
+    Industry("hardware"),
+    Industry("agriculture"),
+    Industry("tourism"),
+    Industry("mining"),
+    Industry("construction"),
+    Industry("logistics"),
+    Industry("aerospace"),
+)
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+class EntityRegistry:
+    """Lookup of countries and industries by name, alias or ISO code
+
+    Everything downstream (parsed queries, request models, cache keys, batch
+    deduplication, mock tables) goes through one registry, so "UK",
+    "Britain" and "GB" are analyzed, cached and billed once, as
+    "United Kingdom". Names the registry does not know are passed through
+    with their whitespace tidied, so the API still accepts them.
+    """
+
+    def __init__(self, countries: Sequence[Country] = COUNTRIES, industries: Sequence[Industry] = INDUSTRIES):
+        self.countries: Tuple[Country, ...] = tuple(countries)
+        self.industries: Tuple[Industry, ...] = tuple(industries)
+
+        countries_by_term: Dict[str, Country] = {}
+        for country in self.countries:
+            for term in (country.name, country.iso2, country.iso3) + country.aliases + country.demonyms:
+                countries_by_term[term.lower()] = country
+        industries_by_term: Dict[str, Industry] = {}
+        for industry in self.industries:
+            for term in (industry.name,) + industry.aliases:
+                industries_by_term[term.lower()] = industry
+
+        self._countries: Mapping[str, Country] = MappingProxyType(countries_by_term)
+        self._industries: Mapping[str, Industry] = MappingProxyType(industries_by_term)
+
+    def country(self, text: str) -> Optional[Country]:
+        """Country named by a canonical name, alias, demonym or ISO 3166 alpha-2/alpha-3 code (any case)"""
+        return self._countries.get(_clean(text).lower())
+
+    def industry(self, text: str) -> Optional[Industry]:
+        """Industry named by its canonical name or an alias (any case)"""
+        return self._industries.get(_clean(text).lower())
+
+    def canonical_country(self, text: str) -> str:
+        """Canonical country name, or the tidied input if the country is unknown"""
+        country = self.country(text)
+        return country.name if country is not None else _clean(text)
+
+    def canonical_industry(self, text: str) -> str:
+        """Canonical industry name, or the tidied input if the industry is unknown"""
+        industry = self.industry(text)
+        return industry.name if industry is not None else _clean(text)
+
+    def country_id(self, text: str) -> str:
+        """Stable identifier for cache keys: the ISO alpha-2 code, or the lowercased name if unknown"""
+        country = self.country(text)
+        return country.iso2 if country is not None else _clean(text).lower()
+
+    def industry_id(self, text: str) -> str:
+        """Stable identifier for cache keys: the canonical name, lowercased if unknown"""
+        return self.canonical_industry(text).lower()
+
+    def region(self, region: str) -> List[Country]:
+        """Countries of a region (one of REGIONS)"""
+        return [country for country in self.countries if country.region == region]
+
+    def country_terms(self) -> Iterator[Tuple[str, str]]:
+        """(term, canonical name) for free-text matching: names and aliases, but not the ISO codes or demonyms"""
+        for country in self.countries:
+            for term in (country.name,) + country.aliases:
+                yield term, country.name
+
+    def demonym_terms(self) -> Iterator[Tuple[str, str]]:
+        """(demonym, canonical name) for free-text matching, weaker evidence than a country name"""
+        for country in self.countries:
+            for term in country.demonyms:
+                yield term, country.name
+
+    def industry_terms(self) -> Iterator[Tuple[str, str]]:
+        """(term, canonical name) for free-text matching"""
+        for industry in self.industries:
+            for term in (industry.name,) + industry.aliases:
+                yield term, industry.name
+
+
+@lru_cache(maxsize=None)
+def get_registry() -> EntityRegistry:
+    """The process-wide registry, built on first use"""
+    return EntityRegistry()
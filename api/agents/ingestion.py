@@ -0,0 +1,366 @@
+"""
+Document Ingestion for API
+Streams research documents through loading, splitting, deduplication and cached, batched embedding into the index
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .bedrock_limiter import is_throttling_error
+from .vector_store import DocumentChunks, IndexWriter
+
+try:
+    import PyPDF2
+except ImportError:  # Optional: PDFs are skipped without it
+    PyPDF2 = None
+
+try:
+    import docx
+except ImportError:  # Optional: Word documents are skipped without python-docx
+    docx = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_SEPARATORS = ("\n\n", "\n", " ", "")
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_WINDOW = 100
+
+STATE_KEY = "ingestion/documents.json"
+TEXT_SUFFIXES = (".txt", ".md")
+
+EmbedFunction = Callable[[Sequence[str]], np.ndarray]
+
+
+class SourceDocument(NamedTuple):
+    """A loaded document before splitting"""
+    doc_id: str
+    text: str
+    metadata: Dict[str, Any] = {}
+
+
+def content_hash(text: str) -> str:
+    """Address of a piece of text in the embedding cache and the ingestion state"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_text(path: Path) -> Optional[str]:
+    suffix = path.suffix.lower()
+    if suffix in TEXT_SUFFIXES:
+        return path.read_text(encoding="utf-8", errors="replace")
+    if suffix == ".pdf" and PyPDF2 is not None:
+        return "\n\n".join(page.extract_text() or "" for page in PyPDF2.PdfReader(str(path)).pages)
+    if suffix == ".docx" and docx is not None:
+        return "\n\n".join(paragraph.text for paragraph in docx.Document(str(path)).paragraphs)
+    return None
+
+
+def load_documents(paths: Iterable[str], root: Optional[str] = None) -> Iterator[SourceDocument]:
+    """
+    Load text, PDF and Word files one at a time
+
+    Directories are walked in sorted order. Files with no loader (or whose
+    optional package is not installed) are skipped with a warning.
+
+    Args:
+        paths: Files or directories
+        root: Document IDs are paths relative to this directory (default: as given)
+    """
+    for location in paths:
+        location = Path(location)
+        files = sorted(path for path in location.rglob("*") if path.is_file()) if location.is_dir() else [location]
+        for path in files:
+            text = _read_text(path)
+            if text is None:
+                logger.warning(f"⚠️ No loader for {path}, skipping")
+                continue
+            doc_id = path.relative_to(root).as_posix() if root else path.as_posix()
+            yield SourceDocument(doc_id, text, {"source": path.name})
+
+
+class TextSplitter:
+    """Recursive character splitting, as LangChain's RecursiveCharacterTextSplitter does it
+
+    Text is split on the first separator it contains; pieces longer than
+    ``chunk_size`` are split again on the next separator, and neighbouring
+    pieces are merged back into chunks of up to ``chunk_size`` characters
+    that overlap by up to ``chunk_overlap``. Separators are not kept.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+                 separators: Sequence[str] = DEFAULT_SEPARATORS):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+
+    def split(self, text: str) -> List[str]:
+        return self._split(text, self.separators)
+
+    def _split(self, text: str, separators: Sequence[str]) -> List[str]:
+        separator, remaining = separators[-1], ()
+        for i, candidate in enumerate(separators):
+            if candidate == "" or candidate in text:
+                separator, remaining = candidate, separators[i + 1:]
+                break
+
+        pieces = [piece for piece in (text.split(separator) if separator else list(text)) if piece]
+        chunks, short = [], []
+        for piece in pieces:
+            if len(piece) < self.chunk_size:
+                short.append(piece)
+                continue
+            if short:
+                chunks.extend(self._merge(short, separator))
+                short = []
+            chunks.extend(self._split(piece, remaining) if remaining else [piece])
+        if short:
+            chunks.extend(self._merge(short, separator))
+        return chunks
+
+    def _merge(self, pieces: Sequence[str], separator: str) -> List[str]:
+        chunks, current, total = [], [], 0
+        for piece in pieces:
+            joined = len(separator) if current else 0
+            if current and total + joined + len(piece) > self.chunk_size:
+                chunk = separator.join(current).strip()
+                if chunk:
+                    chunks.append(chunk)
+                # Keep a tail of the previous chunk as overlap
+                while current and (total > self.chunk_overlap or total + len(separator) + len(piece) > self.chunk_size):
+                    total -= len(current[0]) + (len(separator) if len(current) > 1 else 0)
+                    current.pop(0)
+            current.append(piece)
+            total += len(piece) + (len(separator) if len(current) > 1 else 0)
+        chunk = separator.join(current).strip()
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+
+class EmbeddingCache:
+    """Embeddings addressed by the hash of their text, in SQLite
+
+    Vectors are keyed by (model, content hash), so a chunk is embedded once
+    per model no matter how many documents or ingestion runs contain it.
+    The file can be shared by every process on a host.
+    """
+
+    def __init__(self, path: str, model_id: str):
+        self.path = path
+        self.model_id = model_id
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, hash))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for the hashes that have one"""
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    (self.model_id, *batch)
+                )
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def set_many(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            self._connection().executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [(self.model_id, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_id,)).fetchone()[0]
+
+
+class IngestionPipeline:
+    """Documents in, index generations out
+
+    Documents stream through in windows of ``window``. A document whose text
+    hash matches the last ingested version is skipped; the rest are split,
+    their repeated chunks dropped, and only chunks with no cached embedding
+    are sent to the model, ``batch_size`` texts per request with at most
+    ``max_concurrency`` requests in flight. Each window is one IndexWriter
+    commit, so the work done is proportional to what changed.
+    """
+
+    def __init__(self, writer: IndexWriter, embed: EmbedFunction, cache: Optional[EmbeddingCache] = None,
+                 splitter: Optional[TextSplitter] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_retries: int = DEFAULT_MAX_RETRIES,
+                 window: int = DEFAULT_WINDOW):
+        """
+        Args:
+            writer: Index the chunks are committed to
+            embed: Function from a list of texts to one vector per text (e.g. BedrockEmbedder.embed)
+            cache: Content-addressed embedding cache; None embeds every chunk
+            splitter: Chunking (defaults to 1000 characters with 200 overlap, as in notebook 05)
+            batch_size: Texts per embedding request
+            max_concurrency: Embedding requests in flight
+            max_retries: Attempts per text while the model is throttling (at least 1)
+            window: Documents per commit
+        """
+        if max_retries < 1:
+            raise ValueError("max_retries must be at least 1")
+        self.writer = writer
+        self.embed = embed
+        self.cache = cache
+        self.splitter = splitter or TextSplitter()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.window = window
+
+    def run(self, documents: Iterable[SourceDocument], delete_missing: bool = False) -> Dict[str, int]:
+        """
+        Ingest documents, replacing changed ones
+
+        Args:
+            documents: Documents to ingest, e.g. from load_documents
+            delete_missing: Also delete previously ingested documents not in ``documents``
+
+        Returns:
+            Counts of documents and chunks processed, skipped and embedded
+        """
+        state = self._load_state()
+        stats = {"documents": 0, "unchanged": 0, "ingested": 0, "deleted": 0,
+                 "chunks": 0, "duplicate_chunks": 0, "embedded": 0, "cached": 0}
+        seen = set()
+        pending: List[Tuple[SourceDocument, str]] = []
+        for document in documents:
+            stats["documents"] += 1
+            seen.add(document.doc_id)
+            digest = content_hash(document.text)
+            if state.get(document.doc_id) == digest:
+                stats["unchanged"] += 1
+                continue
+            pending.append((document, digest))
+            if len(pending) >= self.window:
+                self._ingest(pending, state, stats)
+                pending = []
+        if pending:
+            self._ingest(pending, state, stats)
+
+        if delete_missing:
+            missing = sorted(set(state) - seen)
+            if missing:
+                self.writer.commit(deletions=missing)
+                for doc_id in missing:
+                    del state[doc_id]
+                self._save_state(state)
+                stats["deleted"] = len(missing)
+        logger.info(f"Ingestion finished: {stats}")
+        return stats
+
+    def _ingest(self, documents: Sequence[Tuple[SourceDocument, str]], state: Dict[str, str], stats: Dict[str, int]):
+        split = []
+        for document, _ in documents:
+            texts = self.splitter.split(document.text)
+            # {content hash: text}; a chunk repeated within a document is indexed once
+            chunks: Dict[str, str] = {}
+            for text in texts:
+                chunks.setdefault(content_hash(text), text)
+            stats["duplicate_chunks"] += len(texts) - len(chunks)
+            stats["chunks"] += len(chunks)
+            split.append(chunks)
+        # Chunks shared between documents are embedded once
+        vectors = self._vectors({key: text for chunks in split for key, text in chunks.items()}, stats)
+
+        upserts = [
+            DocumentChunks(document.doc_id, list(chunks.values()), np.stack([vectors[key] for key in chunks]),
+                           document.metadata, [{"hash": key} for key in chunks])
+            for (document, _), chunks in zip(documents, split) if chunks
+        ]
+        # Documents that are now empty are removed rather than left with stale chunks
+        emptied = [document.doc_id for (document, _), chunks in zip(documents, split) if not chunks]
+        self.writer.commit(upserts, deletions=emptied)
+
+        for document, digest in documents:
+            state[document.doc_id] = digest
+        self._save_state(state)
+        stats["ingested"] += len(documents)
+
+    def _vectors(self, texts: Dict[str, str], stats: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """Embedding per content hash, from the cache or the model"""
+        keys = list(texts)
+        vectors = self.cache.get_many(keys) if self.cache is not None else {}
+        stats["cached"] += len(vectors)
+        missing = [key for key in keys if key not in vectors]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+
+        def embed_batch(batch: List[str]) -> Dict[str, np.ndarray]:
+            rows = self._embed_with_retry([texts[key] for key in batch])
+            embedded = dict(zip(batch, np.asarray(rows, dtype=np.float32)))
+            if self.cache is not None:
+                # Saved per batch, so an interrupted run keeps what it paid for
+                self.cache.set_many(embedded)
+            return embedded
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed") as pool:
+            for embedded in pool.map(embed_batch, batches):
+                vectors.update(embedded)
+        stats["embedded"] += len(missing)
+        return vectors
+
+    def _embed_with_retry(self, texts: List[str]) -> np.ndarray:
+        # A throttled request loses whatever it had embedded, so the batch is
+        # retried one text at a time: a later throttle then repeats only the
+        # text that was refused, never the rows already returned.
+        try:
+            return np.asarray(self.embed(texts), dtype=np.float32)
+        except Exception as e:
+            if not is_throttling_error(e) or self.max_retries == 1:
+                raise
+            self._back_off(0)
+        return np.stack([self._embed_text(text) for text in texts])
+
+    def _embed_text(self, text: str) -> np.ndarray:
+        for attempt in range(1, self.max_retries):
+            try:
+                return np.asarray(self.embed([text]), dtype=np.float32)[0]
+            except Exception as e:
+                if not is_throttling_error(e) or attempt == self.max_retries - 1:
+                    raise
+                self._back_off(attempt)
+
+    @staticmethod
+    def _back_off(attempt: int):
+        delay = 2 ** attempt
+        logger.warning(f"⚠️ Embedding throttled, retrying in {delay}s")
+        time.sleep(delay)
+
+    def _load_state(self) -> Dict[str, str]:
+        # {document ID: hash of the text last ingested}, kept next to the index it describes
+        data = self.writer.store.get(STATE_KEY)
+        return json.loads(data) if data is not None else {}
+
+    def _save_state(self, state: Dict[str, str]):
+        self.writer.store.put(STATE_KEY, json.dumps(state, sort_keys=True).encode("utf-8"))
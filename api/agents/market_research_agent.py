@@ -3,110 +3,136 @@ Market Research Agent for API
 Simplified version of the notebook agent for API usage
 """
 
-import boto3
-import json
 import logging
-from typing import Dict, Any
+import re
+from functools import partial
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+from .base_agent import BedrockAgent
+from .baseline_scores import market_figures
+from .prompts import PromptTemplate
+from .structured_output import Field, OutputSchema, heading_pattern
 
 logger = logging.getLogger(__name__)
 
-class MarketResearchAgent:
+AMOUNT = r"(?P<value>\d[\d,]*(?:\.\d+)?)"
+MAGNITUDE = r"(?P<unit>trillion|billion|million|thousand|tn|bn|mn|[tbmk])"
+YEAR = r"(?:19|20)\d\d\b"
+
+MARKET_SCHEMA = OutputSchema([
+    Field(
+        "market_size", "number", "current market size in US dollars as a plain number",
+        minimum=0,
+        patterns=[
+            # "$45 billion", "USD 12.3bn": the first currency amount, even after a year
+            re.compile(
+                rf"market size[^\n]{{0,40}}?(?:US\s?\$|USD|\$)\s*{AMOUNT}\s*{MAGNITUDE}?\b",
+                re.IGNORECASE
+            ),
+            # "850 million" without a currency sign
+            re.compile(rf"market size[^\n]{{0,40}}?\b{AMOUNT}\s*{MAGNITUDE}\b", re.IGNORECASE),
+            # A bare figure right after the label, but never a year such as "(2023)"
+            re.compile(rf"market size[^$\d\n]{{0,40}}(?!{YEAR}){AMOUNT}\b", re.IGNORECASE)
+        ]
+    ),
+    Field(
+        "growth_rate", "number", "expected annual growth rate in percent as a plain number",
+        minimum=-100, maximum=1000,
+        patterns=[re.compile(r"(?:CAGR|growth)[^%\n]{0,60}?(?P<value>-?\d+(?:\.\d+)?)\s*%", re.IGNORECASE)]
+    ),
+    Field("key_players", "list", "list of the leading companies", heading=heading_pattern("players|competitors")),
+    Field("opportunities", "list", "list of short opportunity statements", heading=heading_pattern("opportunities")),
+    Field("challenges", "list", "list of short challenge statements",
+          heading=heading_pattern("challenges|entry barriers|barriers")),
+])
+
+MARKET_TEMPLATES = {
+    template.analysis_type: template
+    for template in (
+        PromptTemplate("market_research", "market", "1", """
+            Analyze the {industry} market in {country} for a company deciding whether to enter it. Cover:
+
+            1. Market Size and Growth
+            2. Key Market Players
+            3. Market Opportunities
+            4. Regulatory Environment
+            5. Consumer Behavior and Trends
+            6. Competitive Landscape
+            7. Entry Barriers and Challenges
+
+            Give specific data points and market size estimates, and keep each section to actionable insights.
+            """, MARKET_SCHEMA.instructions()),
+        PromptTemplate("market_research", "comprehensive", "1", """
+            In at most 300 words, assess the {industry} market in {country} for a market entry decision:
+            size, growth, key players, main opportunities and main challenges.
+            """, MARKET_SCHEMA.instructions()),
+        PromptTemplate("market_research", "chat_summary", "1", """
+            In at most 120 words, summarize the {industry} market in {country}:
+            size, growth, and the most important players and opportunities.
+            """, MARKET_SCHEMA.instructions()),
+    )
+}
+
+class MarketResearchAgent(BedrockAgent):
     """Market research agent for analyzing market opportunities"""
     
-    def __init__(self):
-        """Initialize the market research agent"""
-        try:
-            self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-            self.model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
-            logger.info("✅ Market Research Agent initialized with Bedrock")
-        except Exception as e:
-            logger.warning(f"⚠️ Bedrock not available, using mock mode: {str(e)}")
-            self.bedrock_client = None
+    agent_name = "market_research"
+    display_name = "Market Research Agent"
+    default_analysis_type = "market"
+    templates = MARKET_TEMPLATES
+    retrieval_query = "{industry} market size, growth, competitors and consumers in {country}"
     
-    def analyze_market(self, country: str, industry: str) -> Dict[str, Any]:
+    def analyze_market(self, country: str, industry: str, analysis_type: str = "market") -> Dict[str, Any]:
         """
         Analyze market opportunities for a specific country and industry
         
         Args:
             country: Target country name
             industry: Industry sector
+            analysis_type: "market" for the full report, "comprehensive" for the
+                shorter section used in combined analyses, "chat_summary" for chat
             
         Returns:
             Dictionary containing market analysis results
         """
         
-        if self.bedrock_client:
-            return self._analyze_with_bedrock(country, industry)
-        else:
-            return self._analyze_mock(country, industry)
+        return self._run(country, industry, analysis_type, self._analyze_mock)
     
-    def _analyze_with_bedrock(self, country: str, industry: str) -> Dict[str, Any]:
-        """Analyze market using Bedrock Claude model"""
+    async def analyze_market_async(self, country: str, industry: str, analysis_type: str = "market") -> Dict[str, Any]:
+        """
+        Non-blocking variant of analyze_market for async callers
         
-        prompt = f"""
-        Analyze the {industry} market in {country}. Provide a comprehensive market research analysis including:
-
-        1. Market Size and Growth
-        2. Key Market Players
-        3. Market Opportunities
-        4. Regulatory Environment
-        5. Consumer Behavior and Trends
-        6. Competitive Landscape
-        7. Entry Barriers and Challenges
-
-        Please provide specific data points, market size estimates, and actionable insights.
-        Focus on practical business intelligence that would help a company make market entry decisions.
-
-        Country: {country}
-        Industry: {industry}
+        The Bedrock call runs on the shared executor so the event loop stays
+        free to serve other requests while the model is generating.
         """
         
-        try:
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4000,
-                "temperature": 0.1,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-            
-            response = self.bedrock_client.invoke_model(
-                modelId=self.model_id,
-                body=body
-            )
-            
-            response_body = json.loads(response['body'].read())
-            analysis_text = response_body['content'][0]['text']
-            
-            # Parse the response to extract structured data
-            return self._parse_analysis_response(analysis_text, country, industry)
-            
-        except Exception as e:
-            logger.error(f"Bedrock analysis failed: {str(e)}")
-            return self._analyze_mock(country, industry)
+        return await self._run_async(country, industry, analysis_type, self._analyze_mock)
     
-    def _analyze_mock(self, country: str, industry: str) -> Dict[str, Any]:
-        """Mock analysis for demo purposes"""
+    async def stream_market_analysis_async(self, country: str, industry: str, analysis_type: str = "market") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the market analysis as it is generated
         
-        # Mock data based on country and industry
-        market_sizes = {
-            "Germany": {"technology": 85000000000, "fintech": 12000000000, "healthcare": 45000000000},
-            "Japan": {"technology": 120000000000, "fintech": 8000000000, "healthcare": 65000000000},
-            "Rwanda": {"technology": 450000000, "fintech": 120000000, "healthcare": 280000000},
-            "Estonia": {"technology": 2100000000, "fintech": 340000000, "healthcare": 890000000}
-        }
+        Yields "delta" events with analysis text, then a single "result" event
+        carrying the same structured fields as analyze_market. A stream that
+        fails partway sends an "error" event, then the mock answer as the result.
+        """
         
-        growth_rates = {
-            "technology": 12.5, "fintech": 18.3, "healthcare": 8.7, "e-commerce": 15.2,
-            "manufacturing": 6.8, "energy": 9.4, "agriculture": 5.1
-        }
+        async for event in self._stream_async(country, industry, analysis_type, self._analyze_mock):
+            yield event
+    
+    def baseline_analysis(self, country: str, industry: str, figures: Tuple[int, float]) -> Dict[str, Any]:
+        """
+        Mock-mode analysis from figures already looked up, e.g. in one score_grid for a whole batch
+        
+        Args:
+            figures: (market size, growth rate), as market_figures returns them
+        """
+        
+        return self._mock(partial(self._analyze_mock, figures=figures), country, industry)
+    
+    def _analyze_mock(self, country: str, industry: str, figures: Optional[Tuple[int, float]] = None) -> Dict[str, Any]:
+        """Mock analysis for demo purposes, read from the precomputed baseline table"""
         
-        base_size = market_sizes.get(country, {}).get(industry, 2500000000)
-        growth_rate = growth_rates.get(industry, 10.0)
+        base_size, growth_rate = figures or market_figures(country, industry)
         
         return {
             "analysis": f"""
@@ -142,23 +168,26 @@ class MarketResearchAgent:
             ]
         }
     
+    def _parse_response(self, text: str, country: str, industry: str) -> Dict[str, Any]:
+        return self._parse_analysis_response(text, country, industry)
+    
     def _parse_analysis_response(self, analysis_text: str, country: str, industry: str) -> Dict[str, Any]:
-        """Parse Bedrock response into structured format"""
+        """Parse Bedrock response into structured format
+        
+        Fields the model did not supply (or supplied out of range) are None or
+        empty rather than invented, so downstream scoring sees real data only.
+        """
+        
+        fields, method = MARKET_SCHEMA.parse(analysis_text)
+        if method == "none":
+            logger.warning(f"No market figures found in model answer for {industry} in {country}")
         
-        # This is a simplified parser - in production, you'd want more sophisticated parsing
         return {
-            "analysis": analysis_text,
-            "market_size": 2500000000,  # Would extract from text
-            "growth_rate": 12.5,        # Would extract from text
-            "key_players": ["Player A", "Player B", "Player C"],
-            "opportunities": [
-                "Digital transformation",
-                "Market expansion",
-                "Innovation opportunities"
-            ],
-            "challenges": [
-                "Regulatory requirements",
-                "Competition",
-                "Market entry barriers"
-            ]
-        }
\ No newline at end of file
+            "analysis": MARKET_SCHEMA.strip_json(analysis_text),
+            "market_size": fields.get("market_size"),
+            "growth_rate": fields.get("growth_rate"),
+            "key_players": fields.get("key_players", []),
+            "opportunities": fields.get("opportunities", []),
+            "challenges": fields.get("challenges", []),
+            "extraction": method
+        }
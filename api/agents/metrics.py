@@ -0,0 +1,185 @@
+"""
+Metrics for API
+Prometheus histograms and counters for requests, Bedrock calls, parsing and caching
+"""
+
+import logging
+import os
+import time
+from typing import Any, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram
+except ImportError:  # Metrics are optional; without the package every metric is a no-op
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "market_research"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+RETRIEVAL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096)
+
+# USD per million (input, output) tokens, for cost estimates
+MODEL_PRICES = {
+    "anthropic.claude-3-sonnet-20240229-v1:0": (3.0, 15.0),
+    "anthropic.claude-3-haiku-20240307-v1:0": (0.25, 1.25),
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": (3.0, 15.0)
+}
+
+
+class _NoopMetric:
+    """Stands in for a labelled metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+
+def _histogram(name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]) -> Any:
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, namespace=NAMESPACE, buckets=buckets)
+
+
+def _counter(name: str, documentation: str, labels: Tuple[str, ...]) -> Any:
+    if prometheus_client is None:
+        return _NoopMetric()
+    return Counter(name, documentation, labels, namespace=NAMESPACE)
+
+
+REQUEST_LATENCY = _histogram(
+    "http_request_duration_seconds", "HTTP request latency, including the streamed body",
+    ("method", "endpoint", "status"), LATENCY_BUCKETS
+)
+CHAT_LATENCY = _histogram(
+    "chat_query_duration_seconds", "Chat query latency by parsed intent",
+    ("intent",), LATENCY_BUCKETS
+)
+BEDROCK_LATENCY = _histogram(
+    "bedrock_call_duration_seconds", "Bedrock model call latency",
+    ("agent", "analysis_type", "outcome"), LATENCY_BUCKETS
+)
+BEDROCK_FIRST_TOKEN = _histogram(
+    "bedrock_first_token_seconds", "Time to the first streamed text delta",
+    ("agent", "analysis_type"), LATENCY_BUCKETS
+)
+PARSE_LATENCY = _histogram(
+    "parse_duration_seconds", "Time to extract structured fields from a model answer",
+    ("agent", "method"), FAST_BUCKETS
+)
+RETRIEVAL_LATENCY = _histogram(
+    "retrieval_duration_seconds", "Time to find context passages, including any query embedding call",
+    ("backend",), RETRIEVAL_BUCKETS
+)
+QUEUE_WAIT = _histogram(
+    "executor_queue_wait_seconds", "Time a Bedrock call waited for an executor thread",
+    (), LATENCY_BUCKETS
+)
+TOKENS = _histogram(
+    "bedrock_tokens", "Tokens per Bedrock call",
+    ("agent", "analysis_type", "direction"), TOKEN_BUCKETS
+)
+COST = _counter(
+    "bedrock_cost_usd", "Estimated Bedrock spend from token counts and MODEL_PRICES",
+    ("agent", "analysis_type")
+)
+CACHE_REQUESTS = _counter(
+    "cache_requests", "Result cache lookups",
+    ("cache", "result")
+)
+BEDROCK_THROTTLES = _counter(
+    "bedrock_throttles", "Model calls throttled by Bedrock or refused by the concurrency limiter",
+    ("reason",)
+)
+RATE_LIMITED = _counter(
+    "rate_limited_requests", "Requests refused by the per-token rate limit",
+    ()
+)
+
+
+def estimate_cost(model_id: str, input_tokens: int, output_tokens: int) -> float:
+    """USD cost of one call; 0 for models missing from MODEL_PRICES"""
+    input_price, output_price = MODEL_PRICES.get(model_id, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss; ``cache`` is an agent name or "chat_parser" """
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Current metrics in the Prometheus text format
+
+    With PROMETHEUS_MULTIPROC_DIR set (gunicorn with several workers), the
+    values of all worker processes are aggregated; otherwise only this
+    process is reported.
+
+    Returns:
+        (body, content type)
+    """
+    if prometheus_client is None:
+        return b"# prometheus_client is not installed\n", "text/plain; version=0.0.4; charset=utf-8"
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exit(pid: int):
+    """Drop a dead worker's live gauges from the multiprocess directory (gunicorn child_exit hook)"""
+    if prometheus_client is not None and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+
+class PrometheusMiddleware:
+    """ASGI middleware timing every HTTP request
+
+    Requests are labelled with the route template (``/api/v1/session/{session_id}``)
+    rather than the raw path, so label cardinality stays bounded. The timer
+    stops when the last body chunk is sent, so streamed responses are
+    measured end to end.
+
+    Args:
+        app: The ASGI application to wrap
+        skip_paths: Paths that are not measured (e.g. the /metrics scrape itself)
+    """
+
+    def __init__(self, app: Any, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], endpoint, str(status[0])).observe(time.perf_counter() - start)
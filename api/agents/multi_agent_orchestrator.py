@@ -3,26 +3,53 @@ Multi-Agent Orchestrator for API
 Coordinates market research and risk assessment agents
 """
 
+import asyncio
 import logging
-from typing import Dict, Any
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple, Union
+from .bedrock_limiter import BedrockThrottledError
+from .cache import ResultCache
 from .market_research_agent import MarketResearchAgent
 from .risk_assessment_agent import RiskAssessmentAgent
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_AGENT_TIMEOUT = 90.0
+ANALYSIS_TYPE = "comprehensive"  # Shorter agent sections; the recommendation only needs the figures
+
 class MultiAgentOrchestrator:
     """Orchestrates multiple agents for comprehensive market analysis"""
     
-    def __init__(self):
-        """Initialize the orchestrator with all agents"""
-        self.market_agent = MarketResearchAgent()
-        self.risk_agent = RiskAssessmentAgent()
+    def __init__(self, agent_timeout: float = DEFAULT_AGENT_TIMEOUT, cache: Optional[ResultCache] = None,
+                 market_agent: Optional[MarketResearchAgent] = None, risk_agent: Optional[RiskAssessmentAgent] = None):
+        """
+        Initialize the orchestrator with all agents
+        
+        Args:
+            agent_timeout: Seconds each agent may take before its section is
+                reported as unavailable
+            cache: Result cache for agents created here. Combining two cached
+                analyses is cheap, so a repeat comprehensive analysis costs two
+                cache lookups and no model calls.
+            market_agent: Existing market research agent to reuse
+            risk_agent: Existing risk assessment agent to reuse
+        """
+        self.market_agent = market_agent or MarketResearchAgent(cache=cache)
+        self.risk_agent = risk_agent or RiskAssessmentAgent(cache=cache)
+        self.agent_timeout = agent_timeout
         logger.info("✅ Multi-Agent Orchestrator initialized")
     
     def comprehensive_market_entry_analysis(self, country: str, industry: str) -> Dict[str, Any]:
         """
         Perform comprehensive market entry analysis using all agents
         
+        The market and risk agents are independent, so both run at the same
+        time and the call takes roughly as long as the slower of the two.
+        
         Args:
             country: Target country name
             industry: Industry sector
@@ -31,30 +58,134 @@ class MultiAgentOrchestrator:
             Dictionary containing comprehensive analysis and recommendations
         """
         
-        try:
-            # Get market research analysis
-            logger.info(f"Running market analysis for {industry} in {country}")
-            market_analysis = self.market_agent.analyze_market(country, industry)
-            
-            # Get risk assessment
-            logger.info(f"Running risk assessment for {industry} in {country}")
-            risk_analysis = self.risk_agent.comprehensive_risk_assessment(country, industry)
+        logger.info(f"Running market analysis and risk assessment for {industry} in {country}")
+        with span("orchestrator.comprehensive", country=country, industry=industry):
+            executor = self.market_agent.executor
+            futures = {
+                "market_research": executor.submit(self.market_agent.analyze_market, country, industry, ANALYSIS_TYPE),
+                "risk_assessment": executor.submit(self.risk_agent.comprehensive_risk_assessment, country, industry, ANALYSIS_TYPE)
+            }
             
-            # Generate recommendation based on both analyses
-            recommendation = self._generate_recommendation(market_analysis, risk_analysis, country, industry)
+            deadline = time.monotonic() + self.agent_timeout
+            results, errors = {}, {}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    future.cancel()
+                    errors[name] = f"timed out after {self.agent_timeout}s"
+                except BedrockThrottledError as e:
+                    errors[name] = e
+                except Exception as e:
+                    errors[name] = str(e)
             
-            return {
-                "country": country,
-                "industry": industry,
-                "market_research": market_analysis,
-                "risk_assessment": risk_analysis,
-                "recommendation": recommendation,
-                "analysis_timestamp": "2024-01-01T00:00:00Z"  # Would use actual timestamp
-            }
+            return self._combine_results(country, industry, results, errors)
+    
+    async def comprehensive_market_entry_analysis_async(self, country: str, industry: str, limiter: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """
+        Async counterpart of comprehensive_market_entry_analysis
+        
+        Awaits both agents concurrently, each under its own timeout, so that
+        model latency never stalls the event loop.
+        
+        Args:
+            country: Target country name
+            industry: Industry sector
+            limiter: Optional semaphore shared with other analyses; each agent
+                call holds one slot while it runs
+        """
+        
+        logger.info(f"Running market analysis and risk assessment for {industry} in {country}")
+        with span("orchestrator.comprehensive", country=country, industry=industry):
+            outcomes = await asyncio.gather(
+                self._run_agent("market_research", partial(self.market_agent.analyze_market_async, country, industry, ANALYSIS_TYPE), limiter),
+                self._run_agent("risk_assessment", partial(self.risk_agent.comprehensive_risk_assessment_async, country, industry, ANALYSIS_TYPE), limiter)
+            )
             
-        except Exception as e:
-            logger.error(f"Comprehensive analysis failed: {str(e)}")
-            raise
+            results = {name: result for name, result, error in outcomes if error is None}
+            errors = {name: error for name, result, error in outcomes if error is not None}
+            return self._combine_results(country, industry, results, errors)
+    
+    async def _run_agent(self, name: str, call: Callable[[], Awaitable[Dict[str, Any]]], limiter: Optional[asyncio.Semaphore] = None) -> Tuple[str, Optional[Dict[str, Any]], Optional[Union[str, BedrockThrottledError]]]:
+        """Await one agent call, converting timeouts and failures into an error message
+
+        ``call`` makes the agent coroutine. It is only called once the coroutine
+        is about to be awaited, so a cancellation while waiting for a slot
+        leaves no coroutine that was never awaited.
+
+        Throttling is returned as the exception itself so that
+        ``_combine_results`` can pass it on when nothing else succeeded.
+        """
+        
+        with span(f"orchestrator.{name}") as current:
+            try:
+                if limiter is None:
+                    return name, await asyncio.wait_for(call(), self.agent_timeout), None
+                # The timeout only starts once a slot is free
+                async with limiter:
+                    return name, await asyncio.wait_for(call(), self.agent_timeout), None
+            except asyncio.TimeoutError:
+                current.set_attribute("error", "timeout")
+                return name, None, f"timed out after {self.agent_timeout}s"
+            except BedrockThrottledError as e:
+                current.set_attribute("error", "throttled")
+                return name, None, e
+            except Exception as e:
+                current.set_attribute("error", type(e).__name__)
+                return name, None, str(e)
+    
+    def combine_sections(self, country: str, industry: str, market_analysis: Dict[str, Any],
+                         risk_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """The comprehensive analysis payload for market and risk sections produced elsewhere (e.g. from a score grid)"""
+        
+        return self._combine_results(country, industry, {"market_research": market_analysis, "risk_assessment": risk_analysis}, {})
+    
+    def _combine_results(self, country: str, industry: str, results: Dict[str, Dict],
+                         errors: Dict[str, Union[str, BedrockThrottledError]]) -> Dict[str, Any]:
+        """
+        Join agent outputs into the comprehensive analysis payload
+        
+        A single failed agent yields a partial result: its section is marked
+        unavailable and the recommendation is built from what did come back.
+        
+        Raises:
+            BedrockThrottledError: If no agent produced a result and Bedrock
+                throttled at least one of them
+            RuntimeError: If no agent produced a result for any other reason
+        """
+        
+        throttled = [error for error in errors.values() if isinstance(error, BedrockThrottledError)]
+        errors = {name: str(error) for name, error in errors.items()}
+        for name, error in errors.items():
+            logger.error(f"{name} failed for {industry} in {country}: {error}")
+        
+        if not results:
+            if throttled:
+                raise max(throttled, key=lambda error: error.retry_after)
+            raise RuntimeError(f"Comprehensive analysis failed: {errors}")
+        
+        market_analysis = results.get("market_research")
+        risk_analysis = results.get("risk_assessment")
+        with span("orchestrator.recommendation"):
+            recommendation = self._generate_recommendation(market_analysis or {}, risk_analysis or {}, country, industry)
+        
+        analysis = {
+            "country": country,
+            "industry": industry,
+            "market_research": market_analysis or self._unavailable(errors["market_research"]),
+            "risk_assessment": risk_analysis or self._unavailable(errors["risk_assessment"]),
+            "recommendation": recommendation,
+            "analysis_timestamp": datetime.now(timezone.utc).isoformat(),
+            "partial": bool(errors)
+        }
+        if errors:
+            analysis["errors"] = errors
+        
+        return analysis
+    
+    def _unavailable(self, error: str) -> Dict[str, Any]:
+        """Placeholder section for an agent that did not return"""
+        return {"status": "unavailable", "error": error}
     
     def _generate_recommendation(self, market_analysis: Dict, risk_analysis: Dict, country: str, industry: str) -> Dict[str, Any]:
         """
@@ -70,15 +201,22 @@ class MultiAgentOrchestrator:
             Strategic recommendation with decision and priority
         """
         
-        risk_score = risk_analysis["overall_risk_score"]
-        market_size = market_analysis.get("market_size", 0)
-        growth_rate = market_analysis.get("growth_rate", 0)
+        risk_score = risk_analysis.get("overall_risk_score")
+        market_size = market_analysis.get("market_size") or 0
+        growth_rate = market_analysis.get("growth_rate") or 0
         
         # Calculate opportunity score (simplified)
         opportunity_score = self._calculate_opportunity_score(market_size, growth_rate)
         
         # Decision matrix based on risk vs opportunity
-        decision, priority, confidence = self._decision_matrix(risk_score, opportunity_score)
+        if risk_score is None:
+            # No entry decision can be made without a risk score
+            decision, priority, confidence = "INSUFFICIENT_DATA", "Low", "Low"
+        else:
+            decision, priority, confidence = self._decision_matrix(risk_score, opportunity_score)
+            if market_analysis.get("market_size") is None or market_analysis.get("growth_rate") is None:
+                # Opportunity was scored without real market figures
+                confidence = "Low"
         
         return {
             "decision": decision,
@@ -131,7 +269,8 @@ class MultiAgentOrchestrator:
             "PROCEED_WITH_CONFIDENCE": f"Low risk ({risk_score}/10) and high opportunity ({opportunity_score}/10) make {country} an excellent market for {industry} expansion.",
             "PROCEED_WITH_CAUTION": f"Moderate risk ({risk_score}/10) with good opportunity ({opportunity_score}/10) suggest careful market entry planning for {industry} in {country}.",
             "PROCEED_WITH_MITIGATION": f"Higher risk ({risk_score}/10) requires extensive mitigation strategies, but opportunity ({opportunity_score}/10) justifies consideration for {industry} in {country}.",
-            "RECONSIDER_ENTRY": f"High risk ({risk_score}/10) and limited opportunity ({opportunity_score}/10) suggest reconsidering {industry} market entry in {country}."
+            "RECONSIDER_ENTRY": f"High risk ({risk_score}/10) and limited opportunity ({opportunity_score}/10) suggest reconsidering {industry} market entry in {country}.",
+            "INSUFFICIENT_DATA": f"The risk assessment for {industry} in {country} did not complete, so no entry decision can be made yet."
         }
         
         return reasoning_map.get(decision, "Analysis completed with mixed indicators.")
@@ -167,6 +306,10 @@ class MultiAgentOrchestrator:
                 "Consider indirect market entry through partnerships",
                 "Evaluate different industry segments",
                 "Reassess in 6-12 months"
+            ],
+            "INSUFFICIENT_DATA": [
+                "Retry the risk assessment",
+                "Review the available market research in the meantime"
             ]
         }
         
@@ -179,7 +322,8 @@ class MultiAgentOrchestrator:
             "PROCEED_WITH_CONFIDENCE": "3-6 months",
             "PROCEED_WITH_CAUTION": "6-12 months", 
             "PROCEED_WITH_MITIGATION": "12-18 months",
-            "RECONSIDER_ENTRY": "Reassess in 6-12 months"
+            "RECONSIDER_ENTRY": "Reassess in 6-12 months",
+            "INSUFFICIENT_DATA": "Pending risk assessment"
         }
         
         return timeline_map.get(decision, "6-12 months")
\ No newline at end of file
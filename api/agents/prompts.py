@@ -0,0 +1,123 @@
+"""
+Prompt Templates for API
+Versioned prompts with per-analysis-type output budgets and token usage accounting
+"""
+
+import hashlib
+import logging
+import re
+import textwrap
+import threading
+from typing import Any, Dict, Optional
+from .metrics import COST, TOKENS, estimate_cost
+
+logger = logging.getLogger(__name__)
+
+# Output token budget per analysis type. Generation time grows with output
+# length, so each type only gets room for what its consumers actually show.
+OUTPUT_BUDGETS = {
+    "market": 2500,          # /analyze market: full multi-section report
+    "risk": 2000,            # /analyze risk: six categories with mitigation
+    "comprehensive": 1500,   # Per agent inside the orchestrator; the recommendation uses the figures
+    "chat_summary": 700      # Chat answers show a short summary and a few fields
+}
+
+ANALYSIS_TYPES = tuple(OUTPUT_BUDGETS)
+
+BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def compact(text: str) -> str:
+    """Strip indentation, trailing spaces and repeated blank lines, which cost tokens but carry nothing"""
+    text = textwrap.dedent(text).strip()
+    text = "\n".join(line.rstrip() for line in text.splitlines())
+    return BLANK_LINES.sub("\n\n", text)
+
+
+class PromptTemplate:
+    """A prompt for one agent and analysis type
+
+    ``key`` names the template, its version and a short hash of its rendered
+    text and budget. The result cache includes it, so editing a template or
+    its budget never serves answers produced by the old one, even if the
+    version was not bumped.
+
+    Args:
+        agent: Agent the template belongs to, e.g. "market_research"
+        analysis_type: One of ``ANALYSIS_TYPES``; selects the output budget
+        version: Bumped by hand when the meaning of the answer changes
+        body: Prompt text with ``{country}`` and ``{industry}`` placeholders
+        suffix: Appended verbatim after the body (e.g. JSON output instructions)
+    """
+
+    __slots__ = ("agent", "analysis_type", "version", "max_tokens", "text", "key")
+
+    def __init__(self, agent: str, analysis_type: str, version: str, body: str, suffix: str = ""):
+        if analysis_type not in OUTPUT_BUDGETS:
+            raise ValueError(f"Unknown analysis type: {analysis_type}")
+        self.agent = agent
+        self.analysis_type = analysis_type
+        self.version = version
+        self.max_tokens = OUTPUT_BUDGETS[analysis_type]
+        # Escape braces in the suffix so literal JSON survives str.format
+        self.text = compact(body) + ("\n\n" + suffix.replace("{", "{{").replace("}", "}}") if suffix else "")
+
+        digest = hashlib.sha1(f"{self.text}|{self.max_tokens}".encode("utf-8")).hexdigest()[:8]
+        self.key = f"{analysis_type}.v{version}.{digest}"
+
+    def render(self, country: str, industry: str) -> str:
+        """Fill in the country and industry"""
+        return self.text.format(country=country, industry=industry)
+
+
+class TokenUsage:
+    """Process-wide token counters per prompt template
+
+    ``truncated`` counts answers that stopped at ``max_tokens``; if it grows
+    for a template, its budget is too small for the structured output.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, template: PromptTemplate, input_tokens: int, output_tokens: int,
+               stop_reason: Optional[str] = None, model_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add one model call to the totals and the token and cost metrics
+
+        Returns:
+            Usage of this call, in the form attached to analysis results
+        """
+        name = f"{agent}.{template.analysis_type}"
+        with self._lock:
+            totals = self._totals.setdefault(name, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "truncated": 0})
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            if stop_reason == "max_tokens":
+                totals["truncated"] += 1
+
+        TOKENS.labels(agent, template.analysis_type, "input").observe(input_tokens)
+        TOKENS.labels(agent, template.analysis_type, "output").observe(output_tokens)
+        if model_id:
+            COST.labels(agent, template.analysis_type).inc(estimate_cost(model_id, input_tokens, output_tokens))
+
+        if stop_reason == "max_tokens":
+            logger.warning(f"{name} answer hit its {template.max_tokens} token budget")
+        logger.info(f"{name} used {input_tokens} input / {output_tokens} output tokens")
+        return {
+            "template": template.key,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "max_tokens": template.max_tokens,
+            "stop_reason": stop_reason
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Copy of the totals, keyed by "<agent>.<analysis type>" """
+        with self._lock:
+            return {name: dict(totals) for name, totals in self._totals.items()}
+
+
+token_usage = TokenUsage()
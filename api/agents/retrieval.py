@@ -0,0 +1,407 @@
+"""
+Retrieval for API
+Memory-mapped vector index of research documents serving top-k context to the agents
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import RETRIEVAL_LATENCY
+from .tracing import span
+
+try:
+    import faiss
+except ImportError:  # Optional: without it the index is searched with NumPy
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "amazon.titan-embed-text-v1"  # The model notebook 05 embeds documents with
+DEFAULT_TOP_K = 4
+DEFAULT_MIN_SCORE = 0.2
+DEFAULT_MAX_QUERIES = 1024
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "market-research-index")
+
+INDEX_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "offsets.npy"
+FAISS_FILE = "index.faiss"
+LANGCHAIN_DOCSTORE_FILE = "index.pkl"
+
+
+class Passage(NamedTuple):
+    """A retrieved chunk of a research document"""
+    text: str
+    score: float
+    metadata: Dict[str, Any]
+
+    def source(self) -> Dict[str, Any]:
+        """Where the passage came from, in the form attached to analysis results"""
+        return {"source": self.metadata.get("source", "unknown"), "score": round(self.score, 3)}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length, so inner product is cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def write_index(directory: str, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]], vectors: np.ndarray,
+                embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                documents: Optional[Dict[str, Tuple[int, int]]] = None) -> str:
+    """
+    Write an index directory that VectorIndex can memory-map
+
+    The files are written next to ``directory`` and renamed into place, so
+    a reader never sees a half-written index.
+
+    Args:
+        directory: Destination; replaced if it exists
+        texts: Chunk texts
+        metadatas: One metadata dict per chunk (e.g. {"source": "report.pdf"})
+        vectors: Embeddings, one row per chunk
+        embedding_model: Model the vectors came from; queries must use the same one
+        documents: Optional {document ID: (first chunk, end)} for indexes whose
+            chunks are grouped by document, so documents can later be deleted
+
+    Returns:
+        The index ID, a hash of its contents
+    """
+    if not (len(texts) == len(metadatas) == len(vectors)):
+        raise ValueError("texts, metadatas and vectors must have the same length")
+    if not texts:
+        raise ValueError("An index needs at least one chunk")
+    vectors = normalize(vectors).reshape(len(texts), -1)
+    destination = Path(directory)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{destination.name}.", dir=destination.parent))
+
+    digest = hashlib.sha256(vectors.tobytes())
+    offsets = [0]
+    with open(staging / CHUNKS_FILE, "wb") as chunks:
+        for text, metadata in zip(texts, metadatas):
+            line = json.dumps({"text": text, "metadata": metadata}, sort_keys=True).encode("utf-8") + b"\n"
+            digest.update(line)
+            chunks.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(staging / VECTORS_FILE, vectors)
+    np.save(staging / OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+    if faiss is not None:
+        flat = faiss.IndexFlatIP(vectors.shape[1])
+        flat.add(vectors)
+        faiss.write_index(flat, str(staging / FAISS_FILE))
+
+    index_id = digest.hexdigest()[:12]
+    manifest = {
+        "format": INDEX_FORMAT,
+        "id": index_id,
+        "count": int(vectors.shape[0]),
+        "dimensions": int(vectors.shape[1]),
+        "embedding_model": embedding_model,
+        "metric": "cosine"
+    }
+    if documents is not None:
+        manifest["documents"] = {doc_id: list(span) for doc_id, span in documents.items()}
+    (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+
+    if destination.exists():
+        shutil.rmtree(destination)
+    os.replace(staging, destination)
+    return index_id
+
+
+class VectorIndex:
+    """Read-only chunk index, memory-mapped from disk
+
+    Vectors and chunk texts stay in the files; the operating system pages
+    them in on use and shares the pages between every worker process on the
+    host, so a large index costs each worker almost no memory of its own.
+    With faiss installed and an ``index.faiss`` present, search runs on a
+    memory-mapped faiss index; otherwise it is one NumPy matrix-vector
+    product over the mapped vectors: about a millisecond for 5,000 Titan
+    chunks, growing linearly with the corpus.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.manifest = json.loads((self.directory / MANIFEST_FILE).read_text())
+        if self.manifest.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format in {directory}: {self.manifest.get('format')}")
+
+        self.id: str = self.manifest["id"]
+        self.dimensions: int = self.manifest["dimensions"]
+        self.embedding_model: str = self.manifest["embedding_model"]
+        self._vectors = np.load(self.directory / VECTORS_FILE, mmap_mode="r")
+        self._offsets = np.load(self.directory / OFFSETS_FILE, mmap_mode="r")
+        with open(self.directory / CHUNKS_FILE, "rb") as chunks:
+            self._chunks = mmap.mmap(chunks.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._faiss = None
+        if faiss is not None and (self.directory / FAISS_FILE).exists():
+            self._faiss = faiss.read_index(str(self.directory / FAISS_FILE), faiss.IO_FLAG_MMAP)
+
+    @property
+    def count(self) -> int:
+        return int(self._vectors.shape[0])
+
+    @property
+    def backend(self) -> str:
+        return "faiss" if self._faiss is not None else "numpy"
+
+    def search(self, vector: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> List[Passage]:
+        """
+        The ``k`` chunks most similar to a unit-length query vector, best first
+
+        Args:
+            vector: Query embedding, normalized
+            k: Passages wanted
+            exclude: Optional boolean mask of deleted chunks, one entry per chunk
+        """
+        excluded = int(exclude.sum()) if exclude is not None else 0
+        k = min(k, self.count - excluded)
+        if k <= 0:
+            return []
+        if vector.shape != (self.dimensions,):
+            raise ValueError(f"Query vector has {vector.shape[-1]} dimensions, the index has {self.dimensions}")
+
+        if self._faiss is not None:
+            # Ask for enough extra hits that k survive the deletions
+            scores, ids = self._faiss.search(vector.reshape(1, -1).astype(np.float32), k + excluded)
+            hits = [(i, score) for i, score in zip(ids[0].tolist(), scores[0].tolist())
+                    if i >= 0 and (exclude is None or not exclude[i])][:k]
+        else:
+            scores = self._vectors @ vector
+            if exclude is not None:
+                scores[exclude] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            hits = [(int(i), float(scores[i])) for i in top]
+        return [self._passage(i, score) for i, score in hits]
+
+    def _passage(self, i: int, score: float) -> Passage:
+        record = json.loads(self._chunks[int(self._offsets[i]):int(self._offsets[i + 1])])
+        return Passage(record["text"], score, record.get("metadata") or {})
+
+    def stats(self) -> Dict[str, Any]:
+        return {"id": self.id, "chunks": self.count, "dimensions": self.dimensions, "backend": self.backend}
+
+    @property
+    def documents(self) -> Dict[str, Tuple[int, int]]:
+        """{document ID: (first chunk, end)}, empty for indexes built without document IDs"""
+        return {doc_id: tuple(span) for doc_id, span in self.manifest.get("documents", {}).items()}
+
+    def chunks(self, start: int = 0, end: Optional[int] = None) -> Tuple[List[str], List[Dict[str, Any]], np.ndarray]:
+        """Texts, metadata and vectors of chunks ``start`` to ``end`` (for rewriting an index)"""
+        end = self.count if end is None else end
+        records = [json.loads(self._chunks[int(self._offsets[i]):int(self._offsets[i + 1])]) for i in range(start, end)]
+        return ([record["text"] for record in records], [record.get("metadata") or {} for record in records],
+                np.asarray(self._vectors[start:end]))
+
+
+class BedrockEmbedder:
+    """Query embeddings from a Bedrock Titan embedding model"""
+
+    def __init__(self, bedrock_client, model_id: str = DEFAULT_EMBEDDING_MODEL):
+        self.bedrock_client = bedrock_client
+        self.model_id = model_id
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """One row per text; Titan takes a single text per call"""
+        rows = []
+        for text in texts:
+            response = self.bedrock_client.invoke_model(modelId=self.model_id, body=json.dumps({"inputText": text}))
+            rows.append(json.loads(response["body"].read())["embedding"])
+        return np.asarray(rows, dtype=np.float32)
+
+
+class Retriever:
+    """Top-k context for agent prompts
+
+    Agents ask the same few templated questions per country and industry,
+    so query embeddings are kept in a small LRU: after the first request
+    for a pair, retrieval is a cache lookup and one index search, with no
+    embedding call.
+    """
+
+    def __init__(self, index: VectorIndex, embedder, k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE,
+                 max_queries: int = DEFAULT_MAX_QUERIES):
+        """
+        Args:
+            index: Index to search (a VectorIndex, or a SegmentedIndex that refreshes itself)
+            embedder: Object with ``embed(texts) -> array``, using the index's embedding model
+            k: Passages returned per query
+            min_score: Passages less similar than this are left out
+            max_queries: Query embeddings kept in memory
+        """
+        self.index = index
+        self.embedder = embedder
+        self.k = k
+        self.min_score = min_score
+        self.max_queries = max_queries
+        self._queries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the index content does; part of the agents' cache keys"""
+        return self.index.id
+
+    def retrieve(self, query: str, k: Optional[int] = None) -> List[Passage]:
+        """Passages relevant to ``query``, most similar first"""
+        start = time.perf_counter()
+        with span("retrieval.search", k=k or self.k) as current:
+            vector = self._query_vector(query)
+            passages = [p for p in self.index.search(vector, k or self.k) if p.score >= self.min_score]
+            current.set_attribute("passages", len(passages))
+        RETRIEVAL_LATENCY.labels(self.index.backend).observe(time.perf_counter() - start)
+        return passages
+
+    def _query_vector(self, query: str) -> np.ndarray:
+        with self._lock:
+            vector = self._queries.get(query)
+            if vector is not None:
+                self._queries.move_to_end(query)
+                return vector
+
+        vector = normalize(self.embedder.embed([query]))[0]
+        with self._lock:
+            self._queries[query] = vector
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = len(self._queries)
+        return {**self.index.stats(), "k": self.k, "cached_queries": queries}
+
+
+def format_context(passages: Sequence[Passage]) -> str:
+    """Prompt preamble quoting the retrieved passages"""
+    quoted = "\n\n".join(
+        f"[{i}] ({passage.metadata.get('source', 'unknown')})\n{passage.text.strip()}"
+        for i, passage in enumerate(passages, start=1)
+    )
+    return (
+        "Excerpts from research documents, for reference. Prefer their figures where they apply "
+        "and do not invent sources.\n\n" + quoted
+    )
+
+
+def convert_langchain_store(source: str, destination: str, embedding_model: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    """
+    Convert a LangChain FAISS store (``save_local`` output, as built by notebook 05) into an index directory
+
+    Needs faiss and the LangChain packages the store was pickled with.
+    Vectors are normalized, so results are ranked by cosine similarity
+    rather than the store's L2 distance. Only load stores you built: the
+    docstore is a pickle.
+
+    Returns:
+        The new index's ID
+    """
+    if faiss is None:
+        raise ImportError("The faiss-cpu package is required to convert a LangChain FAISS store")
+    store = faiss.read_index(os.path.join(source, FAISS_FILE))
+    with open(os.path.join(source, LANGCHAIN_DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_id = pickle.load(f)
+
+    documents = [docstore.search(index_to_id[i]) for i in range(store.ntotal)]
+    return write_index(
+        destination,
+        [document.page_content for document in documents],
+        [dict(document.metadata) for document in documents],
+        store.reconstruct_n(0, store.ntotal),
+        embedding_model=embedding_model
+    )
+
+
+def fetch_index(location: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """
+    Local index directory for a configured index location
+
+    ``location`` may be an index directory, a LangChain store directory, or
+    a ``.tar.gz`` of either on local disk or S3 (the notebook's upload). An
+    archive is downloaded and unpacked into ``cache_dir`` once per host;
+    every worker then maps the same files. A LangChain store is converted
+    next to itself on first use.
+    """
+    if location.endswith((".tar.gz", ".tgz")):
+        name = hashlib.sha1(location.encode("utf-8")).hexdigest()[:12]
+        unpacked = Path(cache_dir) / name
+        if not unpacked.exists():
+            _unpack(location, unpacked)
+        directory = unpacked
+        # The notebook archives the store under its own folder name
+        entries = [entry for entry in directory.iterdir() if not entry.name.startswith(".")]
+        if len(entries) == 1 and entries[0].is_dir():
+            directory = entries[0]
+    else:
+        directory = Path(location)
+
+    if (directory / MANIFEST_FILE).exists():
+        return str(directory)
+    if (directory / LANGCHAIN_DOCSTORE_FILE).exists():
+        converted = directory.parent / f"{directory.name}.index"
+        if not (converted / MANIFEST_FILE).exists():
+            logger.info(f"Converting LangChain store {directory} to {converted}")
+            convert_langchain_store(str(directory), str(converted))
+        return str(converted)
+    raise FileNotFoundError(f"No vector index found at {location}")
+
+
+def _unpack(archive: str, destination: Path):
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{destination.name}.", dir=destination.parent))
+    try:
+        if archive.startswith("s3://"):
+            import boto3
+            bucket, _, key = archive[len("s3://"):].partition("/")
+            local_archive = staging / "index.tar.gz"
+            logger.info(f"Downloading vector index from {archive}")
+            boto3.client("s3").download_file(bucket, key, str(local_archive))
+            archive = str(local_archive)
+        unpacked = staging / "unpacked"
+        with tarfile.open(archive, "r:gz") as tar:
+            tar.extractall(unpacked, filter="data")
+        try:
+            os.rename(unpacked, destination)
+        except OSError:
+            # Another worker got there first; its copy is identical
+            if not destination.exists():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+_default_retriever: Optional[Retriever] = None
+
+
+def configure_retriever(index, embedder, k: int = DEFAULT_TOP_K, min_score: float = DEFAULT_MIN_SCORE) -> Retriever:
+    """Make a retriever over ``index`` (a VectorIndex or SegmentedIndex) the process-wide one"""
+    global _default_retriever
+    _default_retriever = Retriever(index, embedder, k=k, min_score=min_score)
+    logger.info(f"✅ Retrieval index {index.id} loaded: {index.count} chunks ({index.backend})")
+    return _default_retriever
+
+
+def get_retriever() -> Optional[Retriever]:
+    """The process-wide retriever, or None when no index is configured"""
+    return _default_retriever
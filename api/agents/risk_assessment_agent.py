@@ -3,148 +3,154 @@ Risk Assessment Agent for API
 Simplified version of the notebook agent for API usage
 """
 
-import boto3
-import json
 import logging
-from typing import Dict, Any
+import re
+from functools import partial
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+from .base_agent import BedrockAgent
+from .baseline_scores import risk_scores
+from .prompts import PromptTemplate
+from .structured_output import Field, OutputSchema, heading_pattern
 
 logger = logging.getLogger(__name__)
 
-class RiskAssessmentAgent:
+RISK_CATEGORIES = ("political", "economic", "legal", "operational", "market", "technology")
+
+
+def _score_pattern(label: str) -> "re.Pattern":
+    return re.compile(rf"{label}[^\d\n]{{0,40}}?(?P<value>\d+(?:\.\d+)?)\s*(?:/\s*10)?", re.IGNORECASE)
+
+
+RISK_SCHEMA = OutputSchema(
+    [
+        Field("overall_risk_score", "number", "overall risk score from 1 to 10",
+              minimum=1, maximum=10, patterns=[_score_pattern(r"overall risk(?: score)?")]),
+        Field("risk_level", "string", '"Low", "Medium", "High" or "Critical"',
+              choices=("Low", "Medium", "High", "Critical"),
+              patterns=[
+                  re.compile(r"risk level[^a-z\n]{0,20}(?P<value>low|medium|high|critical)\b", re.IGNORECASE),
+                  re.compile(r"overall risk[^\n]{0,60}?\((?P<value>low|medium|high|critical)\b", re.IGNORECASE)
+              ])
+    ]
+    + [
+        Field(f"{category}_risk", "number", f"{category} risk score from 1 to 10",
+              minimum=1, maximum=10, patterns=[_score_pattern(rf"{category} risk")])
+        for category in RISK_CATEGORIES
+    ]
+    + [
+        Field("mitigation_strategies", "list", "list of short mitigation strategies",
+              heading=heading_pattern("mitigation(?: strategies)?"))
+    ]
+)
+
+
+def classify_risk(score: Optional[float]) -> Optional[str]:
+    """Risk level band for an overall 1-10 score"""
+    if score is None:
+        return None
+    if score <= 3:
+        return "Low"
+    if score <= 6:
+        return "Medium"
+    if score <= 8:
+        return "High"
+    return "Critical"
+
+RISK_SCALE = "Score each risk from 1 (very low) to 10 (very high)."
+RISK_LEVELS = "Risk levels: Low (1-3), Medium (4-6), High (7-8), Critical (9-10)."
+
+RISK_TEMPLATES = {
+    template.analysis_type: template
+    for template in (
+        PromptTemplate("risk_assessment", "risk", "1", f"""
+            Assess the risks of entering the {{industry}} market in {{country}}. {RISK_SCALE}
+
+            1. Political Risk - government stability, policy changes, corruption
+            2. Economic Risk - currency volatility, inflation, GDP growth
+            3. Legal Risk - regulatory framework, IP protection, contract enforcement
+            4. Operational Risk - infrastructure, talent availability, logistics
+            5. Market Risk - competition, market maturity, demand volatility
+            6. Technology Risk - digital infrastructure, cybersecurity, innovation
+
+            For each category give the score, the key risk factors and mitigation strategies.
+            Then give an overall risk score and level. {RISK_LEVELS}
+            """, RISK_SCHEMA.instructions()),
+        PromptTemplate("risk_assessment", "comprehensive", "1", f"""
+            In at most 250 words, assess the risks of entering the {{industry}} market in {{country}}:
+            political, economic, legal, operational, market and technology risk, one sentence each.
+            {RISK_SCALE} {RISK_LEVELS}
+            """, RISK_SCHEMA.instructions()),
+        PromptTemplate("risk_assessment", "chat_summary", "1", f"""
+            In at most 120 words, summarize the main risks of entering the {{industry}} market in {{country}}.
+            {RISK_SCALE} {RISK_LEVELS}
+            """, RISK_SCHEMA.instructions()),
+    )
+}
+
+class RiskAssessmentAgent(BedrockAgent):
     """Risk assessment agent for evaluating market entry risks"""
     
-    def __init__(self):
-        """Initialize the risk assessment agent"""
-        try:
-            self.bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-            self.model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
-            logger.info("✅ Risk Assessment Agent initialized with Bedrock")
-        except Exception as e:
-            logger.warning(f"⚠️ Bedrock not available, using mock mode: {str(e)}")
-            self.bedrock_client = None
+    agent_name = "risk_assessment"
+    display_name = "Risk Assessment Agent"
+    default_analysis_type = "risk"
+    templates = RISK_TEMPLATES
+    retrieval_query = "{industry} regulation and political, economic and operational risks in {country}"
     
-    def comprehensive_risk_assessment(self, country: str, industry: str) -> Dict[str, Any]:
+    def comprehensive_risk_assessment(self, country: str, industry: str, analysis_type: str = "risk") -> Dict[str, Any]:
         """
         Perform comprehensive risk assessment for market entry
         
         Args:
             country: Target country name
             industry: Industry sector
+            analysis_type: "risk" for the full assessment, "comprehensive" for the
+                shorter section used in combined analyses, "chat_summary" for chat
             
         Returns:
             Dictionary containing risk assessment results
         """
         
-        if self.bedrock_client:
-            return self._assess_with_bedrock(country, industry)
-        else:
-            return self._assess_mock(country, industry)
+        return self._run(country, industry, analysis_type, self._assess_mock)
     
-    def _assess_with_bedrock(self, country: str, industry: str) -> Dict[str, Any]:
-        """Assess risks using Bedrock Claude model"""
-        
-        prompt = f"""
-        Perform a comprehensive risk assessment for entering the {industry} market in {country}.
-        
-        Evaluate and score (1-10 scale, where 1=very low risk, 10=very high risk) the following risk categories:
-        
-        1. Political Risk - Government stability, policy changes, corruption
-        2. Economic Risk - Currency volatility, inflation, GDP growth
-        3. Legal Risk - Regulatory framework, IP protection, contract enforcement
-        4. Operational Risk - Infrastructure, talent availability, logistics
-        5. Market Risk - Competition, market maturity, demand volatility
-        6. Technology Risk - Digital infrastructure, cybersecurity, innovation
-        
-        For each category, provide:
-        - Risk score (1-10)
-        - Brief explanation of key risk factors
-        - Mitigation strategies
-        
-        Calculate an overall risk score and provide a risk level classification:
-        - Low Risk (1-3): Stable, predictable environment
-        - Medium Risk (4-6): Manageable challenges with planning
-        - High Risk (7-8): Significant obstacles requiring expertise
-        - Critical Risk (9-10): Major barriers, high failure probability
+    async def comprehensive_risk_assessment_async(self, country: str, industry: str, analysis_type: str = "risk") -> Dict[str, Any]:
+        """
+        Awaitable version of comprehensive_risk_assessment
         
-        Country: {country}
-        Industry: {industry}
+        Dispatches the model call to the Bedrock executor instead of
+        blocking the calling event loop.
         """
         
-        try:
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4000,
-                "temperature": 0.1,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-            
-            response = self.bedrock_client.invoke_model(
-                modelId=self.model_id,
-                body=body
-            )
-            
-            response_body = json.loads(response['body'].read())
-            analysis_text = response_body['content'][0]['text']
-            
-            # Parse the response to extract structured data
-            return self._parse_risk_response(analysis_text, country, industry)
-            
-        except Exception as e:
-            logger.error(f"Bedrock risk assessment failed: {str(e)}")
-            return self._assess_mock(country, industry)
+        return await self._run_async(country, industry, analysis_type, self._assess_mock)
     
-    def _assess_mock(self, country: str, industry: str) -> Dict[str, Any]:
-        """Mock risk assessment for demo purposes"""
-        
-        # Risk profiles by country (simplified)
-        country_risk_profiles = {
-            "Germany": {"base_risk": 2.5, "political": 2.0, "economic": 3.0, "legal": 2.0},
-            "Japan": {"base_risk": 3.0, "political": 2.5, "economic": 3.5, "legal": 2.5},
-            "Rwanda": {"base_risk": 5.5, "political": 6.0, "economic": 6.5, "legal": 5.0},
-            "Bangladesh": {"base_risk": 6.2, "political": 6.5, "economic": 7.0, "legal": 6.0},
-            "Estonia": {"base_risk": 3.2, "political": 3.0, "economic": 3.5, "legal": 2.8},
-            "Mongolia": {"base_risk": 7.1, "political": 7.5, "economic": 8.0, "legal": 6.5}
-        }
+    async def stream_risk_assessment_async(self, country: str, industry: str, analysis_type: str = "risk") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the risk assessment while the model writes it
         
-        # Industry risk modifiers
-        industry_risk_modifiers = {
-            "fintech": 1.2,      # Higher regulatory risk
-            "healthcare": 1.1,    # Regulatory complexity
-            "technology": 0.9,    # Generally lower risk
-            "energy": 1.3,        # Political/regulatory risk
-            "manufacturing": 1.0,  # Baseline
-            "agriculture": 0.8    # Lower regulatory risk
-        }
+        Text arrives as "delta" events; the risk scores and level are only
+        known once generation ends and come in the final "result" event. A
+        stream that fails partway sends an "error" event, then the mock
+        assessment as the result.
+        """
         
-        # Get base risk profile
-        profile = country_risk_profiles.get(country, {"base_risk": 5.0, "political": 5.0, "economic": 5.0, "legal": 5.0})
-        industry_modifier = industry_risk_modifiers.get(industry, 1.0)
+        async for event in self._stream_async(country, industry, analysis_type, self._assess_mock):
+            yield event
+    
+    def baseline_assessment(self, country: str, industry: str, scores: Tuple[float, ...]) -> Dict[str, Any]:
+        """
+        Mock-mode assessment from scores already looked up, e.g. in one score_grid for a whole batch
         
-        # Calculate risk scores
-        political_risk = min(10, profile["political"] * industry_modifier)
-        economic_risk = min(10, profile["economic"] * industry_modifier)
-        legal_risk = min(10, profile["legal"] * industry_modifier)
-        operational_risk = min(10, (profile["base_risk"] + 1.0) * industry_modifier)
-        market_risk = min(10, profile["base_risk"] * industry_modifier)
-        technology_risk = min(10, (profile["base_risk"] - 0.5) * industry_modifier)
+        Args:
+            scores: Category scores then the overall score, as risk_scores returns them
+        """
         
-        # Calculate overall risk score
-        overall_risk = (political_risk + economic_risk + legal_risk + operational_risk + market_risk + technology_risk) / 6
+        return self._mock(partial(self._assess_mock, scores=scores), country, industry)
+    
+    def _assess_mock(self, country: str, industry: str, scores: Optional[Tuple[float, ...]] = None) -> Dict[str, Any]:
+        """Mock risk assessment for demo purposes, read from the precomputed baseline table"""
         
-        # Determine risk level
-        if overall_risk <= 3:
-            risk_level = "Low"
-        elif overall_risk <= 6:
-            risk_level = "Medium"
-        elif overall_risk <= 8:
-            risk_level = "High"
-        else:
-            risk_level = "Critical"
+        (political_risk, economic_risk, legal_risk, operational_risk, market_risk, technology_risk,
+         overall_risk) = scores or risk_scores(country, industry)
+        risk_level = classify_risk(overall_risk)
         
         return {
             "overall_risk_score": round(overall_risk, 1),
@@ -183,26 +189,35 @@ class RiskAssessmentAgent:
             ]
         }
     
+    def _parse_response(self, text: str, country: str, industry: str) -> Dict[str, Any]:
+        return self._parse_risk_response(text, country, industry)
+    
     def _parse_risk_response(self, analysis_text: str, country: str, industry: str) -> Dict[str, Any]:
-        """Parse Bedrock response into structured format"""
+        """Parse Bedrock response into structured format
+        
+        A missing overall score is the mean of the category scores found, and
+        a missing risk level is derived from the overall score. If no score
+        can be found at all it stays None and callers treat the risk as unknown.
+        """
+        
+        fields, method = RISK_SCHEMA.parse(analysis_text)
+        risk_scores = {
+            f"{category}_risk": fields[f"{category}_risk"]
+            for category in RISK_CATEGORIES
+            if f"{category}_risk" in fields
+        }
+        
+        overall_risk = fields.get("overall_risk_score")
+        if overall_risk is None and risk_scores:
+            overall_risk = round(sum(risk_scores.values()) / len(risk_scores), 1)
+        if overall_risk is None:
+            logger.warning(f"No risk scores found in model answer for {industry} in {country}")
         
-        # This is a simplified parser - in production, you'd want more sophisticated parsing
         return {
-            "overall_risk_score": 4.2,
-            "risk_level": "Medium",
-            "risk_scores": {
-                "political_risk": 4.0,
-                "economic_risk": 4.5,
-                "legal_risk": 3.8,
-                "operational_risk": 4.8,
-                "market_risk": 4.0,
-                "technology_risk": 3.9
-            },
-            "analysis": analysis_text,
-            "mitigation_strategies": [
-                "Local partnerships",
-                "Regulatory compliance",
-                "Risk monitoring",
-                "Contingency planning"
-            ]
-        }
\ No newline at end of file
+            "overall_risk_score": overall_risk,
+            "risk_level": fields.get("risk_level") or classify_risk(overall_risk),
+            "risk_scores": risk_scores,
+            "analysis": RISK_SCHEMA.strip_json(analysis_text),
+            "mitigation_strategies": fields.get("mitigation_strategies", []),
+            "extraction": method
+        }
@@ -0,0 +1,220 @@
+"""
+Semantic Chat Cache for API
+Answers paraphrased chat questions from cache, by canonical parse and by query similarity
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import MOCK_SOURCE, ResultCache
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_VECTORS = 4096
+DEFAULT_DIMENSIONS = 512
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that say nothing about what is being asked
+STOP_WORDS = frozenset("""
+    a an and are as at be by can could do does for from how i in is it its me my of on or our please
+    tell that the there this to us we what whats which with would you your
+""".split())
+
+SUFFIXES = ("ies", "ing", "ed", "es", "s", "y")
+
+GENERAL_INTENT = "general"  # The parser's intent when the query has no intent keyword
+
+# Structured figures an agent result, or the chat response built from it, carries; None when the model left them out
+FIGURE_FIELDS = ("risk_score", "overall_risk_score", "market_size", "growth_rate")
+
+# (intent, effective countries, effective industries) a response was built from
+Entities = Tuple[str, Tuple[str, ...], Tuple[str, ...]]
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so "risks", "risky" and "risk" share a feature"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def query_vector(query: str, dimensions: int = DEFAULT_DIMENSIONS) -> np.ndarray:
+    """
+    Unit-length hashed bag of stemmed words and word pairs
+
+    Computed locally with a stable hash (crc32), so the same query gives the
+    same vector in every process.
+    """
+    words = [_stem(word) for word in WORD_PATTERN.findall(query.lower()) if word not in STOP_WORDS]
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in features:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        # The top bit picks the sign, so colliding features tend to cancel out
+        vector[digest % dimensions] += -1.0 if digest & 0x80000000 else 1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def response_key(version: str, entities: Entities) -> str:
+    """Shared cache key of a chat response"""
+    intent, countries, industries = entities
+    return f"chat:v{version}:{intent}:{','.join(countries).lower()}:{','.join(industries).lower()}"
+
+
+class SemanticChatCache:
+    """Chat responses cached by what was asked rather than how it was worded
+
+    The primary lookup is by the query's canonical parse, so every phrasing
+    that resolves to the same intent, countries and industries shares one
+    entry in the result cache (and, with Redis, across workers).
+
+    When the parse differs because one phrasing has no intent keyword
+    ("fintech in Germany, worth it?"), the query's hashed word vector is
+    compared with earlier queries about the same countries and industries.
+    A neighbour with cosine similarity of at least ``threshold`` lends its
+    cached response. Two questions with different explicit intents (risk vs
+    market size) never share an answer, however similar their wording. The
+    vectors are kept per process; only the responses are shared.
+    """
+
+    def __init__(self, cache: ResultCache, version: str, ttl: int = DEFAULT_TTL,
+                 threshold: float = DEFAULT_THRESHOLD, max_vectors: int = DEFAULT_MAX_VECTORS,
+                 dimensions: int = DEFAULT_DIMENSIONS):
+        """
+        Args:
+            cache: Where responses are stored
+            version: Parser version; a new one ignores old entries
+            ttl: Seconds a response stays cached
+            threshold: Minimum cosine similarity for a near-duplicate hit
+            max_vectors: Query vectors kept; the least recently used are dropped
+            dimensions: Length of the hashed query vectors
+        """
+        self.cache = cache
+        self.version = version
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_vectors = max_vectors
+        self.dimensions = dimensions
+        # (countries, industries) -> {response key: (intent, query vector)}
+        self._vectors: "OrderedDict[Tuple[Tuple[str, ...], Tuple[str, ...]], Dict[str, Tuple[str, np.ndarray]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, query: str, entities: Entities) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Look up a response for this question
+
+        Returns:
+            (response, "exact" or "similar") on a hit, (None, None) on a miss
+        """
+        key = response_key(self.version, entities)
+        response = self.cache.get(key)
+        record_cache_lookup("chat_response", response is not None)
+        if response is not None:
+            return response, "exact"
+
+        similar_key = self._nearest(query_vector(query, self.dimensions), entities, exclude=key)
+        if similar_key is not None:
+            response = self.cache.get(similar_key)
+            record_cache_lookup("chat_similar", response is not None)
+            if response is not None:
+                return response, "similar"
+        return None, None
+
+    async def get_async(self, query: str, entities: Entities) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """``get`` for coroutines; lookups in a shared (Redis) cache run on a worker thread"""
+        if self.cache.blocking:
+            return await asyncio.to_thread(self.get, query, entities)
+        return self.get(query, entities)
+
+    def set(self, query: str, entities: Entities, response: Dict[str, Any]):
+        """Cache a response and remember the query's vector for near-duplicate lookups"""
+        key = response_key(self.version, entities)
+        self.cache.set(key, response, ttl=self.ttl)
+
+        intent, countries, industries = entities
+        vector = query_vector(query, self.dimensions)
+        with self._lock:
+            bucket = self._vectors.pop((countries, industries), {})
+            self._size -= len(bucket)
+            bucket[key] = (intent, vector)
+            self._vectors[(countries, industries)] = bucket
+            self._size += len(bucket)
+            while self._size > self.max_vectors and len(self._vectors) > 1:
+                _, evicted = self._vectors.popitem(last=False)
+                self._size -= len(evicted)
+
+    async def set_async(self, query: str, entities: Entities, response: Dict[str, Any]):
+        """``set`` for coroutines; writes to a shared (Redis) cache run on a worker thread"""
+        if self.cache.blocking:
+            await asyncio.to_thread(self.set, query, entities, response)
+        else:
+            self.set(query, entities, response)
+
+    def _nearest(self, vector: np.ndarray, entities: Entities, exclude: str) -> Optional[str]:
+        # Only questions about the same countries and industries are candidates:
+        # "risks in Germany" must never answer "risks in Japan"
+        intent, countries, industries = entities
+        with self._lock:
+            bucket = self._vectors.get((countries, industries))
+            if not bucket:
+                return None
+            self._vectors.move_to_end((countries, industries))
+            candidates: List[Tuple[str, np.ndarray]] = [
+                (key, v) for key, (other_intent, v) in bucket.items()
+                if key != exclude and GENERAL_INTENT in (intent, other_intent)
+            ]
+        if not candidates or not vector.any():
+            return None
+
+        similarities = np.stack([v for _, v in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return candidates[best][0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"vectors": self._size, "entity_groups": len(self._vectors), "threshold": self.threshold}
+
+
+def is_mock(section: Any) -> bool:
+    """Whether an agent result, or a response built from one, holds mock figures"""
+    return isinstance(section, dict) and section.get("source") == MOCK_SOURCE
+
+
+def lacks_figures(section: Any) -> bool:
+    """Whether an agent result, or a response built from one, came back without its structured figures"""
+    if not isinstance(section, dict):
+        return False
+    if section.get("extraction") == "none":
+        return True
+    return any(name in section and section[name] is None for name in FIGURE_FIELDS)
+
+
+def is_cacheable(response: Dict[str, Any]) -> bool:
+    """Whether a chat response is complete and model-made enough to serve to other users"""
+    if response.get("response_type") == "error" or is_mock(response) or lacks_figures(response):
+        return False
+    full_analysis = response.get("full_analysis") or {}
+    if full_analysis.get("partial"):
+        return False
+    sections = (response.get("risk_assessment"), response.get("market_analysis"),
+                full_analysis.get("risk_assessment"), full_analysis.get("market_research"))
+    for section in sections:
+        if is_mock(section) or lacks_figures(section) or (isinstance(section, dict) and section.get("status") == "unavailable"):
+            return False
+    return not any("error" in row or is_mock(row) for row in response.get("comparisons", ()))
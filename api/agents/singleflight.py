@@ -0,0 +1,91 @@
+"""
+Single-Flight Call Coalescing for API
+Lets concurrent identical requests share one in-flight model call
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class _Call:
+    """State of one in-flight call shared by its waiters"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key across threads
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running block until it finishes and receive the same result
+    (or exception). The key is released as soon as the call completes, so
+    later calls run again - caching is left to the result cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` unless an identical call is already running"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent awaitables with the same key on one event loop
+
+    Waiters are shielded from each other: cancelling one waiter (for example
+    a disconnected client) does not cancel the shared call for the others.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``factory()`` unless an identical call is already in flight"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda finished: self._release(key, finished))
+        return await asyncio.shield(task)
+
+    def _release(self, key: str, finished: asyncio.Future):
+        if self._tasks.get(key) is finished:
+            del self._tasks[key]
+        if not finished.cancelled():
+            # Mark the exception as retrieved when every waiter has gone away
+            finished.exception()
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently in flight"""
+        return len(self._tasks)
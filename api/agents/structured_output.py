@@ -0,0 +1,236 @@
+"""
+Structured Output for API
+Extracts validated fields from model answers: JSON first, compiled regexes as fallback
+"""
+
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+JSON_FENCE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL | re.IGNORECASE)
+BULLET = re.compile(r"^\s*(?:[-*•]|\d{1,2}[.)])\s+(.+?)\s*$")
+NUMBERED = re.compile(r"^\s*\d{1,2}[.)]\s")
+EMPHASIS = re.compile(r"[*_]{1,2}|`")
+NUMBER = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+MAX_LEAD_IN_LINES = 2
+
+UNIT_MULTIPLIERS = {
+    "trillion": 1e12, "tn": 1e12, "t": 1e12,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+    "million": 1e6, "mn": 1e6, "m": 1e6,
+    "thousand": 1e3, "k": 1e3
+}
+
+
+def to_number(value: Any, unit: Optional[str] = None) -> Optional[float]:
+    """Read a number such as 2500000000, "12.5%", "$2.5B" or "2.5" + "billion" """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = NUMBER.search(str(value))
+        if not match:
+            return None
+        number = float(match.group(0).replace(",", ""))
+        if unit is None:
+            unit_match = re.search(r"\d\s*([a-z]+)", str(value).lower())
+            unit = unit_match.group(1) if unit_match else None
+    if unit:
+        number *= UNIT_MULTIPLIERS.get(unit.lower(), 1)
+    return number
+
+
+class Field:
+    """One output field: its type, allowed range and how to find it in free text
+
+    Args:
+        name: Key in the parsed result
+        kind: "number", "string" or "list" (of strings)
+        description: Shown to the model in the JSON instructions
+        minimum / maximum: Inclusive bounds; numbers outside them are dropped
+        patterns: Compiled regexes for free text, tried in order; the ``value``
+            group holds the match and an optional ``unit`` group a magnitude
+            word such as "billion"
+        heading: Compiled regex for the section heading a list is read from
+            (see ``heading_pattern``)
+        choices: Allowed values of a string field, matched case-insensitively
+        max_items: Longest list kept
+    """
+
+    __slots__ = ("name", "kind", "description", "minimum", "maximum", "patterns", "heading", "choices", "max_items")
+
+    def __init__(self, name: str, kind: str, description: str = "", minimum: Optional[float] = None,
+                 maximum: Optional[float] = None, patterns: Iterable[Pattern] = (),
+                 heading: Optional[Pattern] = None, choices: Iterable[str] = (), max_items: int = 8):
+        self.name = name
+        self.kind = kind
+        self.description = description
+        self.minimum = minimum
+        self.maximum = maximum
+        self.patterns = tuple(patterns)
+        self.heading = heading
+        self.choices = {choice.lower(): choice for choice in choices}
+        self.max_items = max_items
+
+    def coerce(self, value: Any) -> Optional[Any]:
+        """Return the value in this field's type, or None if it is not valid"""
+        if self.kind == "number":
+            number = to_number(value)
+            if number is None:
+                return None
+            if self.minimum is not None and number < self.minimum:
+                return None
+            if self.maximum is not None and number > self.maximum:
+                return None
+            return round(number, 2)
+
+        if self.kind == "string":
+            if not isinstance(value, str) or not value.strip():
+                return None
+            if self.choices:
+                return self.choices.get(value.strip().lower())
+            return value.strip()
+
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            return None
+        items = [str(item).strip() for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+        return items[:self.max_items] or None
+
+    def search(self, text: str) -> Optional[Any]:
+        """Find this field in free text"""
+        if self.kind == "list":
+            return self.coerce(self._bullets_after_heading(text))
+
+        for pattern in self.patterns:
+            for match in pattern.finditer(text):
+                groups = match.groupdict()
+                if self.kind == "number":
+                    value = self.coerce(to_number(groups["value"], groups.get("unit")))
+                else:
+                    value = self.coerce(groups["value"])
+                if value is not None:
+                    return value
+        return None
+
+    def _bullets_after_heading(self, text: str) -> List[str]:
+        if self.heading is None:
+            return []
+        match = self.heading.search(text)
+        if not match:
+            return []
+
+        items = []
+        skipped = 0
+        gap = False
+        for line in text[match.end():].splitlines()[1:]:
+            bullet = BULLET.match(line)
+            if bullet:
+                if gap and NUMBERED.match(line):
+                    break  # A numbered line after a blank one starts the next section
+                items.append(EMPHASIS.sub("", bullet.group(1)).strip().rstrip(":"))
+                if len(items) == self.max_items:
+                    break
+            elif line.strip():
+                # Allow a short lead-in sentence, but the first other line after the list ends it
+                skipped += 1
+                if items or skipped > MAX_LEAD_IN_LINES:
+                    break
+            gap = bool(items) and not line.strip()
+        return items
+
+
+def heading_pattern(names: str) -> Pattern:
+    """Match a heading line such as "3. Key Market Players" or "## **Opportunities**"
+
+    Args:
+        names: Regex alternation of heading words, e.g. "opportunities|growth drivers"
+    """
+    return re.compile(rf"^[\s#*\d.)]*(?:key\s+)?(?:market\s+)?(?:{names})\b[^\n]*$", re.IGNORECASE | re.MULTILINE)
+
+
+class OutputSchema:
+    """Set of fields a model answer is parsed into
+
+    ``parse`` never calls the model again: a JSON object in the answer is
+    validated field by field, and any field that is missing or invalid is
+    looked for in the surrounding text with the field's compiled regexes.
+    """
+
+    def __init__(self, fields: Iterable[Field]):
+        self.fields = tuple(fields)
+        self._decoder = json.JSONDecoder()
+
+    def instructions(self) -> str:
+        """Prompt suffix asking the model to finish with a JSON object matching this schema"""
+        lines = [f'  "{field.name}": {field.description}' for field in self.fields]
+        return (
+            "After the analysis, output a single JSON object in a ```json code block with these keys:\n"
+            "{\n" + ",\n".join(lines) + "\n}"
+        )
+
+    def parse(self, text: str) -> Tuple[Dict[str, Any], str]:
+        """
+        Extract the schema's fields from a model answer
+
+        Returns:
+            (fields, method): the valid fields found, and "json" if the answer
+            contained a JSON object, "text" if only the regex fallback matched,
+            or "none" if nothing could be extracted
+        """
+        payload = self.find_json(text)
+        result = {}
+        if payload is not None:
+            for field in self.fields:
+                if field.name in payload:
+                    value = field.coerce(payload[field.name])
+                    if value is not None:
+                        result[field.name] = value
+
+        if len(result) < len(self.fields):
+            narrative = self.strip_json(text)
+            for field in self.fields:
+                if field.name not in result:
+                    value = field.search(narrative)
+                    if value is not None:
+                        result[field.name] = value
+
+        if payload is not None:
+            method = "json"
+        else:
+            method = "text" if result else "none"
+        if method != "json":
+            logger.debug(f"Structured output fell back to '{method}' extraction ({len(result)}/{len(self.fields)} fields)")
+        return result, method
+
+    def find_json(self, text: str) -> Optional[Dict[str, Any]]:
+        """Return the first JSON object in the text, fenced or bare"""
+        for match in JSON_FENCE.finditer(text):
+            payload = self._decode(match.group(1), 0)
+            if payload is not None:
+                return payload
+
+        start = text.find("{")
+        while start != -1:
+            payload = self._decode(text, start)
+            if payload is not None:
+                return payload
+            start = text.find("{", start + 1)
+        return None
+
+    def _decode(self, text: str, start: int) -> Optional[Dict[str, Any]]:
+        try:
+            payload, _ = self._decoder.raw_decode(text, start)
+        except ValueError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    @staticmethod
+    def strip_json(text: str) -> str:
+        """Remove the fenced JSON block so only the narrative analysis remains"""
+        return JSON_FENCE.sub("", text).strip()
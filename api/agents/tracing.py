@@ -0,0 +1,323 @@
+"""
+Tracing for API
+Opt-in nested timing spans per request, propagated across asyncio tasks and executor threads
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_SERVER_TIMING_ENTRIES = 20
+SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed stage of a request
+
+    Used as a context manager. Entering makes it the parent of spans opened
+    inside it, including in tasks and executor threads started from it, and
+    leaving records its duration on the trace.
+    """
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "start", "end", "start_ns", "_token")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = 0.0
+        self.end = 0.0
+        self.start_ns = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Left in a different context (e.g. an async generator resumed elsewhere)
+            _current_span.set(None)
+        self.trace.add(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_unix_nano": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """Returned by ``span`` when the current request is not traced"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """All spans of one request; spans may finish on any thread"""
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, finished: Span):
+        with self._lock:
+            self.spans.append(finished)
+
+    def server_timing(self, root: Span) -> str:
+        """Server-Timing header value: total time plus each finished span in start order"""
+        with self._lock:
+            spans = sorted((s for s in self.spans if s is not root), key=lambda s: s.start)
+        entries = [f"total;dur={root.duration_ms:.1f}"]
+        for finished in spans[:MAX_SERVER_TIMING_ENTRIES]:
+            entries.append(f"{SERVER_TIMING_NAME.sub('_', finished.name)};dur={finished.duration_ms:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [finished.to_dict() for finished in self.spans]
+        return {"trace_id": self.trace_id, "spans": spans}
+
+
+def span(name: str, **attributes: Any):
+    """
+    Open a child span of the current span
+
+    Costs one context variable lookup when the request is not traced.
+
+    Example:
+        with span("orchestrator.recommendation", country=country):
+            ...
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def start_trace(name: str, **attributes: Any) -> Span:
+    """Root span for a new trace (one per request)"""
+    return Span(Trace(), name, None, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class TraceExporter:
+    """Writes finished traces from a background thread so requests never wait on I/O
+
+    The thread starts on the first export in each process, so a pre-forking
+    server does not lose it across the fork. When the queue is full, traces
+    are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue)
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        if self._pid != os.getpid():
+            self._start_worker()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.debug("Trace export queue full, dropping trace")
+
+    def _start_worker(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            threading.Thread(target=self._work, name="trace-exporter", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _work(self):
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception as e:
+                logger.warning(f"⚠️ Trace export failed: {str(e)}")
+
+    def write(self, traces: List[Trace]):
+        raise NotImplementedError
+
+
+class JsonlTraceExporter(TraceExporter):
+    """Appends one JSON line per trace to a local file"""
+
+    def __init__(self, path: str, max_queue: int = 1000):
+        super().__init__(max_queue)
+        self.path = path
+
+    def write(self, traces: List[Trace]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for trace in traces:
+                f.write(json.dumps(trace.to_dict()) + "\n")
+
+
+class OTLPTraceExporter(TraceExporter):
+    """Posts traces to an OTLP/HTTP collector using the JSON encoding
+
+    Args:
+        endpoint: Collector traces URL, e.g. http://localhost:4318/v1/traces
+        service_name: Reported as the service.name resource attribute
+        timeout: Seconds per POST
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "market-research-api", timeout: float = 2.0,
+                 max_queue: int = 1000):
+        super().__init__(max_queue)
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def write(self, traces: List[Trace]):
+        body = json.dumps(self.encode(traces)).encode("utf-8")
+        request = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+    def encode(self, traces: List[Trace]) -> Dict[str, Any]:
+        spans = []
+        for trace in traces:
+            for finished in trace.to_dict()["spans"]:
+                spans.append({
+                    "traceId": trace.trace_id,
+                    "spanId": finished["span_id"],
+                    "parentSpanId": finished["parent_id"] or "",
+                    "name": finished["name"],
+                    "startTimeUnixNano": str(finished["start_unix_nano"]),
+                    "endTimeUnixNano": str(finished["start_unix_nano"] + int(finished["duration_ms"] * 1e6)),
+                    "attributes": [
+                        {"key": key, "value": {"stringValue": str(value)}}
+                        for key, value in finished["attributes"].items()
+                    ]
+                })
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}]
+            }]
+        }
+
+
+def create_exporter(kind: str, trace_file: str = "traces.jsonl", otlp_endpoint: Optional[str] = None) -> Optional[TraceExporter]:
+    """
+    Build the configured trace exporter
+
+    Args:
+        kind: "file" (JSON lines), "otlp" (OTLP/HTTP collector) or "none"
+        trace_file: Output path for the file exporter
+        otlp_endpoint: Collector traces URL for the otlp exporter
+    """
+    if kind == "file":
+        return JsonlTraceExporter(trace_file)
+    if kind == "otlp":
+        return OTLPTraceExporter(otlp_endpoint or "http://localhost:4318/v1/traces")
+    if kind != "none":
+        raise ValueError(f"Unknown trace exporter: {kind}")
+    return None
+
+
+class TracingMiddleware:
+    """ASGI middleware that traces each HTTP request
+
+    Every request gets a root span. With ``response_headers`` on, the
+    response also carries ``X-Trace-Id`` and a ``Server-Timing`` breakdown of
+    the spans that finished before the headers were sent. That is the whole
+    request for JSON endpoints, but only the setup for streamed ones.
+
+    Args:
+        app: The ASGI application to wrap
+        exporter: Where finished traces are sent (None keeps them in memory only)
+        response_headers: Add the debug timing headers to responses
+        skip_paths: Paths that are never traced
+    """
+
+    def __init__(self, app: Any, exporter: Optional[TraceExporter] = None, response_headers: bool = False,
+                 skip_paths: tuple = ("/metrics", "/health")):
+        self.app = app
+        self.exporter = exporter
+        self.response_headers = response_headers
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        root = start_trace(f"{scope['method']} {scope['path']}", method=scope["method"], path=scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("status", message["status"])
+                if self.response_headers:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", root.trace.trace_id.encode("latin-1")))
+                    headers.append((b"server-timing", root.trace.server_timing(root).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        with root:
+            await self.app(scope, receive, send_wrapper)
+            route_path = getattr(scope.get("route"), "path", None)
+            if route_path:
+                root.name = f"{scope['method']} {route_path}"
+
+        if self.exporter is not None:
+            self.exporter.export(root.trace)
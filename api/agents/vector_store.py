@@ -0,0 +1,537 @@
+"""
+Vector Store for API
+Append-only segmented document index in object storage, updated incrementally and hot-swapped by readers
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .retrieval import DEFAULT_CACHE_DIR, DEFAULT_EMBEDDING_MODEL, MANIFEST_FILE, Passage, VectorIndex, write_index
+
+logger = logging.getLogger(__name__)
+
+LATEST_KEY = "LATEST"
+MANIFEST_PREFIX = "manifests/"
+SEGMENT_PREFIX = "segments/"
+
+DEFAULT_MAX_SEGMENTS = 8
+DEFAULT_MAX_DELETED_RATIO = 0.3
+DEFAULT_KEEP_MANIFESTS = 5
+DEFAULT_REFRESH_INTERVAL = 60.0
+
+
+class IndexConflictError(Exception):
+    """Another writer published a new generation since this commit started"""
+
+
+class ObjectStore:
+    """Interface for the storage holding segments and manifests (S3, or a local directory)"""
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Object contents, or None if there is no such object"""
+        raise NotImplementedError
+
+    def put(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        """Keys starting with ``prefix``"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def download(self, key: str, path: str):
+        Path(path).write_bytes(self.get(key))
+
+    def upload(self, key: str, path: str):
+        self.put(key, Path(path).read_bytes())
+
+
+class LocalObjectStore(ObjectStore):
+    """Objects as files under a directory; stands in for S3 in development and tests"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a partial object (as with S3)
+        staging = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        staging.write_bytes(data)
+        os.replace(staging, path)
+
+    def list(self, prefix: str) -> List[str]:
+        if not self.root.exists():
+            return []
+        keys = (path.relative_to(self.root).as_posix() for path in self.root.rglob("*") if path.is_file())
+        return sorted(key for key in keys if key.startswith(prefix) and not Path(key).name.startswith("."))
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def download(self, key: str, path: str):
+        shutil.copyfile(self._path(key), path)
+
+    def upload(self, key: str, path: str):
+        self.put(key, Path(path).read_bytes())
+
+
+class S3ObjectStore(ObjectStore):
+    """Objects under a prefix of an S3 bucket"""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def put(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix + prefix):
+            keys.extend(item["Key"][len(self.prefix):] for item in page.get("Contents", ()))
+        return sorted(keys)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def download(self, key: str, path: str):
+        self.client.download_file(self.bucket, self.prefix + key, path)
+
+    def upload(self, key: str, path: str):
+        self.client.upload_file(path, self.bucket, self.prefix + key)
+
+
+def open_object_store(location: str) -> ObjectStore:
+    """S3ObjectStore for s3://bucket/prefix, otherwise a LocalObjectStore on the directory"""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://"):].partition("/")
+        return S3ObjectStore(bucket, prefix)
+    return LocalObjectStore(location)
+
+
+class DocumentChunks(NamedTuple):
+    """The chunks of one document, embedded and ready to index
+
+    ``metadata`` applies to every chunk (e.g. {"source": "report.pdf"});
+    ``chunk_metadata``, if given, adds one dict per chunk.
+    """
+    doc_id: str
+    texts: Sequence[str]
+    vectors: np.ndarray
+    metadata: Dict[str, Any] = {}
+    chunk_metadata: Optional[Sequence[Dict[str, Any]]] = None
+
+
+def _manifest_key(generation: int) -> str:
+    return f"{MANIFEST_PREFIX}{generation:08d}.json"
+
+
+def _empty_manifest(embedding_model: str) -> Dict[str, Any]:
+    return {"generation": 0, "id": "empty", "embedding_model": embedding_model, "dimensions": None,
+            "segments": [], "tombstones": {}}
+
+
+def _read_manifest(store: ObjectStore) -> Optional[Dict[str, Any]]:
+    latest = store.get(LATEST_KEY)
+    if latest is None:
+        return None
+    data = store.get(_manifest_key(int(latest)))
+    return json.loads(data) if data is not None else None
+
+
+def _live(doc_id: str, segment: Dict[str, Any], tombstones: Dict[str, int]) -> bool:
+    # A tombstone hides the document in segments written before it
+    return tombstones.get(doc_id, 0) <= segment["seq"]
+
+
+def _download_segment(store: ObjectStore, segment_id: str, directory: Path):
+    """Copy a segment's files into ``directory`` (renamed into place once complete)"""
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{segment_id}.", dir=directory.parent))
+    try:
+        prefix = f"{SEGMENT_PREFIX}{segment_id}/"
+        keys = store.list(prefix)
+        if f"{prefix}{MANIFEST_FILE}" not in keys:
+            raise FileNotFoundError(f"Segment {segment_id} is missing from the store")
+        for key in keys:
+            store.download(key, str(staging / key[len(prefix):]))
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Another worker on this host downloaded it first
+            if not (directory / MANIFEST_FILE).exists():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class IndexWriter:
+    """Publishes document additions and deletions as new index generations
+
+    Each commit writes one new immutable segment holding only the added or
+    replaced documents, records deletions as tombstones, and publishes a
+    small manifest listing the live segments; the cost scales with the
+    change, not the corpus. Segments that accumulate (or fill up with
+    deleted chunks) are merged by compaction, which only rewrites the
+    segments it merges. Old segments stay in the store until
+    ``collect_garbage`` removes the ones no recent manifest lists, so
+    readers on an older generation keep working.
+
+    One writer at a time is assumed; a commit that finds a newer generation
+    than the one it started from raises IndexConflictError.
+    """
+
+    def __init__(self, store: ObjectStore, embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+                 max_segments: int = DEFAULT_MAX_SEGMENTS, max_deleted_ratio: float = DEFAULT_MAX_DELETED_RATIO):
+        """
+        Args:
+            store: Where segments and manifests live
+            embedding_model: Model every segment's vectors come from
+            max_segments: Compact once a commit leaves more segments than this
+            max_deleted_ratio: Rewrite a segment once this share of its chunks is deleted
+        """
+        self.store = store
+        self.embedding_model = embedding_model
+        self.max_segments = max_segments
+        self.max_deleted_ratio = max_deleted_ratio
+        self._documents: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+    def manifest(self) -> Dict[str, Any]:
+        """The latest published manifest (an empty one before the first commit)"""
+        manifest = _read_manifest(self.store) or _empty_manifest(self.embedding_model)
+        if manifest["embedding_model"] != self.embedding_model:
+            raise ValueError(f"Index was built with {manifest['embedding_model']}, not {self.embedding_model}")
+        return manifest
+
+    def commit(self, upserts: Sequence[DocumentChunks] = (), deletions: Iterable[str] = (),
+               compact: bool = True) -> Dict[str, Any]:
+        """
+        Add or replace documents and delete others in one new generation
+
+        Args:
+            upserts: Documents to add; a document ID already in the index is replaced
+            deletions: Document IDs to remove
+            compact: Merge segments afterwards if the compaction thresholds are crossed
+
+        Returns:
+            The published manifest
+        """
+        base = self.manifest()
+        generation = base["generation"] + 1
+        segments = [dict(segment) for segment in base["segments"]]
+        tombstones = dict(base["tombstones"])
+
+        upserts = [document for document in upserts if len(document.texts)]
+        dimensions = base["dimensions"]
+        for document in upserts:
+            width = np.asarray(document.vectors).reshape(len(document.texts), -1).shape[1]
+            if dimensions is not None and width != dimensions:
+                raise ValueError(f"Document {document.doc_id} has {width}-dimensional vectors, the index {dimensions}")
+            dimensions = width
+
+        for doc_id in {document.doc_id for document in upserts} | set(deletions):
+            if any(doc_id in self._segment_documents(segment["id"]) for segment in segments):
+                tombstones[doc_id] = generation
+
+        if upserts:
+            segments.append(self._write_segment(upserts, generation, generation))
+
+        manifest = self._publish(base, generation, segments, tombstones, dimensions)
+        if compact:
+            candidates = self._compaction_candidates(manifest)
+            if candidates:
+                manifest = self.compact(candidates)
+        return manifest
+
+    def compact(self, segment_ids: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Merge segments into one, dropping deleted chunks
+
+        The merged segment takes the newest sequence number of its inputs, so
+        tombstones keep meaning the same for everything else. Tombstones that
+        no longer hide anything are dropped.
+
+        Args:
+            segment_ids: Segments to merge (all of them if None)
+
+        Returns:
+            The published manifest
+        """
+        base = self.manifest()
+        generation = base["generation"] + 1
+        tombstones = dict(base["tombstones"])
+        chosen = [segment for segment in base["segments"] if segment_ids is None or segment["id"] in segment_ids]
+        segments = [segment for segment in base["segments"] if segment not in chosen]
+        if not chosen:
+            return base
+
+        work_dir = Path(tempfile.mkdtemp(prefix="compaction."))
+        try:
+            merged: List[DocumentChunks] = []
+            for segment in chosen:
+                directory = work_dir / segment["id"]
+                _download_segment(self.store, segment["id"], directory)
+                index = VectorIndex(str(directory))
+                for doc_id, (start, end) in sorted(index.documents.items(), key=lambda item: item[1]):
+                    if _live(doc_id, segment, tombstones):
+                        texts, metadatas, vectors = index.chunks(start, end)
+                        merged.append(DocumentChunks(doc_id, texts, vectors, chunk_metadata=metadatas))
+            if merged:
+                segments.append(self._write_segment(merged, generation, max(segment["seq"] for segment in chosen)))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        segments.sort(key=lambda segment: segment["seq"])
+        # A tombstone is only needed while an older segment still holds the document
+        tombstones = {
+            doc_id: deleted_at for doc_id, deleted_at in tombstones.items()
+            if any(segment["seq"] < deleted_at and doc_id in self._segment_documents(segment["id"]) for segment in segments)
+        }
+        logger.info(f"Compacted {len(chosen)} segments into {1 if merged else 0} (generation {generation})")
+        return self._publish(base, generation, segments, tombstones, base["dimensions"])
+
+    def collect_garbage(self, keep_manifests: int = DEFAULT_KEEP_MANIFESTS) -> int:
+        """
+        Delete manifests older than the last ``keep_manifests`` and segments none of those list
+
+        Returns:
+            Number of objects deleted
+        """
+        manifest_keys = self.store.list(MANIFEST_PREFIX)
+        kept, expired = manifest_keys[-keep_manifests:], manifest_keys[:-keep_manifests]
+        referenced = set()
+        for key in kept:
+            referenced.update(segment["id"] for segment in json.loads(self.store.get(key))["segments"])
+
+        doomed = list(expired)
+        for key in self.store.list(SEGMENT_PREFIX):
+            if key[len(SEGMENT_PREFIX):].split("/", 1)[0] not in referenced:
+                doomed.append(key)
+        for key in doomed:
+            self.store.delete(key)
+        return len(doomed)
+
+    def _compaction_candidates(self, manifest: Dict[str, Any]) -> List[str]:
+        segments = manifest["segments"]
+        candidates = {segment["id"] for segment in segments
+                      if segment["deleted"] and segment["deleted"] / segment["count"] > self.max_deleted_ratio}
+        if len(segments) > self.max_segments:
+            # Merge the smaller half, so large segments are rewritten rarely
+            by_size = sorted(segments, key=lambda segment: segment["count"] - segment["deleted"])
+            candidates.update(segment["id"] for segment in by_size[:len(segments) - self.max_segments // 2 + 1])
+        return sorted(candidates)
+
+    def _write_segment(self, documents: Sequence[DocumentChunks], generation: int, seq: int) -> Dict[str, Any]:
+        texts, metadatas, vectors, ranges = [], [], [], {}
+        for document in documents:
+            start = len(texts)
+            texts.extend(document.texts)
+            for i in range(len(document.texts)):
+                extra = document.chunk_metadata[i] if document.chunk_metadata is not None else {}
+                metadatas.append({**document.metadata, **extra, "doc_id": document.doc_id, "chunk": i})
+            vectors.append(np.asarray(document.vectors, dtype=np.float32).reshape(len(document.texts), -1))
+            ranges[document.doc_id] = (start, len(texts))
+        vectors = np.concatenate(vectors)
+
+        staging = Path(tempfile.mkdtemp(prefix="segment."))
+        try:
+            content_id = write_index(str(staging / "segment"), texts, metadatas, vectors,
+                                     embedding_model=self.embedding_model, documents=ranges)
+            segment_id = f"{generation:08d}-{content_id}"
+            files = sorted((staging / "segment").iterdir(), key=lambda path: path.name == MANIFEST_FILE)
+            for path in files:
+                self.store.upload(f"{SEGMENT_PREFIX}{segment_id}/{path.name}", str(path))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self._documents[segment_id] = ranges
+        return {"id": segment_id, "seq": seq, "count": len(texts), "deleted": 0}
+
+    def _segment_documents(self, segment_id: str) -> Dict[str, Tuple[int, int]]:
+        documents = self._documents.get(segment_id)
+        if documents is None:
+            manifest = json.loads(self.store.get(f"{SEGMENT_PREFIX}{segment_id}/{MANIFEST_FILE}"))
+            documents = {doc_id: tuple(span) for doc_id, span in manifest.get("documents", {}).items()}
+            self._documents[segment_id] = documents
+        return documents
+
+    def _publish(self, base: Dict[str, Any], generation: int, segments: List[Dict[str, Any]],
+                 tombstones: Dict[str, int], dimensions: Optional[int]) -> Dict[str, Any]:
+        for segment in segments:
+            segment["deleted"] = sum(
+                end - start for doc_id, (start, end) in self._segment_documents(segment["id"]).items()
+                if not _live(doc_id, segment, tombstones)
+            )
+        state = json.dumps({"segments": segments, "tombstones": tombstones}, sort_keys=True)
+        manifest = {
+            "generation": generation,
+            "id": hashlib.sha256(state.encode("utf-8")).hexdigest()[:12],
+            "embedding_model": self.embedding_model,
+            "dimensions": dimensions,
+            "segments": segments,
+            "tombstones": tombstones
+        }
+
+        latest = self.store.get(LATEST_KEY)
+        latest = int(latest) if latest is not None else 0
+        if latest != base["generation"]:
+            raise IndexConflictError(f"Generation {latest} was published while generation {generation} was being written")
+        # The manifest goes up before the pointer to it, so readers only ever follow complete generations
+        self.store.put(_manifest_key(generation), json.dumps(manifest, indent=2).encode("utf-8"))
+        self.store.put(LATEST_KEY, str(generation).encode("utf-8"))
+        logger.info(f"Published index generation {generation}: {len(segments)} segments, {len(tombstones)} tombstones")
+        return manifest
+
+
+class _Snapshot(NamedTuple):
+    """One generation as a reader serves it"""
+    generation: int
+    id: str
+    dimensions: Optional[int]
+    segments: Tuple[Tuple[str, VectorIndex, Optional[np.ndarray]], ...]  # (segment ID, index, deleted-chunk mask)
+
+
+class SegmentedIndex:
+    """Reader for an IndexWriter store, swapping to new generations while serving
+
+    ``refresh`` downloads only segments it does not have yet, memory-maps
+    them, and replaces the served snapshot in one reference assignment, so
+    searches in flight finish on the generation they started with and no
+    restart is needed. Unchanged segments stay mapped across refreshes.
+    Searches fan out over the segments with deleted chunks masked and merge
+    the top hits.
+    """
+
+    backend = "segmented"
+
+    def __init__(self, store: ObjectStore, cache_dir: str = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            store: Store an IndexWriter publishes to
+            cache_dir: Local directory segments are downloaded to, shared by the workers on a host
+        """
+        self.store = store
+        self.segment_dir = Path(cache_dir) / "segments"
+        self._snapshot = _Snapshot(0, "empty", None, ())
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def id(self) -> str:
+        return self._snapshot.id
+
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return self._snapshot.dimensions
+
+    @property
+    def count(self) -> int:
+        return sum(index.count - (int(mask.sum()) if mask is not None else 0) for _, index, mask in self._snapshot.segments)
+
+    def refresh(self) -> bool:
+        """
+        Switch to the latest published generation if it is newer
+
+        Returns:
+            True if a new generation is now being served
+        """
+        with self._refresh_lock:
+            latest = self.store.get(LATEST_KEY)
+            if latest is None or int(latest) == self._snapshot.generation:
+                return False
+            manifest = _read_manifest(self.store)
+            if manifest is None:
+                return False
+
+            opened = {segment_id: index for segment_id, index, _ in self._snapshot.segments}
+            segments = []
+            for segment in manifest["segments"]:
+                index = opened.get(segment["id"])
+                if index is None:
+                    directory = self.segment_dir / segment["id"]
+                    if not (directory / MANIFEST_FILE).exists():
+                        _download_segment(self.store, segment["id"], directory)
+                    index = VectorIndex(str(directory))
+                segments.append((segment["id"], index, self._deleted_mask(index, segment, manifest["tombstones"])))
+
+            self._snapshot = _Snapshot(manifest["generation"], manifest["id"], manifest["dimensions"], tuple(segments))
+            self._prune({segment_id for segment_id, _, _ in segments})
+        logger.info(f"🔄 Retrieval index now serving generation {manifest['generation']} ({len(segments)} segments)")
+        return True
+
+    @staticmethod
+    def _deleted_mask(index: VectorIndex, segment: Dict[str, Any], tombstones: Dict[str, int]) -> Optional[np.ndarray]:
+        if not segment["deleted"]:
+            return None
+        mask = np.zeros(index.count, dtype=bool)
+        for doc_id, (start, end) in index.documents.items():
+            if not _live(doc_id, segment, tombstones):
+                mask[start:end] = True
+        return mask
+
+    def _prune(self, current: set):
+        # Mapped files stay readable after unlinking, so searches on the old snapshot are unaffected
+        if not self.segment_dir.exists():
+            return
+        for directory in self.segment_dir.iterdir():
+            if directory.name not in current and not directory.name.startswith("."):
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def search(self, vector: np.ndarray, k: int) -> List[Passage]:
+        """The ``k`` live chunks most similar to a unit-length query vector, best first"""
+        snapshot = self._snapshot
+        hits: List[Passage] = []
+        for _, index, mask in snapshot.segments:
+            hits.extend(index.search(vector, k, exclude=mask))
+        return heapq.nlargest(k, hits, key=lambda passage: passage.score)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {"id": snapshot.id, "generation": snapshot.generation, "segments": len(snapshot.segments),
+                "chunks": self.count, "dimensions": snapshot.dimensions, "backend": self.backend}
+
+
+async def refresh_periodically(index: SegmentedIndex, interval: float = DEFAULT_REFRESH_INTERVAL):
+    """Poll the store for new generations until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(index.refresh)
+        except Exception as e:
+            logger.warning(f"⚠️ Retrieval index refresh failed, still serving generation {index.generation}: {str(e)}")
@@ -0,0 +1,4 @@
+"""
+Benchmarks for API
+Offline load tests against the in-process app with a simulated-latency Bedrock stub
+"""
@@ -0,0 +1,147 @@
+"""
+Simulated Bedrock for API benchmarks
+Local stand-in for the bedrock-runtime client with configurable latency and token rates
+"""
+
+import io
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+# One answer that satisfies both the market and the risk output schemas,
+# so the structured parsers run their JSON path as they would in production
+ANSWER_FIELDS = {
+    "market_size": 2500000000,
+    "growth_rate": 12.5,
+    "key_players": ["Local incumbents", "Regional challengers", "Global platforms"],
+    "opportunities": ["Digital adoption", "Underserved segments", "Regulatory modernisation"],
+    "challenges": ["Competition", "Licensing", "Talent"],
+    "overall_risk_score": 5.2,
+    "risk_level": "Medium",
+    "political_risk": 4.0,
+    "economic_risk": 5.5,
+    "legal_risk": 5.0,
+    "operational_risk": 6.0,
+    "market_risk": 5.5,
+    "technology_risk": 4.5,
+    "mitigation_strategies": ["Local partnerships", "Phased entry", "Compliance review"]
+}
+
+ANSWER_TEXT = (
+    "Executive summary: the market is sizeable and growing, with moderate overall risk.\n\n"
+    "```json\n" + json.dumps(ANSWER_FIELDS, indent=2) + "\n```"
+)
+
+
+class ThrottlingException(Exception):
+    """Raised for simulated Bedrock throttling"""
+
+
+class LatencyProfile:
+    """Shape of the simulated model latency
+
+    Time to first token is log-normal around ``first_token_ms``; generation
+    then runs at a normally distributed ``tokens_per_second`` for an output
+    length drawn between ``min_output_tokens`` and the request's max_tokens.
+
+    Args:
+        first_token_ms: Median time to the first token
+        first_token_sigma: Log-normal spread of the first token time (0 = fixed)
+        tokens_per_second: Mean generation speed
+        tokens_per_second_stddev: Spread of the generation speed
+        min_output_tokens: Shortest simulated answer
+        output_fill: Fraction of max_tokens the longest answer uses
+        error_rate: Probability that a call fails with ThrottlingException
+        time_scale: Multiplier on every delay (e.g. 0.01 for quick smoke runs)
+    """
+
+    def __init__(self, first_token_ms: float = 600.0, first_token_sigma: float = 0.35,
+                 tokens_per_second: float = 60.0, tokens_per_second_stddev: float = 10.0,
+                 min_output_tokens: int = 200, output_fill: float = 0.8, error_rate: float = 0.0,
+                 time_scale: float = 1.0):
+        self.first_token_ms = first_token_ms
+        self.first_token_sigma = first_token_sigma
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_second_stddev = tokens_per_second_stddev
+        self.min_output_tokens = min_output_tokens
+        self.output_fill = output_fill
+        self.error_rate = error_rate
+        self.time_scale = time_scale
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class SimulatedBedrockClient:
+    """Drop-in for the bedrock-runtime client methods the agents use
+
+    Calls block the calling thread for the simulated duration, like boto3
+    does, so executor sizing and queueing behave as they would against
+    Bedrock. Draws come from one seeded generator, so a run with the same
+    seed and request order reproduces the same latencies.
+
+    Args:
+        profile: Latency and token-rate distributions
+        seed: Seed for the random draws
+        chunks: Number of text deltas in a streamed answer
+    """
+
+    def __init__(self, profile: Optional[LatencyProfile] = None, seed: int = 7, chunks: int = 20):
+        self.profile = profile or LatencyProfile()
+        self.chunks = chunks
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId: str, body: str) -> Dict[str, Any]:
+        input_tokens, output_tokens, first_token, generation = self._draw(body)
+        time.sleep(first_token + generation)
+        payload = {
+            "content": [{"type": "text", "text": ANSWER_TEXT}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            "stop_reason": "end_turn"
+        }
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str) -> Dict[str, Any]:
+        draw = self._draw(body)
+        return {"body": self._events(*draw)}
+
+    def _events(self, input_tokens: int, output_tokens: int, first_token: float, generation: float) -> Iterator[Dict[str, Any]]:
+        yield self._event({"type": "message_start", "message": {"usage": {"input_tokens": input_tokens}}})
+        time.sleep(first_token)
+        size = math.ceil(len(ANSWER_TEXT) / self.chunks)
+        for start in range(0, len(ANSWER_TEXT), size):
+            yield self._event({"type": "content_block_delta", "delta": {"type": "text_delta", "text": ANSWER_TEXT[start:start + size]}})
+            time.sleep(generation / self.chunks)
+        yield self._event({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": output_tokens}})
+        yield self._event({"type": "message_stop"})
+
+    @staticmethod
+    def _event(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+    def _draw(self, body: str):
+        """(input tokens, output tokens, seconds to first token, seconds of generation) for one call"""
+        request = json.loads(body)
+        prompt = request["messages"][0]["content"]
+        max_tokens = request.get("max_tokens", 1000)
+        profile = self.profile
+
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < profile.error_rate
+            first_token = self._random.lognormvariate(math.log(profile.first_token_ms / 1000), profile.first_token_sigma)
+            rate = max(1.0, self._random.gauss(profile.tokens_per_second, profile.tokens_per_second_stddev))
+            longest = max(profile.min_output_tokens, int(max_tokens * profile.output_fill))
+            output_tokens = self._random.randint(min(profile.min_output_tokens, longest), longest)
+
+        if failed:
+            time.sleep(first_token * profile.time_scale)
+            raise ThrottlingException("Simulated throttling (ThrottlingException)")
+
+        input_tokens = max(1, len(prompt) // 4)  # Roughly four characters per token
+        return input_tokens, output_tokens, first_token * profile.time_scale, output_tokens / rate * profile.time_scale
@@ -0,0 +1,380 @@
+"""
+Load Benchmarks for API
+Drives chat, analyze and compare requests through the in-process app at rising concurrency
+
+Usage (from the api directory):
+    python -m benchmarks.load --scenarios chat,analyze --concurrency 1,8,32 --requests 200 \
+        --save benchmarks/baselines/local.json
+    python -m benchmarks.load --compare benchmarks/baselines/local.json
+
+Requests go through the full ASGI stack (middleware, routing, validation,
+agents, executor, parsing) over httpx's in-memory transport, and every model
+call is served by ``SimulatedBedrockClient``, so no AWS access is needed and
+results are comparable between runs on the same machine.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .bedrock_stub import LatencyProfile, SimulatedBedrockClient
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {"Authorization": "Bearer demo_benchmark"}
+DEFAULT_CONCURRENCY = (1, 4, 16, 64)
+DEFAULT_TOLERANCE = 0.2
+
+COUNTRIES = (
+    "Germany", "Japan", "Kenya", "Brazil", "India", "Vietnam", "Poland", "Chile",
+    "Rwanda", "Indonesia", "Mexico", "Estonia", "Morocco", "Peru", "Singapore", "Ghana"
+)
+INDUSTRIES = ("fintech", "healthcare", "e-commerce", "energy", "logistics", "agriculture", "software", "retail")
+CHAT_TEMPLATES = (
+    "What are the risks of entering the {country} {industry} market?",
+    "How big is the {industry} market in {country}?",
+    "Should we expand our {industry} business to {country}?",
+    "Compare {country} and {other} for {industry}"
+)
+ANALYSIS_TYPES = ("market", "risk", "comprehensive")
+
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+def _pair(index: int, distinct: int) -> Tuple[str, str, str]:
+    """Country, industry and a second country for request ``index``; pairs repeat every ``distinct`` requests"""
+    if distinct:
+        index %= distinct
+    country = COUNTRIES[index % len(COUNTRIES)]
+    industry = INDUSTRIES[(index // len(COUNTRIES)) % len(INDUSTRIES)]
+    other = COUNTRIES[(index + 1) % len(COUNTRIES)]
+    return country, industry, other
+
+
+def chat_request(index: int, distinct: int) -> Request:
+    country, industry, other = _pair(index, distinct)
+    query = CHAT_TEMPLATES[index % len(CHAT_TEMPLATES)].format(country=country, industry=industry, other=other)
+    return "POST", "/api/v1/chat", {"query": query, "session_id": f"bench-{index % 50}"}
+
+
+def analyze_request(index: int, distinct: int) -> Request:
+    country, industry, _ = _pair(index, distinct)
+    analysis_type = ANALYSIS_TYPES[index % len(ANALYSIS_TYPES)]
+    return "POST", "/api/v1/analyze", {"country": country, "industry": industry, "analysis_type": analysis_type}
+
+
+def compare_request(index: int, distinct: int) -> Request:
+    country, industry, other = _pair(index, distinct)
+    third = COUNTRIES[(COUNTRIES.index(other) + 3) % len(COUNTRIES)]
+    return "POST", "/api/v1/compare", {"countries": [country, other, third], "industry": industry}
+
+
+SCENARIOS: Dict[str, Callable[[int, int], Request]] = {
+    "chat": chat_request,
+    "analyze": analyze_request,
+    "compare": compare_request
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile (q in 0..100) of already sorted values"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float, lags: List[float]) -> Dict[str, Any]:
+    """Throughput, latency percentiles (ms) and event-loop lag (ms) for one run"""
+    latencies = sorted(latencies)
+    lags = sorted(lags)
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0
+        },
+        "loop_lag_ms": {
+            "p50": round(percentile(lags, 50) * 1000, 2),
+            "p99": round(percentile(lags, 99) * 1000, 2),
+            "max": round(lags[-1] * 1000, 2) if lags else 0.0
+        }
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that sleeps ``interval`` seconds
+
+    Any blocking work on the loop (parsing, JSON encoding, a synchronous
+    model call) shows up as lag for every request being served.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+
+    async def stop(self) -> List[float]:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        return self.samples
+
+
+async def run_load(client: Any, make_request: Callable[[int, int], Request], concurrency: int,
+                   requests: int, distinct: int = 0) -> Dict[str, Any]:
+    """
+    Send ``requests`` requests with ``concurrency`` of them in flight at a time
+
+    Args:
+        client: httpx.AsyncClient bound to the app
+        make_request: Scenario function returning (method, path, json body) for a request index
+        concurrency: Simultaneous requests (closed loop: each finished request starts the next)
+        requests: Total requests
+        distinct: Distinct country/industry pairs (0 = every request is different)
+
+    Returns:
+        Summary from ``summarize``
+    """
+    latencies: List[float] = []
+    errors = [0]
+    next_index = [0]
+    monitor = LoopLagMonitor()
+
+    async def worker():
+        while next_index[0] < requests:
+            index = next_index[0]
+            next_index[0] += 1
+            method, path, body = make_request(index, distinct)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=HEADERS)
+                ok = response.status_code < 400 and response.json().get("success", True)
+            except Exception as e:
+                logger.debug(f"Benchmark request failed: {str(e)}")
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[0] += 1
+
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, errors[0], elapsed, await monitor.stop())
+
+
+def install_simulated_agents(app_module: Any, bedrock: SimulatedBedrockClient, use_cache: bool):
+    """
+    Point the app's agents at the simulated Bedrock client
+
+    Mirrors the agent setup in ``main.lifespan``, which must already have run.
+    Without ``use_cache`` the result cache is dropped, so every request pays
+    for its model calls. The per-token rate limit is switched off, since
+    every simulated client shares one token.
+    """
+    from agents.batch_analyzer import BatchAnalyzer
+    from agents.bedrock_executor import get_executor
+    from agents.comparison_engine import ComparisonEngine
+    from agents.market_research_agent import MarketResearchAgent
+    from agents.multi_agent_orchestrator import MultiAgentOrchestrator
+    from agents.risk_assessment_agent import RiskAssessmentAgent
+
+    settings = app_module.settings
+    cache = app_module.chatbot.cache if use_cache else None
+    if not use_cache:
+        app_module.chatbot.cache = None
+        app_module.chatbot.response_cache = None
+
+    app_module.rate_limiter = None
+
+    executor = get_executor()
+    app_module.market_agent = MarketResearchAgent(executor=executor, cache=cache, bedrock_client=bedrock)
+    app_module.risk_agent = RiskAssessmentAgent(executor=executor, cache=cache, bedrock_client=bedrock)
+    app_module.orchestrator = MultiAgentOrchestrator(
+        agent_timeout=settings.AGENT_TIMEOUT,
+        market_agent=app_module.market_agent,
+        risk_agent=app_module.risk_agent
+    )
+    app_module.comparison_engine = ComparisonEngine(
+        app_module.orchestrator,
+        max_concurrency=settings.COMPARISON_MAX_CONCURRENCY
+    )
+    app_module.batch_analyzer = BatchAnalyzer(
+        app_module.market_agent,
+        app_module.risk_agent,
+        app_module.orchestrator,
+        max_concurrency=settings.BATCH_MAX_CONCURRENCY
+    )
+
+
+async def run_suite(scenarios: List[str], concurrency_levels: List[int], requests: int,
+                    profile: LatencyProfile, seed: int = 7, use_cache: bool = False,
+                    distinct: int = 0) -> Dict[str, Any]:
+    """
+    Run every scenario at every concurrency level against a fresh app
+
+    Returns:
+        Baseline document: run settings under "meta" and one summary per
+        scenario and concurrency under "results"
+    """
+    import httpx
+    import main
+
+    results: Dict[str, Dict[str, Any]] = {}
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for name in scenarios:
+                results[name] = {}
+                for concurrency in concurrency_levels:
+                    # Fresh agents per run so single-flight and caches start empty
+                    bedrock = SimulatedBedrockClient(profile, seed=seed)
+                    install_simulated_agents(main, bedrock, use_cache)
+                    summary = await run_load(client, SCENARIOS[name], concurrency, requests, distinct)
+                    summary["model_calls"] = bedrock.calls
+                    results[name][str(concurrency)] = summary
+                    print(format_row(name, concurrency, summary), flush=True)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": requests,
+            "seed": seed,
+            "cache": use_cache,
+            "distinct": distinct,
+            "executor_workers": main.settings.BEDROCK_EXECUTOR_WORKERS,
+            "profile": profile.to_dict()
+        },
+        "results": results
+    }
+
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    List regressions of ``current`` against ``baseline``
+
+    A run regresses when its p95 or p99 latency or its event-loop lag p99
+    grows, or its throughput drops, by more than ``tolerance`` (a fraction),
+    or when it has errors the baseline did not. Scenarios or concurrency
+    levels missing from either side are ignored.
+    """
+    regressions = []
+    for name, levels in current["results"].items():
+        for concurrency, run in levels.items():
+            before = baseline.get("results", {}).get(name, {}).get(concurrency)
+            if before is None:
+                continue
+            label = f"{name} @ {concurrency}"
+            for metric in ("p95", "p99"):
+                if run["latency_ms"][metric] > before["latency_ms"][metric] * (1 + tolerance):
+                    regressions.append(f"{label}: latency {metric} {before['latency_ms'][metric]} -> {run['latency_ms'][metric]} ms")
+            # Lag below a millisecond is scheduler noise
+            if run["loop_lag_ms"]["p99"] > max(before["loop_lag_ms"]["p99"] * (1 + tolerance), 1.0):
+                regressions.append(f"{label}: loop lag p99 {before['loop_lag_ms']['p99']} -> {run['loop_lag_ms']['p99']} ms")
+            if run["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{label}: throughput {before['throughput_rps']} -> {run['throughput_rps']} req/s")
+            if run["errors"] > before["errors"]:
+                regressions.append(f"{label}: errors {before['errors']} -> {run['errors']}")
+    return regressions
+
+
+def format_row(name: str, concurrency: int, summary: Dict[str, Any]) -> str:
+    latency = summary["latency_ms"]
+    return (
+        f"{name:<8} c={concurrency:<4} {summary['throughput_rps']:>8.1f} req/s  "
+        f"p50 {latency['p50']:>8.1f}  p95 {latency['p95']:>8.1f}  p99 {latency['p99']:>8.1f} ms  "
+        f"loop lag p99 {summary['loop_lag_ms']['p99']:>6.1f} ms  errors {summary['errors']}"
+    )
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load benchmark with simulated Bedrock latency")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=_int_list, default=list(DEFAULT_CONCURRENCY), help="Comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and level")
+    parser.add_argument("--first-token-ms", type=float, default=600.0, help="Median simulated time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Mean simulated generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of model calls that are throttled")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier on simulated delays (e.g. 0.05)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache (measures the warm path)")
+    parser.add_argument("--distinct", type=int, default=0, help="Distinct country/industry pairs (0 = all unique)")
+    parser.add_argument("--save", help="Write the results to this JSON baseline file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative change")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    profile = LatencyProfile(
+        first_token_ms=args.first_token_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        time_scale=args.time_scale
+    )
+    current = asyncio.run(run_suite(scenarios, args.concurrency, args.requests, profile, args.seed, args.cache, args.distinct))
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(current, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,6 +18,16 @@ class Settings:
     PORT = int(os.getenv("API_PORT", "8000"))
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
     
+    # Production Server Configuration (SERVER_MODE=production runs gunicorn with uvicorn workers)
+    SERVER_MODE = os.getenv("SERVER_MODE", "development")
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))  # Worker processes
+    GUNICORN_PRELOAD = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"  # Import the app once before forking
+    GUNICORN_TIMEOUT = int(os.getenv("GUNICORN_TIMEOUT", "180"))  # Kill workers silent for this long
+    GUNICORN_GRACEFUL_TIMEOUT = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))  # Drain time on restart/shutdown
+    GUNICORN_KEEPALIVE = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+    GUNICORN_MAX_REQUESTS = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))  # Recycle workers after N requests (0 = never)
+    GUNICORN_MAX_REQUESTS_JITTER = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+    
     # AWS Configuration
     AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
     AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
@@ -27,7 +37,27 @@ class Settings:
     BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
     BEDROCK_MAX_TOKENS = int(os.getenv("BEDROCK_MAX_TOKENS", "4000"))
     BEDROCK_TEMPERATURE = float(os.getenv("BEDROCK_TEMPERATURE", "0.1"))
+    BEDROCK_EXECUTOR_WORKERS = int(os.getenv("BEDROCK_EXECUTOR_WORKERS", "16"))  # Concurrent model calls per worker
+    BEDROCK_TIMEOUT = float(os.getenv("BEDROCK_TIMEOUT", "120"))  # Seconds before an awaiting request gives up
+    BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "32"))  # Keep >= BEDROCK_EXECUTOR_WORKERS
+    BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "4"))  # Adaptive retries, including throttling
+    BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "16"))  # Model calls in flight per worker, before throttling
+    BEDROCK_MIN_CONCURRENCY = int(os.getenv("BEDROCK_MIN_CONCURRENCY", "1"))  # Floor the limit shrinks to while throttled
+    BEDROCK_QUEUE_TIMEOUT = float(os.getenv("BEDROCK_QUEUE_TIMEOUT", "30"))  # Seconds a call waits for a slot before a 429
+    AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "90"))  # Per-agent limit inside comprehensive analyses
+    COMPARISON_MAX_CONCURRENCY = int(os.getenv("COMPARISON_MAX_CONCURRENCY", "10"))  # Agent calls in flight per comparison
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))  # Items analyzed at once per batch request
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))  # Largest accepted batch grid
     
+    # Retrieval Configuration (document context for the agents from the notebook 05 vector store)
+    RETRIEVAL_STORE = os.getenv("RETRIEVAL_STORE")  # Segmented store (s3://bucket/prefix or a directory); takes precedence
+    RETRIEVAL_REFRESH_INTERVAL = float(os.getenv("RETRIEVAL_REFRESH_INTERVAL", "60"))  # Seconds between checks for a new generation
+    RETRIEVAL_INDEX = os.getenv("RETRIEVAL_INDEX")  # Index or LangChain store directory, or a .tar.gz path / s3:// URI
+    RETRIEVAL_CACHE_DIR = os.getenv("RETRIEVAL_CACHE_DIR", "/tmp/market-research-index")  # Where archives are unpacked, once per host
+    RETRIEVAL_EMBEDDING_MODEL = os.getenv("RETRIEVAL_EMBEDDING_MODEL", "amazon.titan-embed-text-v1")  # Must match the index
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))  # Passages added to each prompt
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.2"))  # Less similar passages are left out
+
     # Security Configuration
     SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
     ALGORITHM = "HS256"
@@ -40,20 +70,51 @@ class Settings:
         "https://your-frontend-domain.com"
     ]
     
-    # Rate Limiting
+    # Rate Limiting (token bucket per API token; shared through REDIS_URL when set)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
     RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
     RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "3600"))  # 1 hour
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", os.getenv("RATE_LIMIT_REQUESTS", "100")))  # Requests allowed at once
     
     # Logging Configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     
+    # Tracing Configuration (opt-in per-request timing spans)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file")  # "file", "otlp" or "none"
+    TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+    OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACE_RESPONSE_HEADERS = os.getenv("TRACE_RESPONSE_HEADERS", str(DEBUG)).lower() == "true"  # X-Trace-Id and Server-Timing
+    
     # Cache Configuration
     CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # 1 hour
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))  # In-process LRU size
+    CACHE_LOCAL_TTL = int(os.getenv("CACHE_LOCAL_TTL", "300"))  # Local copies when Redis is enabled
+    REDIS_URL = os.getenv("REDIS_URL")  # e.g. redis://redis:6379/0; unset = local cache only
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() == "true"  # Reuse answers to paraphrased chat questions
+    CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", os.getenv("CACHE_TTL", "3600")))
+    CHAT_SIMILARITY_THRESHOLD = float(os.getenv("CHAT_SIMILARITY_THRESHOLD", "0.8"))  # Cosine similarity for near-duplicate hits
+    CHAT_CACHE_MAX_VECTORS = int(os.getenv("CHAT_CACHE_MAX_VECTORS", "4096"))  # Query vectors kept per worker
     
     # Database Configuration (if needed for session storage)
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./market_research.db")
     
+    # Session Configuration
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # "memory" or "sqlite" (uses DATABASE_URL)
+    SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))  # Turns kept per session
+    SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "3600"))  # Seconds before an idle session expires
+    SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "64"))  # Memory backend only
+    
+    # Background Job Configuration
+    JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")  # "memory" (per worker) or "sqlite" (uses DATABASE_URL)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # Jobs run at once per worker process
+    JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))  # Submissions are refused beyond this backlog
+    JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))  # Seconds before a dead worker's job is retried
+    JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))  # Seconds finished jobs stay available
+    JOB_EVENTS_INTERVAL = float(os.getenv("JOB_EVENTS_INTERVAL", "0.5"))  # Poll interval of /jobs/{id}/events
+    
     class Config:
         case_sensitive = True
 
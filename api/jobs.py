@@ -0,0 +1,531 @@
+"""
+Background jobs for the Global Market Research API
+Priority job queue that runs long analyses outside the HTTP request, with pluggable stores
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from session_store import sqlite_path_from_url
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = frozenset((SUCCEEDED, FAILED, CANCELLED))
+
+# progress(completed, total) is called by handlers as work finishes
+Progress = Callable[[int, int], None]
+Handler = Callable[[Dict[str, Any], Progress], Awaitable[Any]]
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its limit"""
+
+
+def new_job(kind: str, params: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+    """A queued job record; higher ``priority`` runs first, then oldest first"""
+    return {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "params": params,
+        "priority": priority,
+        "status": QUEUED,
+        "progress": {"completed": 0, "total": None},
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None
+    }
+
+
+class JobStore:
+    """Interface for job storage
+
+    ``claim_next`` hands the highest-priority queued job to exactly one
+    worker and marks it running with a lease. A worker renews the lease
+    while it runs; a job whose lease ran out (its worker died) can be
+    claimed again. A job requeued with a delay is not claimed, by any
+    worker, until the delay has passed.
+    """
+
+    # True when calls wait on disk or the network, so coroutines must not make them directly
+    blocking = False
+
+    def create(self, job: Dict[str, Any]):
+        """Store a new queued job"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job record, or None if it does not exist (or was purged)"""
+        raise NotImplementedError
+
+    def claim_next(self, lease: float) -> Optional[Dict[str, Any]]:
+        """Mark the next runnable job as running for ``lease`` seconds and return it"""
+        raise NotImplementedError
+
+    def renew(self, job_id: str, lease: float, progress: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Extend a running job's lease, optionally saving progress; returns the job's current status"""
+        raise NotImplementedError
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        """Record the outcome of a running job; False if it is no longer running (e.g. cancelled)"""
+        raise NotImplementedError
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> bool:
+        """Put a running job back in the queue, claimable after ``delay`` seconds; False if it is no longer running"""
+        raise NotImplementedError
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it does not exist or already finished"""
+        raise NotImplementedError
+
+    def queued(self) -> int:
+        """Number of jobs waiting to run"""
+        raise NotImplementedError
+
+    def purge(self, older_than: float):
+        """Delete finished jobs that finished before the given unix time"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size information for monitoring"""
+        return {}
+
+
+class InMemoryJobStore(JobStore):
+    """Per-process job store, for tests and single-worker deployments
+
+    Jobs live only as long as the process, and a job can only be polled on
+    the worker that accepted it.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[tuple] = []
+        self._delayed: List[tuple] = []  # (not before, job ID) for requeued jobs still backing off
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any]):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            heapq.heappush(self._heap, (-job["priority"], next(self._order), job["job_id"]))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def claim_next(self, lease: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            while self._delayed and self._delayed[0][0] <= now:
+                _, job_id = heapq.heappop(self._delayed)
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    heapq.heappush(self._heap, (-job["priority"], next(self._order), job_id))
+            while self._heap:
+                _, _, job_id = heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != QUEUED:
+                    continue  # Cancelled or purged while waiting
+                job["status"] = RUNNING
+                job["started_at"] = time.time()
+                job["attempts"] += 1
+                return dict(job)
+        return None
+
+    def renew(self, job_id: str, lease: float, progress: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if progress is not None and job["status"] == RUNNING:
+                job["progress"] = progress
+            return job["status"]
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != RUNNING:
+                return False
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            return True
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != RUNNING:
+                return False
+            job["status"] = QUEUED
+            if delay > 0:
+                heapq.heappush(self._delayed, (time.time() + delay, job_id))
+            else:
+                heapq.heappush(self._heap, (-job["priority"], next(self._order), job_id))
+            return True
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return False
+            job.update(status=CANCELLED, finished_at=time.time())
+            return True
+
+    def queued(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] == QUEUED)
+
+    def purge(self, older_than: float):
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job["status"] in FINISHED and job["finished_at"] < older_than]:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"backend": "memory", "jobs": counts}
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in SQLite, shared by every worker on the same host
+
+    Any worker process can accept, run or report a job. Claims run in an
+    immediate transaction, so two workers never take the same job.
+    """
+
+    blocking = True
+
+    COLUMNS = ("job_id", "kind", "params", "priority", "status", "progress", "result", "error",
+               "attempts", "created_at", "started_at", "finished_at")
+    JSON_COLUMNS = ("params", "progress", "result")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so that each forked worker gets its own connection
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+                "priority INTEGER NOT NULL, status TEXT NOT NULL, progress TEXT NOT NULL, "
+                "result TEXT, error TEXT, attempts INTEGER NOT NULL, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, lease_until REAL, not_before REAL)"
+            )
+            if "not_before" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")  # Databases created before retry delays
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def _row_to_job(self, row: tuple) -> Dict[str, Any]:
+        job = dict(zip(self.COLUMNS, row))
+        for column in self.JSON_COLUMNS:
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        return job
+
+    def create(self, job: Dict[str, Any]):
+        values = [json.dumps(job[column]) if column in self.JSON_COLUMNS else job[column] for column in self.COLUMNS]
+        with self._lock:
+            self._connection().execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                values
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def claim_next(self, lease: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT job_id FROM jobs WHERE (status = ? AND (not_before IS NULL OR not_before <= ?)) "
+                    "OR (status = ? AND lease_until < ?) "
+                    "ORDER BY status = ? DESC, priority DESC, created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now, RUNNING)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, lease_until = ?, not_before = NULL, "
+                    "attempts = attempts + 1 WHERE job_id = ?",
+                    (RUNNING, now, now + lease, row[0])
+                )
+                job = conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE job_id = ?", (row[0],)
+                ).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(job)
+
+    def renew(self, job_id: str, lease: float, progress: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        with self._lock:
+            conn = self._connection()
+            if progress is None:
+                conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND status = ?",
+                    (time.time() + lease, job_id, RUNNING)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET lease_until = ?, progress = ? WHERE job_id = ? AND status = ?",
+                    (time.time() + lease, json.dumps(progress), job_id, RUNNING)
+                )
+            row = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        with self._lock:
+            cursor = self._connection().execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE job_id = ? AND status = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id: str, delay: float = 0.0) -> bool:
+        with self._lock:
+            cursor = self._connection().execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, not_before = ? WHERE job_id = ? AND status = ?",
+                (QUEUED, time.time() + delay if delay > 0 else None, job_id, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._connection().execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease_until = NULL "
+                "WHERE job_id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def queued(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def purge(self, older_than: float):
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, CANCELLED, older_than)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"backend": "sqlite", "jobs": dict(rows), "path": self.path}
+
+
+class JobRunner:
+    """Runs queued jobs on a fixed number of asyncio workers
+
+    Each worker claims one job at a time, so at most ``workers`` jobs run
+    per process whatever the queue length. Workers wake as soon as a job is
+    submitted in this process, and poll the store every ``poll_interval``
+    seconds for jobs accepted by other processes. While a job runs, its
+    lease is renewed every ``lease / 3`` seconds; a cancellation seen at
+    renewal stops the job.
+
+    A job failing with one of the ``retry_on`` exceptions (e.g. Bedrock
+    throttling) is queued again until it has used ``max_attempts``. No
+    worker, in this process or another, claims it again before the
+    exception's ``retry_after`` seconds have passed, so a throttled backend
+    is not hit again straight away; the worker itself moves on to other jobs.
+
+    Args:
+        store: Where jobs are kept
+        handlers: Coroutine per job kind, called as handler(params, progress)
+        workers: Jobs run at the same time in this process
+        max_queued: Submissions beyond this many waiting jobs raise QueueFullError
+        lease: Seconds a claimed job stays assigned without a renewal
+        max_attempts: Claims of one job (after worker crashes or retries) before it is failed
+        result_ttl: Seconds finished jobs are kept for polling
+        poll_interval: Seconds between store polls when idle
+        retry_on: Exception types that send a job back to the queue
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Handler], workers: int = 4, max_queued: int = 1000,
+                 lease: float = 60.0, max_attempts: int = 3, result_ttl: float = 86400, poll_interval: float = 1.0,
+                 retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.retry_on = retry_on
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def submit(self, kind: str, params: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        """
+        Queue a job and return its record
+
+        Raises:
+            ValueError: If there is no handler for ``kind``
+            QueueFullError: If ``max_queued`` jobs are already waiting
+        """
+        job = self._enqueue(kind, params, priority)
+        self._wake()
+        return job
+
+    async def submit_async(self, kind: str, params: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        """``submit`` for coroutines; a blocking store is written on a worker thread"""
+        job = await self._call_store(self._enqueue, kind, params, priority)
+        self._wake()
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's record, or None if it does not exist"""
+        return await self._call_store(self.store.get, job_id)
+
+    async def cancel_job(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it already finished"""
+        return await self._call_store(self.store.cancel, job_id)
+
+    def _enqueue(self, kind: str, params: Dict[str, Any], priority: int) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.store.queued() >= self.max_queued:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+
+        job = new_job(kind, params, priority)
+        self.store.create(job)
+        return job
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _call_store(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        # SQLite calls run on a worker thread so a busy database never stalls the event loop
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return method(*args, **kwargs)
+
+    def start(self):
+        """Start the workers on the running event loop"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        logger.info(f"✅ Job runner started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers; their running jobs are picked up again once the leases expire"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        last_purge = 0.0
+        while True:
+            job = await self._call_store(self.store.claim_next, self.lease)
+            if job is None:
+                if time.monotonic() - last_purge > 60:
+                    last_purge = time.monotonic()
+                    await self._call_store(self.store.purge, time.time() - self.result_ttl)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        if job["attempts"] > self.max_attempts:
+            await self._call_store(self.store.finish, job_id, FAILED, error=f"Gave up after {self.max_attempts} attempts")
+            return
+
+        progress: Dict[str, Any] = dict(job["progress"])
+
+        def report(completed: int, total: int):
+            progress.update(completed=completed, total=total)
+
+        task = asyncio.ensure_future(self.handlers[job["kind"]](job["params"], report))
+        logger.info(f"Running {job['kind']} job {job_id} (priority {job['priority']})")
+        saved = None
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=min(self.lease / 3, self.poll_interval))
+                if progress != saved or not done:
+                    saved = dict(progress)
+                    if await self._call_store(self.store.renew, job_id, self.lease, saved) == CANCELLED:
+                        task.cancel()
+                        logger.info(f"Job {job_id} cancelled")
+                        return
+                if done:
+                    break
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        try:
+            await self._call_store(self.store.finish, job_id, SUCCEEDED, result=task.result())
+        except self.retry_on as e:
+            delay = getattr(e, "retry_after", self.poll_interval)
+            if job["attempts"] < self.max_attempts and await self._call_store(self.store.requeue, job_id, delay):
+                logger.warning(f"Job {job_id} will be retried in {delay:.0f}s: {str(e)}")
+                return
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            await self._call_store(self.store.finish, job_id, FAILED, error=str(e))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            await self._call_store(self.store.finish, job_id, FAILED, error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, **self.store.stats()}
+
+    async def stats_async(self) -> Dict[str, Any]:
+        return await self._call_store(self.stats)
+
+
+def create_job_store(backend: str = "memory", database_url: Optional[str] = None) -> JobStore:
+    """
+    Build the configured job store
+
+    Args:
+        backend: "memory" (per process) or "sqlite" (shared by workers on one host)
+        database_url: sqlite:/// URL used by the sqlite backend
+    """
+    if backend == "sqlite":
+        path = sqlite_path_from_url(database_url or "sqlite:///./market_research.db")
+        logger.info(f"✅ Using SQLite job store at {path}")
+        return SQLiteJobStore(path)
+    if backend != "memory":
+        raise ValueError(f"Unknown job backend: {backend}")
+    return InMemoryJobStore()
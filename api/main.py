@@ -3,21 +3,37 @@
 Production-ready FastAPI service for market research chatbot interactions
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Security, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import Dict, List, Any, Optional
-import boto3
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Any, AsyncIterator, Optional
+import asyncio
 import json
 import re
+import hashlib
 import logging
 from datetime import datetime
 import uuid
-import os
+import time
 from contextlib import asynccontextmanager
 
+from config import settings
+from agents.batch_analyzer import ANALYSIS_TYPES, BatchAnalyzer
+from agents.bedrock_limiter import BedrockThrottledError
+from agents.cache import create_cache
+from agents.comparison_engine import ComparisonEngine
+from agents.entities import NON_COUNTRY_TERMS, REGIONS, get_registry
+from agents.metrics import CHAT_LATENCY, RATE_LIMITED, PrometheusMiddleware, record_cache_lookup, render_metrics
+from agents.prompts import token_usage
+from agents.retrieval import get_retriever
+from agents.semantic_cache import SemanticChatCache, is_cacheable, is_mock
+from agents.tracing import TracingMiddleware, create_exporter, span
+from jobs import FINISHED, JobRunner, QueueFullError, create_job_store
+from rate_limit import bucket_key, create_rate_limiter, retry_after_header
+from session_store import InMemorySessionStore, SessionStore, create_session_store
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,27 +45,105 @@ security = HTTPBearer()
 market_agent = None
 risk_agent = None
 orchestrator = None
+comparison_engine = None
+batch_analyzer = None
+job_runner = None
+rate_limiter = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize agents on startup"""
-    global market_agent, risk_agent, orchestrator
+    global market_agent, risk_agent, orchestrator, comparison_engine, batch_analyzer, job_runner, rate_limiter
+    index_refresher = None
+    
+    # Per-token request budget; Bedrock throttling is handled separately by the agents' limiter
+    if settings.RATE_LIMIT_ENABLED:
+        rate_limiter = create_rate_limiter(
+            settings.RATE_LIMIT_REQUESTS,
+            settings.RATE_LIMIT_WINDOW,
+            burst=settings.RATE_LIMIT_BURST,
+            redis_url=settings.REDIS_URL
+        )
+    
+    # Analyses and parsed queries are cached locally and, with REDIS_URL, shared across workers
+    result_cache = create_cache(
+        ttl=settings.CACHE_TTL,
+        max_entries=settings.CACHE_MAX_ENTRIES,
+        redis_url=settings.REDIS_URL,
+        redis_max_connections=settings.REDIS_MAX_CONNECTIONS,
+        local_ttl=settings.CACHE_LOCAL_TTL
+    )
+    chatbot.cache = result_cache
+    if settings.CHAT_CACHE_ENABLED:
+        # Paraphrases of an answered question are served without running the agents again
+        chatbot.response_cache = SemanticChatCache(
+            result_cache,
+            version=chatbot.parser_version,
+            ttl=settings.CHAT_CACHE_TTL,
+            threshold=settings.CHAT_SIMILARITY_THRESHOLD,
+            max_vectors=settings.CHAT_CACHE_MAX_VECTORS
+        )
     
     try:
         # Import and initialize agents
         logger.info("Initializing market research agents...")
         
-        # Initialize Bedrock client
-        bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
+        # One pooled Bedrock client per process, shared by every agent
+        from agents.bedrock_client import configure_bedrock_clients
+        bedrock_client = configure_bedrock_clients(
+            max_pool_connections=settings.BEDROCK_MAX_POOL_CONNECTIONS,
+            read_timeout=settings.BEDROCK_TIMEOUT,
+            max_attempts=settings.BEDROCK_MAX_ATTEMPTS
+        ).get(settings.AWS_REGION)
+        
+        # Bounded pool that keeps blocking model calls off the event loop
+        from agents.bedrock_executor import configure_executor
+        executor = configure_executor(
+            max_workers=settings.BEDROCK_EXECUTOR_WORKERS,
+            timeout=settings.BEDROCK_TIMEOUT
+        )
+        
+        # Shared cap on concurrent model calls that shrinks when Bedrock throttles
+        from agents.bedrock_limiter import configure_bedrock_limiter
+        configure_bedrock_limiter(
+            min_limit=settings.BEDROCK_MIN_CONCURRENCY,
+            max_limit=min(settings.BEDROCK_MAX_CONCURRENCY, settings.BEDROCK_EXECUTOR_WORKERS),
+            queue_timeout=settings.BEDROCK_QUEUE_TIMEOUT
+        )
+        
+        # Document context for the agents, memory-mapped so every worker on the host shares one copy
+        if settings.RETRIEVAL_STORE or settings.RETRIEVAL_INDEX:
+            from agents.retrieval import BedrockEmbedder, VectorIndex, configure_retriever, fetch_index
+            from agents.vector_store import SegmentedIndex, open_object_store, refresh_periodically
+            try:
+                if settings.RETRIEVAL_STORE:
+                    # Incrementally updated store: new generations are picked up while serving
+                    index = SegmentedIndex(open_object_store(settings.RETRIEVAL_STORE), cache_dir=settings.RETRIEVAL_CACHE_DIR)
+                    index.refresh()
+                    index_refresher = asyncio.create_task(refresh_periodically(index, settings.RETRIEVAL_REFRESH_INTERVAL))
+                else:
+                    index = VectorIndex(fetch_index(settings.RETRIEVAL_INDEX, settings.RETRIEVAL_CACHE_DIR))
+                configure_retriever(
+                    index,
+                    BedrockEmbedder(bedrock_client, settings.RETRIEVAL_EMBEDDING_MODEL),
+                    k=settings.RETRIEVAL_TOP_K,
+                    min_score=settings.RETRIEVAL_MIN_SCORE
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Retrieval index unavailable, answering without document context: {str(e)}")
         
         # Initialize agents (simplified for API)
         from agents.market_research_agent import MarketResearchAgent
         from agents.risk_assessment_agent import RiskAssessmentAgent  
         from agents.multi_agent_orchestrator import MultiAgentOrchestrator
         
-        market_agent = MarketResearchAgent()
-        risk_agent = RiskAssessmentAgent()
-        orchestrator = MultiAgentOrchestrator()
+        market_agent = MarketResearchAgent(executor=executor, cache=result_cache, bedrock_client=bedrock_client)
+        risk_agent = RiskAssessmentAgent(executor=executor, cache=result_cache, bedrock_client=bedrock_client)
+        orchestrator = MultiAgentOrchestrator(
+            agent_timeout=settings.AGENT_TIMEOUT,
+            market_agent=market_agent,
+            risk_agent=risk_agent
+        )
         
         logger.info("✅ All agents initialized successfully!")
         
@@ -61,10 +155,30 @@ async def lifespan(app: FastAPI):
         orchestrator = MockOrchestrator()
         logger.info("✅ Mock agents initialized for demo")
     
+    comparison_engine = ComparisonEngine(orchestrator, max_concurrency=settings.COMPARISON_MAX_CONCURRENCY)
+    batch_analyzer = BatchAnalyzer(market_agent, risk_agent, orchestrator, max_concurrency=settings.BATCH_MAX_CONCURRENCY)
+    
+    # Long analyses submitted as jobs run here, outside the HTTP request
+    job_runner = JobRunner(
+        create_job_store(settings.JOB_BACKEND, settings.DATABASE_URL),
+        handlers=JOB_HANDLERS,
+        workers=settings.JOB_WORKERS,
+        max_queued=settings.JOB_MAX_QUEUED,
+        lease=settings.JOB_LEASE,
+        result_ttl=settings.JOB_RESULT_TTL,
+        retry_on=(BedrockThrottledError,)
+    )
+    job_runner.start()
+    
     yield
     
     # Cleanup
     logger.info("Shutting down agents...")
+    await job_runner.stop()
+    if index_refresher is not None:
+        index_refresher.cancel()
+    from agents.bedrock_executor import get_executor
+    get_executor().shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -85,7 +199,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency histograms, served on /metrics
+app.add_middleware(PrometheusMiddleware)
+
+# Opt-in per-request spans (chatbot -> orchestrator -> agents)
+if settings.TRACING_ENABLED:
+    app.add_middleware(
+        TracingMiddleware,
+        exporter=create_exporter(settings.TRACE_EXPORTER, settings.TRACE_FILE, settings.OTLP_ENDPOINT),
+        response_headers=settings.TRACE_RESPONSE_HEADERS
+    )
+
 # Pydantic models
+def unique_canonical(names: List[str], canonical) -> List[str]:
+    """Canonical names in their original order, each once ("UK" and "United Kingdom" are one country)"""
+    return list(dict.fromkeys(canonical(name) for name in names))
+
 class QueryRequest(BaseModel):
     """Market research query request"""
     query: str = Field(..., description="Natural language market research question", min_length=5, max_length=1000)
@@ -107,6 +236,16 @@ class CountryAnalysisRequest(BaseModel):
     industry: str = Field(..., description="Industry sector", min_length=2, max_length=100)
     analysis_type: str = Field("comprehensive", description="Type of analysis: market, risk, or comprehensive")
     
+    @field_validator("country")
+    @classmethod
+    def canonical_country(cls, value: str) -> str:
+        return get_registry().canonical_country(value)
+    
+    @field_validator("industry")
+    @classmethod
+    def canonical_industry(cls, value: str) -> str:
+        return get_registry().canonical_industry(value)
+    
     class Config:
         schema_extra = {
             "example": {
@@ -121,6 +260,19 @@ class ComparisonRequest(BaseModel):
     countries: List[str] = Field(..., description="List of countries to compare", min_items=2, max_items=5)
     industry: str = Field(..., description="Industry sector", min_length=2, max_length=100)
     
+    @field_validator("countries")
+    @classmethod
+    def canonical_countries(cls, value: List[str]) -> List[str]:
+        countries = unique_canonical(value, get_registry().canonical_country)
+        if len(countries) < 2:
+            raise ValueError("countries must name at least two different countries")
+        return countries
+    
+    @field_validator("industry")
+    @classmethod
+    def canonical_industry(cls, value: str) -> str:
+        return get_registry().canonical_industry(value)
+    
     class Config:
         schema_extra = {
             "example": {
@@ -129,6 +281,57 @@ class ComparisonRequest(BaseModel):
             }
         }
 
+class BatchAnalysisRequest(BaseModel):
+    """Bulk analysis request: a countries x industries x analysis types grid plus optional extra items"""
+    countries: List[str] = Field([], description="Countries of the grid")
+    industries: List[str] = Field([], description="Industries of the grid")
+    analysis_types: List[str] = Field(["comprehensive"], description="Analysis types of the grid: market, risk, or comprehensive")
+    items: List[CountryAnalysisRequest] = Field([], description="Individual combinations in addition to the grid")
+    
+    @field_validator("countries")
+    @classmethod
+    def canonical_countries(cls, value: List[str]) -> List[str]:
+        return unique_canonical(value, get_registry().canonical_country)
+    
+    @field_validator("industries")
+    @classmethod
+    def canonical_industries(cls, value: List[str]) -> List[str]:
+        return unique_canonical(value, get_registry().canonical_industry)
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "countries": ["Germany", "Kenya", "Vietnam"],
+                "industries": ["fintech", "healthcare"],
+                "analysis_types": ["risk"]
+            }
+        }
+    
+    def expand(self) -> List[tuple]:
+        """All (country, industry, analysis_type) combinations, grid first"""
+        grid = [
+            (country, industry, analysis_type)
+            for country in self.countries
+            for industry in self.industries
+            for analysis_type in self.analysis_types
+        ]
+        return grid + [(item.country, item.industry, item.analysis_type) for item in self.items]
+
+class JobRequest(BaseModel):
+    """Background job request"""
+    kind: str = Field(..., description="Job kind: analyze, compare, or batch")
+    params: Dict[str, Any] = Field(..., description="Request body of the matching endpoint (/analyze, /compare or /analyze/batch)")
+    priority: int = Field(0, ge=-10, le=10, description="Higher priorities run first")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "kind": "compare",
+                "params": {"countries": ["Germany", "Japan", "Brazil"], "industry": "fintech"},
+                "priority": 5
+            }
+        }
+
 class APIResponse(BaseModel):
     """Standard API response format"""
     success: bool
@@ -146,7 +349,7 @@ class ErrorResponse(BaseModel):
 
 # Mock agents for demo (replace with actual agents when available)
 class MockMarketAgent:
-    def analyze_market(self, country: str, industry: str):
+    def analyze_market(self, country: str, industry: str, analysis_type: str = "market"):
         return {
             "analysis": f"Market analysis for {industry} in {country}: This is a growing market with significant opportunities. Market size estimated at $2.5B with 15% annual growth rate.",
             "market_size": 2500000000,
@@ -154,9 +357,17 @@ class MockMarketAgent:
             "key_players": ["Company A", "Company B", "Company C"],
             "opportunities": ["Digital transformation", "Regulatory support", "Growing consumer base"]
         }
+    
+    async def analyze_market_async(self, country: str, industry: str, analysis_type: str = "market"):
+        return self.analyze_market(country, industry)
+    
+    async def stream_market_analysis_async(self, country: str, industry: str, analysis_type: str = "market"):
+        result = self.analyze_market(country, industry)
+        yield {"event": "delta", "text": result["analysis"]}
+        yield {"event": "result", "data": result}
 
 class MockRiskAgent:
-    def comprehensive_risk_assessment(self, country: str, industry: str):
+    def comprehensive_risk_assessment(self, country: str, industry: str, analysis_type: str = "risk"):
         return {
             "overall_risk_score": 4.2,
             "risk_level": "Medium",
@@ -169,6 +380,14 @@ class MockRiskAgent:
             },
             "analysis": f"Risk assessment for {industry} in {country}: Overall medium risk profile with stable political environment but some economic volatility."
         }
+    
+    async def comprehensive_risk_assessment_async(self, country: str, industry: str, analysis_type: str = "risk"):
+        return self.comprehensive_risk_assessment(country, industry)
+    
+    async def stream_risk_assessment_async(self, country: str, industry: str, analysis_type: str = "risk"):
+        result = self.comprehensive_risk_assessment(country, industry)
+        yield {"event": "delta", "text": result["analysis"]}
+        yield {"event": "result", "data": result}
 
 class MockOrchestrator:
     def comprehensive_market_entry_analysis(self, country: str, industry: str):
@@ -188,90 +407,88 @@ class MockOrchestrator:
                 "growth_rate": 15.2
             }
         }
+    
+    async def comprehensive_market_entry_analysis_async(self, country: str, industry: str, limiter=None):
+        return self.comprehensive_market_entry_analysis(country, industry)
 
 # Chatbot class
 class GlobalMarketResearchChatbot:
     """Enhanced chatbot with global country support"""
     
-    def __init__(self):
-        self.conversation_history = {}
-        
-        # Comprehensive country list (195+ countries)
-        self.countries = [
-            # Major economies
-            "Germany", "Japan", "United Kingdom", "UK", "France", "Canada", 
-            "Australia", "Brazil", "India", "China", "South Korea", "Italy", 
-            "Spain", "Netherlands", "Sweden", "Norway", "Denmark", "Finland",
-            "Switzerland", "Austria", "Belgium", "Ireland", "New Zealand",
-            "Singapore", "Hong Kong", "United States", "USA", "Mexico",
-            
-            # Africa
-            "Rwanda", "Kenya", "Ghana", "Nigeria", "Egypt", "Morocco", "South Africa", 
-            "Madagascar", "Ethiopia", "Tanzania", "Uganda", "Botswana", "Mauritius", 
-            "Senegal", "Mali", "Burkina Faso", "Niger", "Chad", "Sudan", "Libya",
-            "Algeria", "Tunisia", "Cameroon", "Ivory Coast", "Zambia", "Zimbabwe",
-            
-            # Asia
-            "Bangladesh", "Nepal", "Myanmar", "Sri Lanka", "Maldives", "Bhutan", 
-            "Mongolia", "Kazakhstan", "Uzbekistan", "Afghanistan", "Pakistan", 
-            "Cambodia", "Laos", "Vietnam", "Thailand", "Philippines", "Indonesia",
-            "Malaysia", "Brunei", "Taiwan", "North Korea", "Kyrgyzstan", "Tajikistan",
-            
-            # Europe
-            "Estonia", "Latvia", "Lithuania", "Slovenia", "Malta", "Cyprus", 
-            "Moldova", "Albania", "North Macedonia", "Montenegro", "Bosnia", 
-            "Serbia", "Croatia", "Bulgaria", "Romania", "Hungary", "Czech Republic",
-            "Slovakia", "Poland", "Ukraine", "Belarus", "Russia", "Georgia", "Armenia",
-            
-            # Americas
-            "Ecuador", "Uruguay", "Paraguay", "Costa Rica", "Panama", "Jamaica", 
-            "Cuba", "Guatemala", "Honduras", "Nicaragua", "El Salvador", "Haiti", 
-            "Dominican Republic", "Trinidad", "Barbados", "Bahamas", "Belize",
-            "Guyana", "Suriname", "Venezuela", "Colombia", "Peru", "Bolivia",
-            "Chile", "Argentina",
-            
-            # Pacific
-            "Fiji", "Samoa", "Tonga", "Vanuatu", "Papua New Guinea", "Solomon Islands",
-            "Palau", "Micronesia", "Marshall Islands", "Kiribati", "Tuvalu", "Nauru"
-        ]
+    # Bump when parse_query output changes so shared cached parses are ignored
+    parser_version = "4"
+    
+    # Intent keywords; when several intents match, the earliest in INTENT_PRIORITY wins
+    INTENT_KEYWORDS = {
+        "comparison": ["compare", "compared", "comparing", "comparison", "vs", "versus", "better"],
+        "risk_assessment": ["risk", "risks", "risky", "riskiest", "dangerous", "danger", "safe", "safer", "safety"],
+        "market_research": ["market", "markets", "size", "opportunity", "opportunities", "competition", "competitors", "competitor", "competitive"],
+        "recommendation": ["should", "recommend", "recommendation", "advice", "advise", "enter", "entering", "entry", "expand", "expanding", "expansion"]
+    }
+    INTENT_PRIORITY = ["comparison", "risk_assessment", "market_research", "recommendation"]
+    
+    DEFAULT_COMPARISON_COUNTRIES = ["Germany", "Japan"]
+    
+    WORD_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+    
+    def __init__(self, session_store: Optional[SessionStore] = None):
+        self.sessions = session_store or InMemorySessionStore()
+        self.cache = None  # Set at startup; also holds parsed queries
+        self.response_cache: Optional[SemanticChatCache] = None  # Set at startup
         
-        self.industries = [
-            "technology", "fintech", "e-commerce", "healthcare", "manufacturing",
-            "retail", "automotive", "energy", "telecommunications", "media",
-            "banking", "insurance", "real estate", "education", "gaming",
-            "artificial intelligence", "AI", "machine learning", "blockchain",
-            "cybersecurity", "cloud computing", "software", "hardware", "agriculture",
-            "tourism", "mining", "construction", "logistics", "aerospace"
-        ]
+        # Canonical names only; aliases and ISO codes resolve through the registry
+        self.entities = get_registry()
+        self.countries = [country.name for country in self.entities.countries]
+        self.industries = [industry.name for industry in self.entities.industries]
+        
+        # Built once; parse_query only does dictionary lookups
+        self._lexicon = self._build_lexicon()
+        self._max_term_words = max(len(term.split()) for term in self._lexicon)
         
         logger.info(f"🤖 Chatbot initialized with {len(self.countries)} countries and {len(self.industries)} industries")
     
     def parse_query(self, query: str) -> Dict[str, Any]:
         """Parse user query to extract intent, country, and industry"""
-        query_lower = query.lower()
+        cache_key = f"parsed:v{self.parser_version}:" + hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            record_cache_lookup("chat_parser", cached is not None)
+            if cached is not None:
+                return {**cached, "original_query": query}
         
-        # Extract countries (case-insensitive)
+        parsed = self._parse_query_uncached(query)
+        if self.cache is not None:
+            self.cache.set(cache_key, parsed)
+        return parsed
+    
+    def _parse_query_uncached(self, query: str) -> Dict[str, Any]:
+        """Extract intent, countries and industries from the raw query text in one pass"""
         found_countries = []
-        for country in self.countries:
-            if country.lower() in query_lower:
-                found_countries.append(country)
-        
-        # Extract industries
+        found_demonyms = []
         found_industries = []
-        for industry in self.industries:
-            if industry.lower() in query_lower:
-                found_industries.append(industry)
-        
-        # Determine intent
-        intent = "general"
-        if any(word in query_lower for word in ["risk", "risks", "dangerous", "safe", "safety"]):
-            intent = "risk_assessment"
-        elif any(word in query_lower for word in ["market", "size", "opportunity", "competition", "competitors"]):
-            intent = "market_research"
-        elif any(word in query_lower for word in ["compare", "comparison", "vs", "versus", "better"]):
-            intent = "comparison"
-        elif any(word in query_lower for word in ["should", "recommend", "advice", "enter", "expand"]):
-            intent = "recommendation"
+        found_intents = set()
+        
+        for kind, value in self._scan(query):
+            if kind == "country":
+                if value not in found_countries:
+                    found_countries.append(value)
+            elif kind == "demonym":
+                if value not in found_demonyms:
+                    found_demonyms.append(value)
+            elif kind == "industry":
+                if value not in found_industries:
+                    found_industries.append(value)
+            elif kind == "intent":
+                found_intents.add(value)
+            # "place" terms such as "Latin American" only stop their words matching a country
+        
+        # "We are a British retailer, what about Kenya?" is about Kenya; a demonym
+        # names the country only when the query names none ("the German market")
+        if not found_countries:
+            found_countries = found_demonyms
+        
+        # Determine intent (first matching intent in priority order wins)
+        intent = next((name for name in self.INTENT_PRIORITY if name in found_intents), "general")
         
         return {
             "intent": intent,
@@ -280,57 +497,205 @@ class GlobalMarketResearchChatbot:
             "original_query": query
         }
     
-    def handle_query(self, query: str, session_id: str = None) -> Dict[str, Any]:
+    def _scan(self, query: str):
+        """
+        Yield (kind, value) for every vocabulary term in the query
+        
+        The query is split into words once and each position is looked up
+        as a 1..N word phrase in the lexicon, longest first. Matches are whole
+        words only, so "UK" no longer matches inside "Ukraine", and the cost
+        depends on the query length rather than the vocabulary size.
+        """
+        words = self.WORD_PATTERN.findall(query.lower())
+        position = 0
+        while position < len(words):
+            for length in range(min(self._max_term_words, len(words) - position), 0, -1):
+                entry = self._lexicon.get(" ".join(words[position:position + length]))
+                if entry is not None:
+                    yield entry
+                    position += length
+                    break
+            else:
+                position += 1
+    
+    def _build_lexicon(self) -> Dict[str, tuple]:
+        """Map every lowercase country, industry, alias and intent keyword to (kind, canonical value)"""
+        lexicon = {}
+        for term in NON_COUNTRY_TERMS:
+            lexicon[term.lower()] = ("place", term)
+        for term, country in self.entities.country_terms():
+            lexicon[term.lower()] = ("country", country)
+        for term, country in self.entities.demonym_terms():
+            lexicon[term.lower()] = ("demonym", country)
+        for term, industry in self.entities.industry_terms():
+            lexicon[term.lower()] = ("industry", industry)
+        for intent, keywords in self.INTENT_KEYWORDS.items():
+            for keyword in keywords:
+                lexicon.setdefault(keyword, ("intent", intent))
+        
+        # Keys use the same word splitting as queries ("e-commerce" stays one word)
+        return {" ".join(self.WORD_PATTERN.findall(term)): entry for term, entry in lexicon.items()}
+    
+    async def handle_query(self, query: str, session_id: str = None) -> Dict[str, Any]:
         """Process user query and return appropriate response"""
         
-        # Create session if not exists
-        if session_id and session_id not in self.conversation_history:
-            self.conversation_history[session_id] = []
+        start = time.perf_counter()
+        with span("chat.parse_query"):
+            parsed, country, industry = await self._start_query(query, session_id)
         
-        # Parse the query
-        parsed = self.parse_query(query)
+        try:
+            cached = await self._cached_response(query, parsed, country, industry)
+            if cached is not None:
+                return cached
+            
+            with span("chat.route", intent=parsed["intent"]):
+                response = await self._route(parsed, country, industry)
+            await self._cache_response(query, parsed, country, industry, response)
+            return response
         
-        # Add to conversation history
-        if session_id:
-            self.conversation_history[session_id].append({
-                "timestamp": datetime.now().isoformat(),
-                "user_query": query,
-                "parsed": parsed
-            })
+        except BedrockThrottledError:
+            raise
+                
+        except Exception as e:
+            logger.error(f"Error processing query: {str(e)}")
+            return self._error_response(e)
         
-        # Default values if not found
-        country = parsed["countries"][0] if parsed["countries"] else "Germany"
-        industry = parsed["industries"][0] if parsed["industries"] else "technology"
+        finally:
+            CHAT_LATENCY.labels(parsed["intent"]).observe(time.perf_counter() - start)
+    
+    async def stream_query(self, query: str, session_id: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a query and yield events as soon as each part is ready
+        
+        The parsed intent is sent first. Risk and market questions then stream
+        the model's text as "delta" events. Every query ends with a "result"
+        event holding the same payload handle_query returns. Other intents
+        send only the final result. If the model stream fails partway, an
+        "error" event comes before the result, which then carries the mock
+        answer (or, when Bedrock throttled, the retry hint).
+        """
+        
+        start = time.perf_counter()
+        with span("chat.parse_query"):
+            parsed, country, industry = await self._start_query(query, session_id)
+        yield {
+            "event": "parsed",
+            "intent": parsed["intent"],
+            "countries": parsed["countries"],
+            "industries": parsed["industries"]
+        }
         
         try:
-            # Route to appropriate agent based on intent
+            cached = await self._cached_response(query, parsed, country, industry)
+            if cached is not None:
+                yield {"event": "result", "data": cached}
+                return
+            
             if parsed["intent"] == "risk_assessment":
-                return self._handle_risk_query(country, industry, parsed)
+                events, build_response = risk_agent.stream_risk_assessment_async(country, industry, "chat_summary"), self._risk_response
             elif parsed["intent"] == "market_research":
-                return self._handle_market_query(country, industry, parsed)
-            elif parsed["intent"] == "comparison":
-                return self._handle_comparison_query(parsed)
-            elif parsed["intent"] == "recommendation":
-                return self._handle_recommendation_query(country, industry, parsed)
+                events, build_response = market_agent.stream_market_analysis_async(country, industry, "chat_summary"), self._market_response
             else:
-                return self._handle_general_query(country, industry, parsed)
-                
+                response = await self._route(parsed, country, industry)
+                await self._cache_response(query, parsed, country, industry, response)
+                yield {"event": "result", "data": response}
+                return
+            
+            async for event in events:
+                if event["event"] == "result":
+                    response = build_response(country, industry, event["data"])
+                    await self._cache_response(query, parsed, country, industry, response)
+                    yield {"event": "result", "data": response}
+                else:
+                    yield event
+        
+        except BedrockThrottledError as e:
+            # The 200 status is already sent, so the retry hint goes in the result
+            logger.warning(f"Streaming query throttled: {str(e)}")
+            yield {"event": "result", "data": self._throttled_response(e)}
+                    
         except Exception as e:
-            logger.error(f"Error processing query: {str(e)}")
-            return {
-                "response_type": "error",
-                "message": f"I encountered an error processing your request: {str(e)}",
-                "suggestions": [
-                    "Try asking about a specific country and industry",
-                    "Check if the country/industry names are spelled correctly",
-                    "Ask a simpler question to start"
-                ]
-            }
+            logger.error(f"Error streaming query: {str(e)}")
+            yield {"event": "result", "data": self._error_response(e)}
+        
+        finally:
+            CHAT_LATENCY.labels(parsed["intent"]).observe(time.perf_counter() - start)
     
-    def _handle_risk_query(self, country: str, industry: str, parsed: Dict) -> Dict:
-        """Handle risk assessment queries"""
-        result = risk_agent.comprehensive_risk_assessment(country, industry)
+    async def _start_query(self, query: str, session_id: Optional[str]):
+        """Parse the query, record it in the session and pick the target country/industry"""
+        
+        # Parse the query; a parse cached in Redis is looked up on a worker thread
+        if self.cache is not None and self.cache.blocking:
+            parsed = await asyncio.to_thread(self.parse_query, query)
+        else:
+            parsed = self.parse_query(query)
+        
+        # Add to conversation history (creates the session if needed)
+        if session_id:
+            await self.sessions.add_turn_async(session_id, query, parsed)
+        
+        # Default values if not found
+        country = parsed["countries"][0] if parsed["countries"] else "Germany"
+        industry = parsed["industries"][0] if parsed["industries"] else "technology"
         
+        return parsed, country, industry
+    
+    def _response_entities(self, parsed: Dict, country: str, industry: str) -> tuple:
+        """(intent, countries, industries) the routed handler builds its answer from"""
+        if parsed["intent"] == "comparison":
+            countries = parsed["countries"] if len(parsed["countries"]) >= 2 else self.DEFAULT_COMPARISON_COUNTRIES
+            return parsed["intent"], tuple(countries[:3]), (industry,)
+        return parsed["intent"], (country,), (industry,)
+    
+    async def _cached_response(self, query: str, parsed: Dict, country: str, industry: str) -> Optional[Dict]:
+        if self.response_cache is None:
+            return None
+        with span("chat.response_cache") as current:
+            response, match = await self.response_cache.get_async(query, self._response_entities(parsed, country, industry))
+            current.set_attribute("match", match or "miss")
+        return response
+    
+    async def _cache_response(self, query: str, parsed: Dict, country: str, industry: str, response: Dict):
+        if self.response_cache is not None and is_cacheable(response):
+            await self.response_cache.set_async(query, self._response_entities(parsed, country, industry), response)
+    
+    async def _route(self, parsed: Dict, country: str, industry: str) -> Dict:
+        """Route to appropriate agent based on intent"""
+        if parsed["intent"] == "risk_assessment":
+            return await self._handle_risk_query(country, industry, parsed)
+        elif parsed["intent"] == "market_research":
+            return await self._handle_market_query(country, industry, parsed)
+        elif parsed["intent"] == "comparison":
+            return await self._handle_comparison_query(parsed)
+        elif parsed["intent"] == "recommendation":
+            return await self._handle_recommendation_query(country, industry, parsed)
+        else:
+            return await self._handle_general_query(country, industry, parsed)
+    
+    def _error_response(self, error: Exception) -> Dict:
+        return {
+            "response_type": "error",
+            "message": f"I encountered an error processing your request: {str(error)}",
+            "suggestions": [
+                "Try asking about a specific country and industry",
+                "Check if the country/industry names are spelled correctly",
+                "Ask a simpler question to start"
+            ]
+        }
+    
+    def _throttled_response(self, error: BedrockThrottledError) -> Dict:
+        return {
+            "response_type": "error",
+            "message": "The analysis service is busy right now; please retry shortly",
+            "retry_after": error.retry_after
+        }
+    
+    async def _handle_risk_query(self, country: str, industry: str, parsed: Dict) -> Dict:
+        """Handle risk assessment queries"""
+        result = await risk_agent.comprehensive_risk_assessment_async(country, industry, "chat_summary")
+        return self._risk_response(country, industry, result)
+    
+    def _risk_response(self, country: str, industry: str, result: Dict) -> Dict:
         return {
             "response_type": "risk_assessment",
             "country": country,
@@ -339,13 +704,16 @@ class GlobalMarketResearchChatbot:
             "risk_level": result["risk_level"],
             "risk_breakdown": result["risk_scores"],
             "detailed_analysis": result["analysis"],
-            "message": f"Risk assessment for {industry} in {country}"
+            "message": f"Risk assessment for {industry} in {country}",
+            **self._source(result)
         }
     
-    def _handle_market_query(self, country: str, industry: str, parsed: Dict) -> Dict:
+    async def _handle_market_query(self, country: str, industry: str, parsed: Dict) -> Dict:
         """Handle market research queries"""
-        result = market_agent.analyze_market(country, industry)
-        
+        result = await market_agent.analyze_market_async(country, industry, "chat_summary")
+        return self._market_response(country, industry, result)
+    
+    def _market_response(self, country: str, industry: str, result: Dict) -> Dict:
         return {
             "response_type": "market_research",
             "country": country,
@@ -355,28 +723,24 @@ class GlobalMarketResearchChatbot:
             "growth_rate": result.get("growth_rate"),
             "key_players": result.get("key_players", []),
             "opportunities": result.get("opportunities", []),
-            "message": f"Market analysis for {industry} in {country}"
+            "message": f"Market analysis for {industry} in {country}",
+            **self._source(result)
         }
     
-    def _handle_comparison_query(self, parsed: Dict) -> Dict:
+    def _source(self, result: Dict) -> Dict:
+        """Carry the mock marker of a flattened agent result, so the response is never cached"""
+        return {"source": result["source"]} if is_mock(result) else {}
+    
+    async def _handle_comparison_query(self, parsed: Dict) -> Dict:
         """Handle comparison queries"""
         countries = parsed["countries"]
         industry = parsed["industries"][0] if parsed["industries"] else "technology"
         
         if len(countries) < 2:
-            countries = ["Germany", "Japan"]  # Default comparison
-        
-        # Get analysis for each country
-        comparisons = []
-        for country in countries[:3]:  # Limit to 3 countries
-            result = orchestrator.comprehensive_market_entry_analysis(country, industry)
-            comparisons.append({
-                "country": country,
-                "decision": result["recommendation"]["decision"],
-                "priority": result["recommendation"]["priority"],
-                "risk_score": result["recommendation"]["risk_score"],
-                "risk_level": result["risk_assessment"]["risk_level"]
-            })
+            countries = self.DEFAULT_COMPARISON_COUNTRIES
+        
+        # Analyze all countries concurrently (limit to 3 countries)
+        comparisons = await comparison_engine.compare(countries[:3], industry)
         
         return {
             "response_type": "comparison",
@@ -385,9 +749,9 @@ class GlobalMarketResearchChatbot:
             "message": f"Market comparison for {industry} across {len(comparisons)} countries"
         }
     
-    def _handle_recommendation_query(self, country: str, industry: str, parsed: Dict) -> Dict:
+    async def _handle_recommendation_query(self, country: str, industry: str, parsed: Dict) -> Dict:
         """Handle recommendation queries"""
-        result = orchestrator.comprehensive_market_entry_analysis(country, industry)
+        result = await orchestrator.comprehensive_market_entry_analysis_async(country, industry)
         
         return {
             "response_type": "recommendation",
@@ -401,9 +765,9 @@ class GlobalMarketResearchChatbot:
             "message": f"Market entry recommendation for {industry} in {country}"
         }
     
-    def _handle_general_query(self, country: str, industry: str, parsed: Dict) -> Dict:
+    async def _handle_general_query(self, country: str, industry: str, parsed: Dict) -> Dict:
         """Handle general queries with comprehensive analysis"""
-        result = orchestrator.comprehensive_market_entry_analysis(country, industry)
+        result = await orchestrator.comprehensive_market_entry_analysis_async(country, industry)
         
         return {
             "response_type": "comprehensive",
@@ -414,7 +778,15 @@ class GlobalMarketResearchChatbot:
         }
 
 # Initialize chatbot
-chatbot = GlobalMarketResearchChatbot()
+chatbot = GlobalMarketResearchChatbot(
+    session_store=create_session_store(
+        backend=settings.SESSION_BACKEND,
+        database_url=settings.DATABASE_URL,
+        max_turns=settings.SESSION_MAX_TURNS,
+        idle_ttl=settings.SESSION_IDLE_TTL,
+        memory_budget=settings.SESSION_MEMORY_BUDGET_MB * 1024 * 1024
+    )
+)
 
 # Authentication (simple token-based for demo)
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
@@ -429,6 +801,19 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
         )
     return token
 
+def enforce_rate_limit(token: str = Depends(verify_token)):
+    """Verify the token and take one request from its budget, raising 429 when it is spent"""
+    if rate_limiter is not None:
+        allowed, wait = rate_limiter.acquire(bucket_key(token))
+        if not allowed:
+            RATE_LIMITED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {settings.RATE_LIMIT_REQUESTS} requests per {settings.RATE_LIMIT_WINDOW}s",
+                headers={"Retry-After": retry_after_header(wait)}
+            )
+    return token
+
 # API Routes
 
 @app.get("/", response_model=Dict[str, Any])
@@ -440,9 +825,13 @@ async def root():
         "description": "AI-powered market research for 195+ countries worldwide",
         "endpoints": {
             "chat": "/api/v1/chat",
+            "chat_stream": "/api/v1/chat/stream",
             "analyze": "/api/v1/analyze",
+            "analyze_batch": "/api/v1/analyze/batch",
+            "jobs": "/api/v1/jobs",
             "compare": "/api/v1/compare",
             "health": "/health",
+            "metrics": "/metrics",
             "docs": "/docs"
         },
         "supported_countries": len(chatbot.countries),
@@ -457,13 +846,22 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "agents_status": "operational",
-        "supported_countries": len(chatbot.countries)
+        "supported_countries": len(chatbot.countries),
+        "token_usage": token_usage.snapshot(),
+        "jobs": await job_runner.stats_async() if job_runner is not None else None,
+        "retrieval": get_retriever().stats() if get_retriever() is not None else None
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/api/v1/chat", response_model=APIResponse)
 async def chat_endpoint(
     request: QueryRequest,
-    token: str = Depends(verify_token)
+    token: str = Depends(enforce_rate_limit)
 ):
     """
     Natural language chat interface for market research queries
@@ -479,7 +877,7 @@ async def chat_endpoint(
         logger.info(f"Processing chat query: {request.query[:100]}...")
         
         # Process the query
-        response = chatbot.handle_query(request.query, session_id)
+        response = await chatbot.handle_query(request.query, session_id)
         
         return APIResponse(
             success=True,
@@ -489,6 +887,9 @@ async def chat_endpoint(
             timestamp=datetime.now().isoformat()
         )
         
+    except BedrockThrottledError:
+        raise
+        
     except Exception as e:
         logger.error(f"Chat endpoint error: {str(e)}")
         raise HTTPException(
@@ -496,10 +897,47 @@ async def chat_endpoint(
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/api/v1/chat/stream")
+async def chat_stream_endpoint(
+    request: QueryRequest,
+    http_request: Request,
+    token: str = Depends(enforce_rate_limit)
+):
+    """
+    Streaming variant of the chat interface
+    
+    Returns newline-delimited JSON events (or Server-Sent Events when the
+    client sends "Accept: text/event-stream"):
+    - parsed: detected intent, countries and industries (sent immediately)
+    - delta: a chunk of analysis text as the model generates it
+    - error: the model stream failed partway; the text so far is incomplete
+    - result: the full structured response, same shape as /api/v1/chat data;
+      always the last event
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    logger.info(f"Streaming chat query: {request.query[:100]}...")
+    
+    async def event_stream():
+        async for event in chatbot.stream_query(request.query, session_id):
+            event = {**event, "session_id": session_id} if event["event"] in ("parsed", "result") else event
+            payload = json.dumps(event)
+            if use_sse:
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/v1/analyze", response_model=APIResponse)
 async def analyze_endpoint(
     request: CountryAnalysisRequest,
-    token: str = Depends(verify_token)
+    token: str = Depends(enforce_rate_limit)
 ):
     """
     Structured country and industry analysis
@@ -512,30 +950,7 @@ async def analyze_endpoint(
     try:
         logger.info(f"Processing analysis: {request.country} - {request.industry}")
         
-        if request.analysis_type == "market":
-            result = market_agent.analyze_market(request.country, request.industry)
-            response_data = {
-                "response_type": "market_research",
-                "country": request.country,
-                "industry": request.industry,
-                **result
-            }
-        elif request.analysis_type == "risk":
-            result = risk_agent.comprehensive_risk_assessment(request.country, request.industry)
-            response_data = {
-                "response_type": "risk_assessment",
-                "country": request.country,
-                "industry": request.industry,
-                **result
-            }
-        else:  # comprehensive
-            result = orchestrator.comprehensive_market_entry_analysis(request.country, request.industry)
-            response_data = {
-                "response_type": "comprehensive",
-                "country": request.country,
-                "industry": request.industry,
-                "analysis": result
-            }
+        response_data = await batch_analyzer.analyze(request.country, request.industry, request.analysis_type)
         
         return APIResponse(
             success=True,
@@ -544,6 +959,9 @@ async def analyze_endpoint(
             timestamp=datetime.now().isoformat()
         )
         
+    except BedrockThrottledError:
+        raise
+        
     except Exception as e:
         logger.error(f"Analysis endpoint error: {str(e)}")
         raise HTTPException(
@@ -551,10 +969,61 @@ async def analyze_endpoint(
             detail=f"Analysis failed: {str(e)}"
         )
 
+def batch_items(request: BatchAnalysisRequest) -> List[tuple]:
+    """Expand and check a batch request, raising 400 for empty, oversized or unknown-type batches"""
+    items = request.expand()
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty: give countries and industries, or items")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch has {len(items)} items; the limit is {settings.BATCH_MAX_ITEMS}")
+    unknown = sorted({analysis_type for _, _, analysis_type in items} - set(ANALYSIS_TYPES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis types: {', '.join(unknown)}")
+    return items
+
+@app.post("/api/v1/analyze/batch")
+async def analyze_batch_endpoint(
+    request: BatchAnalysisRequest,
+    token: str = Depends(enforce_rate_limit)
+):
+    """
+    Bulk analysis of a country x industry x analysis type grid
+    
+    Returns newline-delimited JSON events:
+    - batch: item counts, duplicates dropped and items already cached (sent immediately)
+    - result: one analysis, same data as /api/v1/analyze, with its index among the unique items
+    - error: an item that failed; the rest of the batch continues
+    - summary: completed and failed counts
+    """
+    items = batch_items(request)
+    
+    logger.info(f"Processing batch analysis: {len(items)} items")
+    
+    async def event_stream():
+        async for event in batch_analyzer.run(items):
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def comparison_data(request: ComparisonRequest, comparisons: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Comparison response data from ranked rows"""
+    scored = [c for c in comparisons if c["risk_score"] is not None]
+    return {
+        "response_type": "comparison",
+        "industry": request.industry,
+        "countries_analyzed": len(request.countries),
+        "comparisons": comparisons,
+        "recommended_country": scored[0]["country"] if scored else None
+    }
+
 @app.post("/api/v1/compare", response_model=APIResponse)
 async def compare_endpoint(
     request: ComparisonRequest,
-    token: str = Depends(verify_token)
+    token: str = Depends(enforce_rate_limit)
 ):
     """
     Multi-country market comparison
@@ -565,29 +1034,12 @@ async def compare_endpoint(
     try:
         logger.info(f"Processing comparison: {request.countries} - {request.industry}")
         
-        comparisons = []
-        for country in request.countries:
-            result = orchestrator.comprehensive_market_entry_analysis(country, request.industry)
-            comparisons.append({
-                "country": country,
-                "decision": result["recommendation"]["decision"],
-                "priority": result["recommendation"]["priority"],
-                "risk_score": result["recommendation"]["risk_score"],
-                "risk_level": result["risk_assessment"]["risk_level"],
-                "market_size": result["market_research"].get("market_size"),
-                "growth_rate": result["market_research"].get("growth_rate")
-            })
-        
-        # Sort by risk score (lower is better)
-        comparisons.sort(key=lambda x: x["risk_score"])
-        
-        response_data = {
-            "response_type": "comparison",
-            "industry": request.industry,
-            "countries_analyzed": len(request.countries),
-            "comparisons": comparisons,
-            "recommended_country": comparisons[0]["country"] if comparisons else None
-        }
+        # All countries run concurrently; rows come back sorted by risk score (lower is better)
+        comparisons = await comparison_engine.compare(request.countries, request.industry)
+        throttled = [c["retry_after"] for c in comparisons if "retry_after" in c]
+        if throttled and len(throttled) == len(comparisons):
+            raise BedrockThrottledError("Every country in the comparison was throttled", max(throttled))
+        response_data = comparison_data(request, comparisons)
         
         return APIResponse(
             success=True,
@@ -596,6 +1048,9 @@ async def compare_endpoint(
             timestamp=datetime.now().isoformat()
         )
         
+    except BedrockThrottledError:
+        raise
+        
     except Exception as e:
         logger.error(f"Comparison endpoint error: {str(e)}")
         raise HTTPException(
@@ -603,6 +1058,161 @@ async def compare_endpoint(
             detail=f"Comparison failed: {str(e)}"
         )
 
+# Background jobs
+
+async def run_analyze_job(params: Dict[str, Any], progress) -> Dict[str, Any]:
+    request = CountryAnalysisRequest(**params)
+    progress(0, 1)
+    data = await batch_analyzer.analyze(request.country, request.industry, request.analysis_type)
+    progress(1, 1)
+    return data
+
+async def run_compare_job(params: Dict[str, Any], progress) -> Dict[str, Any]:
+    request = ComparisonRequest(**params)
+    rows = []
+    progress(0, len(request.countries))
+    async for row in comparison_engine.iter_rows(request.countries, request.industry):
+        rows.append(row)
+        progress(len(rows), len(request.countries))
+    return comparison_data(request, comparison_engine.rank(rows))
+
+async def run_batch_job(params: Dict[str, Any], progress) -> Dict[str, Any]:
+    results, errors, summary = [], [], {}
+    total = 0
+    async for event in batch_analyzer.run(batch_items(BatchAnalysisRequest(**params))):
+        if event["event"] in ("batch", "summary"):
+            summary.update((key, value) for key, value in event.items() if key != "event")
+            total = summary["unique"]
+        else:
+            (results if event["event"] == "result" else errors).append(event)
+            progress(len(results) + len(errors), total)
+    return {"response_type": "batch", "summary": summary, "results": results, "errors": errors}
+
+JOB_HANDLERS = {
+    "analyze": run_analyze_job,
+    "compare": run_compare_job,
+    "batch": run_batch_job
+}
+
+JOB_REQUEST_MODELS = {
+    "analyze": CountryAnalysisRequest,
+    "compare": ComparisonRequest,
+    "batch": BatchAnalysisRequest
+}
+
+def job_view(job: Dict[str, Any], include_result: bool = True) -> Dict[str, Any]:
+    """Job record as returned to clients"""
+    view = {key: value for key, value in job.items() if key != "params" and (include_result or key != "result")}
+    view["status_url"] = f"/api/v1/jobs/{job['job_id']}"
+    return view
+
+async def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    job = await job_runner.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/v1/jobs", response_model=APIResponse, status_code=202)
+async def submit_job_endpoint(
+    request: JobRequest,
+    token: str = Depends(enforce_rate_limit)
+):
+    """
+    Queue a long-running analysis and return its job id immediately
+    
+    Kinds (params is the body of the matching endpoint):
+    - analyze: /api/v1/analyze
+    - compare: /api/v1/compare
+    - batch: /api/v1/analyze/batch
+    
+    Poll GET /api/v1/jobs/{job_id}, or follow GET /api/v1/jobs/{job_id}/events.
+    """
+    model = JOB_REQUEST_MODELS.get(request.kind)
+    if model is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {request.kind}")
+    try:
+        params = model(**request.params)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid {request.kind} params: {str(e)}")
+    if request.kind == "batch":
+        batch_items(params)
+    
+    try:
+        job = await job_runner.submit_async(request.kind, request.params, request.priority)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    logger.info(f"Queued {request.kind} job {job['job_id']} (priority {request.priority})")
+    return APIResponse(
+        success=True,
+        message=f"{request.kind.title()} job queued",
+        data=job_view(job),
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.get("/api/v1/jobs/{job_id}", response_model=APIResponse)
+async def get_job_endpoint(job_id: str, token: str = Depends(verify_token)):
+    """Job status, progress and, once finished, its result"""
+    job = await get_job_or_404(job_id)
+    return APIResponse(
+        success=True,
+        message=f"Job {job['status']}",
+        data=job_view(job),
+        timestamp=datetime.now().isoformat()
+    )
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str, http_request: Request, token: str = Depends(verify_token)):
+    """
+    Follow a job until it finishes
+    
+    Returns newline-delimited JSON events (or Server-Sent Events when the
+    client sends "Accept: text/event-stream"):
+    - progress: status and progress, sent whenever either changes
+    - done: the finished job, including its result or error
+    """
+    await get_job_or_404(job_id)
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    async def event_stream():
+        last = None
+        while True:
+            job = await job_runner.get_job(job_id)
+            if job is None:
+                return
+            if job["status"] in FINISHED:
+                event = {"event": "done", **job_view(job)}
+            elif (job["status"], job["progress"]) != last:
+                last = (job["status"], job["progress"])
+                event = {"event": "progress", **job_view(job, include_result=False)}
+            else:
+                await asyncio.sleep(settings.JOB_EVENTS_INTERVAL)
+                continue
+            
+            payload = json.dumps(event)
+            yield f"event: {event['event']}\ndata: {payload}\n\n" if use_sse else payload + "\n"
+            if event["event"] == "done":
+                return
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/api/v1/jobs/{job_id}", response_model=APIResponse)
+async def cancel_job_endpoint(job_id: str, token: str = Depends(verify_token)):
+    """Cancel a queued or running job"""
+    job = await get_job_or_404(job_id)
+    if not await job_runner.cancel_job(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return APIResponse(
+        success=True,
+        message="Job cancelled",
+        data=job_view(await job_runner.get_job(job_id)),
+        timestamp=datetime.now().isoformat()
+    )
+
 @app.get("/api/v1/countries")
 async def list_countries(token: str = Depends(verify_token)):
     """List all supported countries"""
@@ -610,12 +1220,10 @@ async def list_countries(token: str = Depends(verify_token)):
         "total_countries": len(chatbot.countries),
         "countries": sorted(chatbot.countries),
         "regions": {
-            "africa": [c for c in chatbot.countries if c in ["Rwanda", "Kenya", "Ghana", "Nigeria", "Egypt", "Morocco", "South Africa"]],
-            "asia": [c for c in chatbot.countries if c in ["Bangladesh", "Nepal", "Myanmar", "Sri Lanka", "Mongolia", "Japan", "China", "India"]],
-            "europe": [c for c in chatbot.countries if c in ["Estonia", "Latvia", "Lithuania", "Germany", "France", "UK", "Italy"]],
-            "americas": [c for c in chatbot.countries if c in ["Ecuador", "Uruguay", "Costa Rica", "Panama", "USA", "Canada", "Brazil"]],
-            "pacific": [c for c in chatbot.countries if c in ["Fiji", "Samoa", "Tonga", "Vanuatu", "Australia", "New Zealand"]]
-        }
+            region: [country.name for country in chatbot.entities.region(region)]
+            for region in REGIONS
+        },
+        "iso_codes": {country.name: country.iso2 for country in chatbot.entities.countries}
     }
 
 @app.get("/api/v1/industries")
@@ -632,13 +1240,14 @@ async def get_session_history(
     token: str = Depends(verify_token)
 ):
     """Get conversation history for a session"""
-    if session_id not in chatbot.conversation_history:
+    history = await chatbot.sessions.get_history_async(session_id)
+    if history is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
     return {
         "session_id": session_id,
-        "conversation_count": len(chatbot.conversation_history[session_id]),
-        "history": chatbot.conversation_history[session_id]
+        "conversation_count": len(history),
+        "history": history
     }
 
 # Error handlers
@@ -650,7 +1259,21 @@ async def http_exception_handler(request, exc):
             error=exc.detail,
             error_code=f"HTTP_{exc.status_code}",
             timestamp=datetime.now().isoformat()
-        ).dict()
+        ).dict(),
+        headers=exc.headers
+    )
+
+@app.exception_handler(BedrockThrottledError)
+async def throttled_exception_handler(request, exc):
+    logger.warning(f"Bedrock throttled request to {request.url.path}: {str(exc)}")
+    return JSONResponse(
+        status_code=429,
+        content=ErrorResponse(
+            error="The analysis service is busy; retry after the given delay",
+            error_code="BEDROCK_THROTTLED",
+            timestamp=datetime.now().isoformat()
+        ).dict(),
+        headers={"Retry-After": retry_after_header(exc.retry_after)}
     )
 
 @app.exception_handler(Exception)
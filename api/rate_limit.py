@@ -0,0 +1,184 @@
+"""
+Rate limiting for the Global Market Research API
+Token bucket per API token, kept in process or shared through Redis
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Optional: only needed for the shared limiter
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_KEYS = 10000
+DEFAULT_KEY_PREFIX = "mra:ratelimit:"
+REMOTE_RETRY_INTERVAL = 30.0
+
+# Refill and take in one atomic step; tokens come back as a string because
+# Redis truncates Lua numbers to integers
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+# (allowed, seconds until the request would be allowed; 0 when allowed)
+Decision = Tuple[bool, float]
+
+
+def bucket_key(token: str) -> str:
+    """Bucket name for an API token; raw tokens are never stored"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+
+class RateLimiter:
+    """Interface for rate limiters
+
+    Each key has a bucket of ``burst`` tokens that refills at ``rate``
+    tokens per second; a request takes one token or is refused.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+    def acquire(self, key: str, cost: float = 1.0) -> Decision:
+        """Take ``cost`` tokens from ``key``'s bucket if it has them"""
+        raise NotImplementedError
+
+    def _wait(self, tokens: float, cost: float) -> float:
+        return max(0.0, (cost - tokens) / self.rate)
+
+    def stats(self):
+        return {"rate_per_second": self.rate, "burst": self.burst}
+
+
+class TokenBucketLimiter(RateLimiter):
+    """Token buckets in this process; each worker enforces its own limit
+
+    Buckets are created on first use and the least recently used are
+    dropped beyond ``max_keys``. A dropped bucket comes back full, so only
+    tokens idle long enough to be evicted get a fresh burst.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = DEFAULT_MAX_KEYS):
+        super().__init__(rate, burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cost: float = 1.0) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else self._wait(tokens, cost)
+
+    def stats(self):
+        with self._lock:
+            keys = len(self._buckets)
+        return {"backend": "memory", "keys": keys, **super().stats()}
+
+
+class RedisTokenBucketLimiter(RateLimiter):
+    """Token buckets in Redis, so the limit holds across workers and containers
+
+    While Redis is unreachable, requests are limited by a local bucket per
+    worker instead of being refused; Redis is retried every
+    ``REMOTE_RETRY_INTERVAL`` seconds.
+    """
+
+    def __init__(self, url: str, rate: float, burst: int, socket_timeout: float = 0.25,
+                 key_prefix: str = DEFAULT_KEY_PREFIX, client=None):
+        """
+        Args:
+            url: Redis URL, e.g. redis://redis:6379/0
+            rate: Tokens added per second
+            burst: Bucket size
+            socket_timeout: Seconds before a slow Redis call is treated as a failure
+            key_prefix: Namespace for this service's buckets
+            client: Pre-built client (e.g. an in-memory fake for tests)
+        """
+        super().__init__(rate, burst)
+        if client is None:
+            if redis is None:
+                raise ImportError("The redis package is required for RedisTokenBucketLimiter")
+            client = redis.Redis.from_url(url, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
+
+        self.client = client
+        self.key_prefix = key_prefix
+        self.fallback = TokenBucketLimiter(rate, burst)
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._retry_at = 0.0
+
+    def acquire(self, key: str, cost: float = 1.0) -> Decision:
+        if time.monotonic() >= self._retry_at:
+            try:
+                allowed, tokens = self._script(keys=[self.key_prefix + key], args=[self.rate, self.burst, time.time(), cost])
+            except Exception as e:
+                logger.warning(f"⚠️ Redis rate limiter unavailable, limiting per worker: {str(e)}")
+                self._retry_at = time.monotonic() + REMOTE_RETRY_INTERVAL
+            else:
+                allowed = bool(int(allowed))
+                return allowed, 0.0 if allowed else self._wait(float(tokens), cost)
+        return self.fallback.acquire(key, cost)
+
+    def stats(self):
+        return {"backend": "redis", "remote_available": time.monotonic() >= self._retry_at, **super().stats()}
+
+
+def retry_after_header(wait: float) -> str:
+    """Retry-After value (whole seconds, at least 1) for a refused request"""
+    return str(max(1, math.ceil(wait)))
+
+
+def create_rate_limiter(requests: int, window: float, burst: Optional[int] = None,
+                        redis_url: Optional[str] = None) -> RateLimiter:
+    """
+    Build the configured rate limiter
+
+    Args:
+        requests: Requests allowed per token per ``window``
+        window: Window length in seconds
+        burst: Requests a token may make at once (defaults to ``requests``)
+        redis_url: Shares the buckets through Redis when set
+
+    Returns:
+        A RedisTokenBucketLimiter when Redis is configured and the redis
+        package is installed, otherwise a per-process TokenBucketLimiter
+    """
+    rate = requests / window
+    burst = burst or requests
+    if redis_url:
+        if redis is not None:
+            logger.info("✅ Shared Redis rate limiter enabled")
+            return RedisTokenBucketLimiter(redis_url, rate, burst)
+        logger.warning("⚠️ REDIS_URL is set but the redis package is not installed; rate limiting per worker")
+    return TokenBucketLimiter(rate, burst)
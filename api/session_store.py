@@ -0,0 +1,310 @@
+"""
+Session storage for the Global Market Research API
+Bounded conversation history with idle expiry and pluggable backends
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_CHARS = 1000  # Matches the QueryRequest limit
+
+# (unix timestamp, query, intent, countries, industries)
+Turn = Tuple[float, str, str, Tuple[str, ...], Tuple[str, ...]]
+
+
+def compact_turn(query: str, parsed: Dict[str, Any]) -> Turn:
+    """Reduce a chat turn to the fields the history endpoint returns"""
+    return (
+        time.time(),
+        query[:MAX_QUERY_CHARS],
+        parsed.get("intent", "general"),
+        tuple(parsed.get("countries", ())),
+        tuple(parsed.get("industries", ()))
+    )
+
+
+def expand_turn(turn: Turn) -> Dict[str, Any]:
+    """Render a stored turn in the session history response format"""
+    timestamp, query, intent, countries, industries = turn
+    return {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+        "user_query": query,
+        "parsed": {
+            "intent": intent,
+            "countries": list(countries),
+            "industries": list(industries)
+        }
+    }
+
+
+class SessionStore:
+    """Interface for conversation history storage"""
+
+    # True when calls wait on disk or the network, so coroutines must not make them directly
+    blocking = False
+
+    def add_turn(self, session_id: str, query: str, parsed: Dict[str, Any]):
+        """Append a turn to the session, creating the session if needed"""
+        raise NotImplementedError
+
+    def get_history(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the session's turns oldest first, or None if it does not exist"""
+        raise NotImplementedError
+
+    async def add_turn_async(self, session_id: str, query: str, parsed: Dict[str, Any]):
+        """``add_turn`` for coroutines; a blocking store is written on a worker thread"""
+        if self.blocking:
+            await asyncio.to_thread(self.add_turn, session_id, query, parsed)
+        else:
+            self.add_turn(session_id, query, parsed)
+
+    async def get_history_async(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        """``get_history`` for coroutines; a blocking store is read on a worker thread"""
+        if self.blocking:
+            return await asyncio.to_thread(self.get_history, session_id)
+        return self.get_history(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size information for monitoring"""
+        return {}
+
+
+class _Session:
+    __slots__ = ("turns", "last_access", "size")
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+        self.size = 0
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process session store with turn caps, idle expiry and a memory budget
+
+    Sessions are kept in least-recently-used order. Idle sessions are dropped
+    after ``idle_ttl`` seconds, and when the estimated size of all sessions
+    exceeds ``memory_budget`` bytes the least recently used ones are evicted.
+    """
+
+    def __init__(self, max_turns: int = 50, idle_ttl: int = 3600, memory_budget: int = 64 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _turn_size(turn: Turn) -> int:
+        _, query, intent, countries, industries = turn
+        return (
+            sys.getsizeof(turn) + sys.getsizeof(query) + sys.getsizeof(intent)
+            + sum(sys.getsizeof(value) for value in countries + industries)
+        )
+
+    def add_turn(self, session_id: str, query: str, parsed: Dict[str, Any]):
+        turn = compact_turn(query, parsed)
+        turn_size = self._turn_size(turn)
+
+        with self._lock:
+            self._expire_idle()
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            self._sessions.move_to_end(session_id)
+            session.last_access = time.monotonic()
+
+            if len(session.turns) == self.max_turns:
+                dropped = self._turn_size(session.turns[0])
+                session.size -= dropped
+                self._total_size -= dropped
+            session.turns.append(turn)
+            session.size += turn_size
+            self._total_size += turn_size
+
+            # Evict least recently used sessions, but never the one just written
+            while self._total_size > self.memory_budget and len(self._sessions) > 1:
+                _, evicted = self._sessions.popitem(last=False)
+                self._total_size -= evicted.size
+
+    def get_history(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            session.last_access = time.monotonic()
+            turns = list(session.turns)
+        return [expand_turn(turn) for turn in turns]
+
+    def _expire_idle(self):
+        # Oldest access is always first, so stop at the first live session
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access > cutoff:
+                break
+            del self._sessions[session_id]
+            self._total_size -= session.size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "estimated_bytes": self._total_size,
+                "memory_budget": self.memory_budget
+            }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in SQLite, shared by every worker on the same host
+
+    Turn caps are enforced on write; idle sessions are purged at most once
+    per ``purge_interval`` seconds.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_turns: int = 50, idle_ttl: int = 3600, purge_interval: float = 60.0):
+        self.path = path
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so that each forked worker gets its own connection
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                "session_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_turns ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "ts REAL NOT NULL, query TEXT NOT NULL, intent TEXT NOT NULL, "
+                "countries TEXT NOT NULL, industries TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_turns_session ON chat_turns (session_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_access ON chat_sessions (last_access)")
+            self._conn = conn
+        return self._conn
+
+    def add_turn(self, session_id: str, query: str, parsed: Dict[str, Any]):
+        timestamp, query, intent, countries, industries = compact_turn(query, parsed)
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO chat_sessions (session_id, last_access) VALUES (?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                    (session_id, timestamp)
+                )
+                conn.execute(
+                    "INSERT INTO chat_turns (session_id, ts, query, intent, countries, industries) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, timestamp, query, intent, json.dumps(countries), json.dumps(industries))
+                )
+                conn.execute(
+                    "DELETE FROM chat_turns WHERE session_id = ? AND id NOT IN ("
+                    "SELECT id FROM chat_turns WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                    (session_id, session_id, self.max_turns)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            self._maybe_purge(conn)
+
+    def get_history(self, session_id: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT last_access FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[0] <= time.time() - self.idle_ttl:
+                return None
+
+            conn.execute("UPDATE chat_sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id))
+            rows = conn.execute(
+                "SELECT ts, query, intent, countries, industries FROM chat_turns "
+                "WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            ).fetchall()
+
+        return [
+            expand_turn((ts, query, intent, tuple(json.loads(countries)), tuple(json.loads(industries))))
+            for ts, query, intent, countries, industries in rows
+        ]
+
+    def _maybe_purge(self, conn: sqlite3.Connection):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+
+        cutoff = time.time() - self.idle_ttl
+        conn.execute(
+            "DELETE FROM chat_turns WHERE session_id IN "
+            "(SELECT session_id FROM chat_sessions WHERE last_access <= ?)",
+            (cutoff,)
+        )
+        conn.execute("DELETE FROM chat_sessions WHERE last_access <= ?", (cutoff,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = self._connection().execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions, "path": self.path}
+
+
+def sqlite_path_from_url(database_url: str) -> str:
+    """Turn a sqlite:/// URL (as in Settings.DATABASE_URL) into a filesystem path"""
+    prefix = "sqlite:///"
+    if not database_url.startswith(prefix):
+        raise ValueError(f"Only sqlite:/// database URLs are supported for sessions, got {database_url!r}")
+    return database_url[len(prefix):] or ":memory:"
+
+
+def create_session_store(backend: str = "memory", database_url: Optional[str] = None, max_turns: int = 50,
+                         idle_ttl: int = 3600, memory_budget: int = 64 * 1024 * 1024) -> SessionStore:
+    """
+    Build the configured session store
+
+    Args:
+        backend: "memory" (per process) or "sqlite" (shared by workers on one host)
+        database_url: sqlite:/// URL used by the sqlite backend
+        max_turns: Turns kept per session; older turns are dropped
+        idle_ttl: Seconds of inactivity after which a session expires
+        memory_budget: Byte budget across all sessions (memory backend only)
+    """
+    if backend == "sqlite":
+        path = sqlite_path_from_url(database_url or "sqlite:///./market_research.db")
+        logger.info(f"✅ Using SQLite session store at {path}")
+        return SQLiteSessionStore(path, max_turns=max_turns, idle_ttl=idle_ttl)
+    if backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend}")
+    return InMemorySessionStore(max_turns=max_turns, idle_ttl=idle_ttl, memory_budget=memory_budget)
@@ -61,6 +61,87 @@ def check_aws_credentials():
         logging.warning(f"⚠️ AWS credentials not configured, using mock mode: {str(e)}")
         return False
 
+def check_shared_state():
+    """Warn about per-process state when running several workers"""
+    if settings.SERVER_MODE != "production" or settings.WEB_CONCURRENCY <= 1:
+        return
+    
+    if settings.SESSION_BACKEND == "memory":
+        logging.warning(
+            "⚠️ SESSION_BACKEND=memory with multiple workers: session history is only visible "
+            "to the worker that served the chat. Set SESSION_BACKEND=sqlite to share it."
+        )
+    if settings.JOB_BACKEND == "memory":
+        logging.warning(
+            "⚠️ JOB_BACKEND=memory with multiple workers: a job can only be polled or cancelled on the "
+            "worker that accepted it and is lost if that worker restarts. Set JOB_BACKEND=sqlite to share jobs."
+        )
+    if not settings.REDIS_URL:
+        logging.warning(
+            "⚠️ REDIS_URL is not set: each worker keeps its own result cache and repeats model calls"
+        )
+
+def gunicorn_options():
+    """Gunicorn settings for production mode, taken from config.Settings"""
+    return {
+        "bind": f"{settings.HOST}:{settings.PORT}",
+        "workers": settings.WEB_CONCURRENCY,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": settings.GUNICORN_PRELOAD,
+        "timeout": settings.GUNICORN_TIMEOUT,
+        "graceful_timeout": settings.GUNICORN_GRACEFUL_TIMEOUT,
+        "keepalive": settings.GUNICORN_KEEPALIVE,
+        "max_requests": settings.GUNICORN_MAX_REQUESTS,
+        "max_requests_jitter": settings.GUNICORN_MAX_REQUESTS_JITTER,
+        "loglevel": settings.LOG_LEVEL.lower(),
+        "accesslog": "-",
+        "errorlog": "-",
+        "child_exit": on_child_exit
+    }
+
+def prepare_metrics_dir():
+    """Empty PROMETHEUS_MULTIPROC_DIR so /metrics does not report workers from a previous run"""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        if settings.WEB_CONCURRENCY > 1:
+            logging.warning("⚠️ PROMETHEUS_MULTIPROC_DIR is not set: /metrics only reports the worker that serves the scrape")
+        return
+    
+    metrics_dir = Path(path)
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    for stale in metrics_dir.glob("*.db"):
+        stale.unlink()
+
+def on_child_exit(server, worker):
+    """Gunicorn hook: drop metrics of a worker that exited"""
+    from agents.metrics import mark_worker_exit
+    mark_worker_exit(worker.pid)
+
+def run_production():
+    """Run the API under gunicorn with one uvicorn worker per process"""
+    from gunicorn.app.base import BaseApplication
+    
+    class MarketResearchApplication(BaseApplication):
+        """Embedded gunicorn application so settings come from config.py"""
+        
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            # Called in the master when preload_app is on, so workers inherit the
+            # imported modules; otherwise each worker imports the app after the fork.
+            # Agents, Bedrock clients and thread pools are created in each worker's
+            # lifespan either way
+            from main import app
+            return app
+    
+    MarketResearchApplication(gunicorn_options()).run()
+
 def print_startup_info():
     """Print startup information"""
     print("\n" + "="*60)
@@ -73,6 +154,7 @@ def print_startup_info():
     print(f"🌍 Countries Supported: 195+")
     print(f"🏭 Industries Supported: 25+")
     print(f"🔧 Debug Mode: {settings.DEBUG}")
+    print(f"⚙️ Server Mode: {settings.SERVER_MODE}" + (f" ({settings.WEB_CONCURRENCY} workers)" if settings.SERVER_MODE == "production" else ""))
     print(f"📊 Log Level: {settings.LOG_LEVEL}")
     print("="*60)
     
@@ -91,6 +173,11 @@ def main():
     
     logger.info("Starting Global Market Research API...")
     
+    # agents.metrics opens its multiprocess files when main is imported, so the
+    # directory has to exist (and be emptied) before anything imports the app
+    if settings.SERVER_MODE == "production":
+        prepare_metrics_dir()
+    
     # Check dependencies
     if not check_dependencies():
         sys.exit(1)
@@ -102,17 +189,25 @@ def main():
     
     # Print startup information
     print_startup_info()
+    check_shared_state()
     
-    # Import the FastAPI app
+    # Import the FastAPI app. Gunicorn loads it itself: once in the master when
+    # GUNICORN_PRELOAD is on, otherwise in each worker, so the master must not
+    # import it here or preload_app=False would still share its state
     try:
-        from main import app
-        logger.info("✅ FastAPI application loaded successfully")
+        if settings.SERVER_MODE != "production":
+            from main import app
+            logger.info("✅ FastAPI application loaded successfully")
     except Exception as e:
         logger.error(f"❌ Failed to load FastAPI application: {e}")
         sys.exit(1)
     
     # Start the server
     try:
+        if settings.SERVER_MODE == "production":
+            run_production()
+            return
+        
         uvicorn.run(
             "main:app",
             host=settings.HOST,
@@ -0,0 +1,1449 @@
+"""
+Unit tests for the agent support modules (no server or AWS access needed)
+"""
+
+import asyncio
+import io
+import json
+import re
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from agents.batch_analyzer import BatchAnalyzer, dedupe_items
+from agents.bedrock_executor import BedrockExecutor
+from agents.bedrock_limiter import AdaptiveConcurrencyLimiter, BedrockThrottledError, is_throttling_error
+from agents.cache import LRUCache, RedisCache, TieredCache, decode_value, encode_value, make_cache_key
+from agents.comparison_engine import ComparisonEngine
+from agents.entities import NON_COUNTRY_TERMS, REGIONS, EntityRegistry, get_registry
+from agents.ingestion import EmbeddingCache, IngestionPipeline, SourceDocument, TextSplitter, load_documents
+from agents.prompts import OUTPUT_BUDGETS, PromptTemplate, TokenUsage
+from agents.retrieval import Retriever, VectorIndex, fetch_index, write_index
+from agents.semantic_cache import query_vector
+from agents.singleflight import AsyncSingleFlight, SingleFlight
+from agents.structured_output import Field, OutputSchema, heading_pattern
+from agents.vector_store import DocumentChunks, IndexConflictError, IndexWriter, LocalObjectStore, SegmentedIndex
+
+
+class TestResultCache:
+    """Tests for the in-process result cache"""
+
+    def test_cache_key_includes_model_and_prompt_version(self):
+        """Test that model or prompt changes produce a different key"""
+        key = make_cache_key("risk_assessment", "Germany", "fintech", "model-a", "1")
+
+        assert key == make_cache_key("risk_assessment", " germany ", "FINTECH", "model-a", "1")
+        assert key != make_cache_key("risk_assessment", "Germany", "fintech", "model-b", "1")
+        assert key != make_cache_key("risk_assessment", "Germany", "fintech", "model-a", "2")
+        assert key != make_cache_key("market_research", "Germany", "fintech", "model-a", "1")
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are treated as misses"""
+        cache = LRUCache(max_entries=10, ttl=60)
+        cache.set("short", "value", ttl=0.01)
+        cache.set("long", "value")
+        time.sleep(0.02)
+
+        assert cache.get("short") is None
+        assert cache.get("long") == "value"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client used by RedisCache"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match=None):
+        prefix = match.rstrip("*")
+        return [key for key in self.data if key.startswith(prefix)]
+
+
+class BrokenRedis(FakeRedis):
+    """Redis stand-in whose server is unreachable"""
+
+    def get(self, key):
+        raise ConnectionError("redis down")
+
+    def set(self, key, value, ex=None):
+        raise ConnectionError("redis down")
+
+
+class TestSharedCache:
+    """Tests for the Redis-backed cache tier"""
+
+    def test_value_round_trip(self):
+        """Test that small and large values survive serialization"""
+        small = {"risk_level": "Low", "score": 2.5}
+        large = {"analysis": "market " * 500, "players": ["A", "B"]}
+
+        assert decode_value(encode_value(small)) == small
+        assert decode_value(encode_value(large)) == large
+        assert len(encode_value(large)) < len(json.dumps(large))
+
+    def test_remote_hit_is_promoted_to_local(self):
+        """Test that a value written by another worker is served and cached locally"""
+        shared = FakeRedis()
+        writer = TieredCache(LRUCache(), RedisCache("redis://unused", client=shared))
+        reader = TieredCache(LRUCache(), RedisCache("redis://unused", client=shared))
+
+        writer.set("key", {"value": 1})
+
+        assert reader.get("key") == {"value": 1}
+        assert reader.local.get("key") == {"value": 1}
+
+    def test_get_many_reads_local_then_remote(self):
+        """Test that a bulk read combines both tiers and promotes remote hits"""
+        shared = FakeRedis()
+        writer = TieredCache(LRUCache(), RedisCache("redis://unused", client=shared))
+        reader = TieredCache(LRUCache(), RedisCache("redis://unused", client=shared))
+        writer.set("remote", 1)
+        reader.local.set("local", 2)
+
+        assert reader.get_many(["local", "remote", "missing"]) == {"local": 2, "remote": 1}
+        assert reader.local.get("remote") == 1
+
+    def test_falls_back_to_local_when_redis_is_down(self):
+        """Test that Redis failures degrade to the local tier instead of raising"""
+        cache = TieredCache(LRUCache(), RedisCache("redis://unused", client=BrokenRedis()))
+
+        cache.set("key", "value")
+
+        assert cache.get("key") == "value"
+        assert cache.get("missing") is None
+        assert cache.remote_available is False
+
+    def test_async_reads_reach_redis_off_the_event_loop(self):
+        """Test that coroutines read Redis on a worker thread but local hits inline"""
+        readers = []
+
+        class ThreadRecordingRedis(FakeRedis):
+            def get(self, key):
+                readers.append(threading.current_thread())
+                return super().get(key)
+
+        shared = ThreadRecordingRedis()
+        TieredCache(LRUCache(), RedisCache("redis://unused", client=shared)).set("remote", 1)
+        cache = TieredCache(LRUCache(), RedisCache("redis://unused", client=shared))
+        cache.local.set("local", 2)
+
+        async def read():
+            return await cache.get_async("remote"), await cache.get_async("local"), await cache.get_async("remote")
+
+        assert asyncio.run(read()) == (1, 2, 1)
+        assert len(readers) == 1 and readers[0] is not threading.main_thread()
+        assert cache.blocking and not LRUCache().blocking
+
+
+class TestSingleFlight:
+    """Tests for in-flight request coalescing"""
+
+    def test_threads_share_one_call(self):
+        """Test that concurrent identical calls run the function once"""
+        flight = SingleFlight()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            time.sleep(0.1)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: flight.do("key", slow_call), range(8)))
+
+        assert results == ["result"] * 8
+        assert len(calls) == 1
+        assert flight.in_flight() == 0
+
+    def test_async_waiters_share_one_call(self):
+        """Test that concurrent awaiters share one call and its errors"""
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def slow_call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            raise ValueError("model failed")
+
+        async def run():
+            return await asyncio.gather(
+                *[flight.do("key", slow_call) for _ in range(5)],
+                return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.in_flight() == 0
+
+
+class TestBedrockExecutor:
+    """Tests for running blocking model calls off the event loop"""
+
+    def test_slow_call_times_out_without_blocking_the_loop(self):
+        """Test that a call past its timeout raises while other coroutines keep running"""
+        executor = BedrockExecutor(max_workers=2, timeout=0.05)
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            return await asyncio.gather(executor.run(time.sleep, 0.3), tick(), return_exceptions=True)
+
+        try:
+            outcome, _ = asyncio.run(main())
+        finally:
+            executor.shutdown()
+
+        assert isinstance(outcome, asyncio.TimeoutError)
+        assert len(ticks) == 5
+
+    def test_queued_call_is_cancelled_on_timeout(self):
+        """Test that a call still waiting for a pool thread never runs once its caller gives up"""
+        executor = BedrockExecutor(max_workers=1)
+        release, started = threading.Event(), []
+        blocker = executor.submit(release.wait)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(executor.run(started.append, "queued", timeout=0.05))
+        finally:
+            release.set()
+            blocker.result()
+            executor.shutdown(wait=True)
+
+        assert started == []
+
+    def test_slow_stream_times_out_and_is_closed_afterwards(self):
+        """Test that a stalled stream raises TimeoutError and is closed once the pending read returns"""
+        executor = BedrockExecutor(timeout=0.05)
+        closed = threading.Event()
+
+        def slow_stream():
+            try:
+                yield "first"
+                time.sleep(0.2)
+                yield "second"
+            finally:
+                closed.set()
+
+        async def consume():
+            items = []
+            with pytest.raises(asyncio.TimeoutError):
+                async for item in executor.iterate(slow_stream()):
+                    items.append(item)
+            return items
+
+        try:
+            assert asyncio.run(consume()) == ["first"]
+            assert not closed.is_set()
+            assert closed.wait(1.0)
+        finally:
+            executor.shutdown(wait=True)
+
+
+class StubStreamingClient:
+    """Local stand-in for bedrock-runtime that emits response-stream chunks"""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        events = [
+            {"chunk": {"bytes": json.dumps({"type": "content_block_delta", "delta": {"type": "text_delta", "text": text}}).encode()}}
+            for text in self.deltas
+        ]
+        events.append({"chunk": {"bytes": json.dumps({"type": "message_stop"}).encode()}})
+        return {"body": iter(events)}
+
+
+class TestStreaming:
+    """Tests for streamed agent analyses"""
+
+    def test_deltas_first_structured_result_last(self):
+        """Test that text deltas arrive before the structured risk result"""
+        pytest.importorskip("boto3")
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        agent = RiskAssessmentAgent(cache=LRUCache(), bedrock_client=StubStreamingClient(["Political ", "risk ", "is low."]))
+
+        async def collect():
+            return [event async for event in agent.stream_risk_assessment_async("Germany", "fintech")]
+
+        events = asyncio.run(collect())
+
+        assert [event["event"] for event in events] == ["delta", "delta", "delta", "result"]
+        assert "".join(event["text"] for event in events[:-1]) == "Political risk is low."
+        assert "risk_scores" in events[-1]["data"]
+        assert agent.cache.get(agent.cache_key("Germany", "fintech")) == events[-1]["data"]
+
+    def test_failure_midway_still_ends_with_a_result(self, chatbot, monkeypatch):
+        """Test that a stream breaking after some text sends an error, then the mock answer as the last event"""
+        pytest.importorskip("boto3")
+        import main
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        class BreakingStreamClient(StubStreamingClient):
+            def invoke_model_with_response_stream(self, modelId, body):
+                events = super().invoke_model_with_response_stream(modelId, body)["body"]
+
+                def breaking():
+                    yield next(events)
+                    yield next(events)
+                    raise RuntimeError("connection reset")
+                return {"body": breaking()}
+
+        agent = RiskAssessmentAgent(cache=LRUCache(), bedrock_client=BreakingStreamClient(["Political ", "risk ", "is low."]))
+        monkeypatch.setattr(main, "risk_agent", agent)
+
+        async def collect():
+            return [event async for event in chatbot.stream_query("What are the risks of fintech in Kenya?")]
+
+        events = asyncio.run(collect())
+
+        assert [event["event"] for event in events] == ["parsed", "delta", "delta", "error", "result"]
+        assert events[3]["error"] == "connection reset"
+        assert events[-1]["data"]["response_type"] == "risk_assessment" and events[-1]["data"]["source"] == "mock"
+        assert agent.cache.stats()["entries"] == 0
+
+
+class TestBedrockClients:
+    """Tests for the shared Bedrock client"""
+
+    def test_registry_reuses_one_pooled_client(self):
+        """Test that repeated lookups return the same configured client"""
+        pytest.importorskip("boto3")
+        from agents.bedrock_client import BedrockClientRegistry
+
+        registry = BedrockClientRegistry(max_pool_connections=24, max_attempts=3)
+        client = registry.get("us-east-1")
+
+        assert registry.get("us-east-1") is client
+        assert client.meta.config.max_pool_connections == 24
+        assert client.meta.config.retries["mode"] == "adaptive"
+
+    def test_orchestrator_reuses_given_agents(self):
+        """Test that the orchestrator does not build its own agents when given some"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+        from agents.multi_agent_orchestrator import MultiAgentOrchestrator
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        client = object()
+        market_agent = MarketResearchAgent(bedrock_client=client)
+        risk_agent = RiskAssessmentAgent(bedrock_client=client)
+        orchestrator = MultiAgentOrchestrator(market_agent=market_agent, risk_agent=risk_agent)
+
+        assert orchestrator.market_agent is market_agent
+        assert orchestrator.risk_agent is risk_agent
+        assert orchestrator.market_agent.bedrock_client is orchestrator.risk_agent.bedrock_client
+
+
+class ThrottlingException(Exception):
+    """Same class name as the exception boto3 raises for a throttled Bedrock call"""
+
+
+class ThrottlingClient:
+    """Local stand-in for bedrock-runtime that is always over quota"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, modelId, body):
+        self.calls += 1
+        raise ThrottlingException("Too many requests, please wait before trying again.")
+
+
+class TestBedrockLimiter:
+    """Tests for the adaptive limit on concurrent Bedrock calls"""
+
+    def test_throttle_halves_limit_and_success_grows_it(self):
+        """Test multiplicative decrease on throttling and additive increase on success"""
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=8, initial_limit=8, backoff=0.01)
+
+        with pytest.raises(BedrockThrottledError) as raised:
+            limiter.call(ThrottlingClient().invoke_model, "model", "{}")
+        assert limiter.limit == 4
+        assert raised.value.retry_after >= 1
+
+        time.sleep(0.02)
+        for _ in range(8):
+            limiter.call(lambda: None)
+        assert limiter.limit == 5
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_waiting_call_times_out(self):
+        """Test that a call over the limit waits, then fails with BedrockThrottledError"""
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=1, queue_timeout=0.02)
+        limiter.acquire()
+
+        with pytest.raises(BedrockThrottledError):
+            limiter.acquire()
+
+        limiter.release()
+        limiter.acquire()
+        limiter.release()
+
+    def test_waiting_calls_leave_executor_threads_to_a_stream(self):
+        """Test that calls waiting for the only slot hold no executor thread, so the stream that has it keeps reading"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+
+        class SlowStreamingClient(StubStreamingClient):
+            def __init__(self):
+                super().__init__(["Kenya ", "fintech ", "keeps ", "growing."])
+                self.answers = StubClient('```json\n{"market_size": 1000000000, "growth_rate": 8}\n```',
+                                          {"input_tokens": 120, "output_tokens": 40})
+
+            def invoke_model(self, modelId, body):
+                return self.answers.invoke_model(modelId, body)
+
+            def invoke_model_with_response_stream(self, modelId, body):
+                events = super().invoke_model_with_response_stream(modelId, body)["body"]
+
+                def slow():
+                    for event in events:
+                        time.sleep(0.05)
+                        yield event
+                return {"body": slow()}
+
+        executor = BedrockExecutor(max_workers=2)
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=1, queue_timeout=2.0)
+        agent = MarketResearchAgent(executor=executor, cache=LRUCache(), bedrock_client=SlowStreamingClient(), limiter=limiter)
+
+        async def scenario():
+            stream = agent.stream_market_analysis_async("Kenya", "fintech")
+            events = [await stream.__anext__()]  # The stream now holds the only slot
+            waiting = [asyncio.ensure_future(agent.analyze_market_async(country, "fintech"))
+                       for country in ("Germany", "Brazil", "India", "Japan")]
+            await asyncio.sleep(0.05)
+            start = time.monotonic()
+            events += [event async for event in stream]
+            return events, time.monotonic() - start, await asyncio.gather(*waiting)
+
+        try:
+            events, streamed, answers = asyncio.run(scenario())
+        finally:
+            executor.shutdown(wait=True)
+
+        assert events[-1]["event"] == "result"
+        assert streamed < 1.0
+        assert all(answer.get("source") != "mock" and answer["usage"]["output_tokens"] == 40 for answer in answers)
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_throttling_is_raised_instead_of_mock_data(self):
+        """Test that throttled agents raise and the orchestrator passes it on"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+        from agents.multi_agent_orchestrator import MultiAgentOrchestrator
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        client = ThrottlingClient()
+        limiter = AdaptiveConcurrencyLimiter(backoff=0.001)
+        market_agent = MarketResearchAgent(cache=LRUCache(), bedrock_client=client, limiter=limiter)
+        risk_agent = RiskAssessmentAgent(cache=LRUCache(), bedrock_client=client, limiter=limiter)
+        orchestrator = MultiAgentOrchestrator(market_agent=market_agent, risk_agent=risk_agent)
+
+        with pytest.raises(BedrockThrottledError):
+            market_agent.analyze_market("Kenya", "fintech")
+        with pytest.raises(BedrockThrottledError):
+            asyncio.run(orchestrator.comprehensive_market_entry_analysis_async("Kenya", "fintech"))
+        assert market_agent.cache.stats()["entries"] == 0
+        assert is_throttling_error(ThrottlingException())
+        assert not is_throttling_error(RuntimeError("boom"))
+
+
+class StubAgent:
+    """Market and risk agent stand-in that answers after a delay, or raises"""
+
+    def __init__(self, result=None, delay=0.0, error=None):
+        self.result = result or {}
+        self.delay = delay
+        self.error = error
+
+    async def _answer(self):
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return dict(self.result)
+
+    def analyze_market_async(self, country, industry, analysis_type=None):
+        return self._answer()
+
+    def comprehensive_risk_assessment_async(self, country, industry, analysis_type=None):
+        return self._answer()
+
+
+def stub_orchestrator(market_agent, risk_agent, agent_timeout=1.0):
+    pytest.importorskip("boto3")
+    from agents.multi_agent_orchestrator import MultiAgentOrchestrator
+
+    return MultiAgentOrchestrator(agent_timeout=agent_timeout, market_agent=market_agent, risk_agent=risk_agent)
+
+
+class TestOrchestrator:
+    """Tests for combining the market and risk agents"""
+
+    def test_agents_run_concurrently(self):
+        """Test that the analysis takes about as long as the slower agent, not the sum"""
+        orchestrator = stub_orchestrator(
+            StubAgent({"market_size": 5e9, "growth_rate": 12.0}, delay=0.1),
+            StubAgent({"overall_risk_score": 3.0}, delay=0.1)
+        )
+
+        start = time.perf_counter()
+        analysis = asyncio.run(orchestrator.comprehensive_market_entry_analysis_async("Kenya", "fintech"))
+
+        assert time.perf_counter() - start < 0.18
+        assert analysis["partial"] is False
+        assert analysis["recommendation"]["risk_score"] == 3.0
+
+    def test_failed_or_slow_agent_gives_partial_result(self):
+        """Test that one failing or timed-out agent leaves the other's section in place"""
+        failing = stub_orchestrator(StubAgent(error=RuntimeError("model down")), StubAgent({"overall_risk_score": 3.0}))
+        slow = stub_orchestrator(StubAgent({"market_size": 5e9}), StubAgent(delay=1.0), agent_timeout=0.05)
+
+        failed = asyncio.run(failing.comprehensive_market_entry_analysis_async("Kenya", "fintech"))
+        timed_out = asyncio.run(slow.comprehensive_market_entry_analysis_async("Kenya", "fintech"))
+
+        assert failed["partial"] is True
+        assert failed["market_research"] == {"status": "unavailable", "error": "model down"}
+        assert failed["risk_assessment"] == {"overall_risk_score": 3.0}
+        assert timed_out["errors"] == {"risk_assessment": "timed out after 0.05s"}
+        assert timed_out["market_research"] == {"market_size": 5e9}
+        assert timed_out["recommendation"]["decision"] == "INSUFFICIENT_DATA"
+
+    def test_all_throttled_raises_longest_retry_after(self):
+        """Test that when every agent is throttled the caller waits for the slower quota"""
+        orchestrator = stub_orchestrator(
+            StubAgent(error=BedrockThrottledError("market throttled", retry_after=2.0)),
+            StubAgent(error=BedrockThrottledError("risk throttled", retry_after=7.0))
+        )
+
+        with pytest.raises(BedrockThrottledError) as raised:
+            asyncio.run(orchestrator.comprehensive_market_entry_analysis_async("Kenya", "fintech"))
+
+        assert raised.value.retry_after == 7.0
+
+    def test_cancelled_while_waiting_for_a_slot_leaves_no_coroutine_behind(self):
+        """Test that agent coroutines are only created once they are awaited"""
+        created = []
+
+        class RecordingAgent(StubAgent):
+            def _answer(self):
+                created.append(True)
+                return super()._answer()
+
+        orchestrator = stub_orchestrator(RecordingAgent(), RecordingAgent())
+
+        async def cancel_while_queued():
+            limiter = asyncio.Semaphore(1)
+            async with limiter:
+                task = asyncio.ensure_future(orchestrator.comprehensive_market_entry_analysis_async("Kenya", "fintech", limiter))
+                await asyncio.sleep(0.01)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(cancel_while_queued())
+
+        assert created == []
+
+
+class CountingOrchestrator:
+    """Orchestrator stand-in that records how many analyses hold a limiter slot at once"""
+
+    def __init__(self, risk_scores):
+        self.risk_scores = risk_scores
+        self.in_flight = 0
+        self.peak = 0
+
+    async def comprehensive_market_entry_analysis_async(self, country, industry, limiter=None):
+        async with limiter:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+        if self.risk_scores[country] is None:
+            raise RuntimeError("no data")
+        return {
+            "recommendation": {"decision": "PROCEED_WITH_CAUTION", "priority": "Medium", "risk_score": self.risk_scores[country]},
+            "market_research": {"market_size": 1e9, "growth_rate": 5.0},
+            "risk_assessment": {"risk_level": "Medium"}
+        }
+
+
+class TestComparisonEngine:
+    """Tests for multi-country comparisons"""
+
+    def test_concurrency_is_capped(self):
+        """Test that no more analyses run at once than the engine allows"""
+        orchestrator = CountingOrchestrator({f"Country {i}": float(i) for i in range(8)})
+        engine = ComparisonEngine(orchestrator, max_concurrency=3)
+
+        rows = asyncio.run(engine.compare(list(orchestrator.risk_scores), "fintech"))
+
+        assert len(rows) == 8
+        assert orchestrator.peak == 3
+
+    def test_failed_countries_rank_last(self):
+        """Test that rows without a risk score follow the scored rows, lowest risk first"""
+        orchestrator = CountingOrchestrator({"Kenya": 6.0, "Atlantis": None, "Japan": 2.5, "Chile": 0.0})
+
+        rows = asyncio.run(ComparisonEngine(orchestrator).compare(["Kenya", "Atlantis", "Japan", "Chile"], "fintech"))
+
+        assert [row["country"] for row in rows] == ["Chile", "Japan", "Kenya", "Atlantis"]
+        assert rows[-1] == {"country": "Atlantis", "risk_score": None, "error": "no data"}
+
+
+SCHEMA = OutputSchema([
+    Field("market_size", "number", minimum=0, patterns=[
+        re.compile(r"market size[^$\d\n]{0,40}\$?(?P<value>\d[\d,.]*)\s*(?P<unit>billion|million)?", re.IGNORECASE)
+    ]),
+    Field("growth_rate", "number", minimum=-100, maximum=1000, patterns=[
+        re.compile(r"growth[^%\n]{0,40}?(?P<value>\d+(?:\.\d+)?)\s*%", re.IGNORECASE)
+    ]),
+    Field("risk_level", "string", choices=("Low", "Medium", "High")),
+    Field("opportunities", "list", heading=heading_pattern("opportunities")),
+])
+
+
+class TestStructuredOutput:
+    """Tests for extracting fields from model answers"""
+
+    def test_json_block_is_validated(self):
+        """Test that JSON fields are type-checked and invalid ones fall back to the text"""
+        text = (
+            "Annual growth is 14.5%.\n"
+            '```json\n{"market_size": "3.2 billion", "growth_rate": 5000, "risk_level": "medium", '
+            '"opportunities": ["Payments", "Lending"]}\n```'
+        )
+        fields, method = SCHEMA.parse(text)
+
+        assert method == "json"
+        assert fields == {"market_size": 3.2e9, "growth_rate": 14.5, "risk_level": "Medium", "opportunities": ["Payments", "Lending"]}
+        assert SCHEMA.strip_json(text) == "Annual growth is 14.5%."
+
+    def test_free_text_fallback(self):
+        """Test that answers without JSON are parsed with the regex extractors"""
+        text = (
+            "1. Market Size and Growth\n"
+            "The current market size is $850 million, with annual growth of 9.2%.\n\n"
+            "3. Market Opportunities\n"
+            "Several openings stand out:\n"
+            "- **Mobile money** integration\n"
+            "- SME lending\n"
+            "\n"
+            "4. Regulatory Environment\n"
+        )
+        fields, method = SCHEMA.parse(text)
+
+        assert method == "text"
+        assert fields == {"market_size": 8.5e8, "growth_rate": 9.2, "opportunities": ["Mobile money integration", "SME lending"]}
+        assert SCHEMA.parse("No figures here.") == ({}, "none")
+
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MARKET_SCHEMA
+
+        assert MARKET_SCHEMA.parse("The market size in 2024 was $45 billion")[0] == {"market_size": 4.5e10}
+        assert MARKET_SCHEMA.parse("Market size (2023): USD 12.3bn")[0] == {"market_size": 1.23e10}
+        assert MARKET_SCHEMA.parse("Market size: 2,500,000,000")[0] == {"market_size": 2.5e9}
+        assert MARKET_SCHEMA.parse("Market size (2023) is not published") == ({}, "none")
+
+    def test_agents_use_model_numbers(self):
+        """Test that parsed agent results carry the model's figures, not constants"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        market = MarketResearchAgent(bedrock_client=object())._parse_analysis_response(
+            'Text\n```json\n{"market_size": 1200000000, "growth_rate": 21.0, "key_players": ["M-Pesa"]}\n```',
+            "Kenya", "fintech"
+        )
+        risk = RiskAssessmentAgent(bedrock_client=object())._parse_risk_response(
+            "Political Risk: 6/10\nEconomic Risk: 7/10\nLegal Risk: 5/10", "Kenya", "fintech"
+        )
+
+        assert (market["market_size"], market["growth_rate"], market["key_players"]) == (1.2e9, 21.0, ["M-Pesa"])
+        assert risk["overall_risk_score"] == 6.0
+        assert risk["risk_level"] == "Medium"
+        assert risk["risk_scores"] == {"political_risk": 6.0, "economic_risk": 7.0, "legal_risk": 5.0}
+
+
+class StubClient:
+    """Local stand-in for bedrock-runtime invoke_model that records request bodies"""
+
+    def __init__(self, text, usage):
+        self.text = text
+        self.usage = usage
+        self.bodies = []
+
+    def invoke_model(self, modelId, body):
+        self.bodies.append(json.loads(body))
+        payload = {"content": [{"type": "text", "text": self.text}], "usage": self.usage, "stop_reason": "end_turn"}
+        return {"body": io.BytesIO(json.dumps(payload).encode())}
+
+
+class TestPrompts:
+    """Tests for prompt templates and token budgets"""
+
+    def test_template_key_tracks_text_and_budget(self):
+        """Test that editing a template changes its cache key and whitespace is trimmed"""
+        template = PromptTemplate("market_research", "chat_summary", "1", """
+            Summarize the {industry} market in {country}.
+            """, '{"market_size": number}')
+
+        assert template.render("Kenya", "fintech") == 'Summarize the fintech market in Kenya.\n\n{"market_size": number}'
+        assert template.max_tokens == OUTPUT_BUDGETS["chat_summary"]
+        assert template.key.startswith("chat_summary.v1.")
+        assert template.key != PromptTemplate("market_research", "chat_summary", "1", "Describe {country}.").key
+        assert template.key != PromptTemplate("market_research", "market", "1", template.text).key
+        with pytest.raises(ValueError):
+            PromptTemplate("market_research", "essay", "1", "text")
+
+    def test_usage_totals(self):
+        """Test that token usage is summed per agent and analysis type"""
+        usage = TokenUsage()
+        template = PromptTemplate("risk_assessment", "risk", "1", "Assess {country} {industry}.")
+        usage.record("risk_assessment", template, 100, 400)
+        call = usage.record("risk_assessment", template, 100, 2000, "max_tokens")
+
+        assert call["max_tokens"] == OUTPUT_BUDGETS["risk"]
+        assert usage.snapshot() == {
+            "risk_assessment.risk": {"calls": 2, "input_tokens": 200, "output_tokens": 2400, "truncated": 1}
+        }
+
+    def test_analysis_type_sets_budget_and_cache_key(self):
+        """Test that each analysis type sends its own max_tokens and is cached separately"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+
+        client = StubClient('```json\n{"market_size": 1000000000, "growth_rate": 8}\n```', {"input_tokens": 120, "output_tokens": 40})
+        agent = MarketResearchAgent(cache=LRUCache(), bedrock_client=client)
+
+        summary = agent.analyze_market("Kenya", "fintech", "chat_summary")
+        agent.analyze_market("Kenya", "fintech", "chat_summary")
+        agent.analyze_market("Kenya", "fintech")
+
+        assert [body["max_tokens"] for body in client.bodies] == [OUTPUT_BUDGETS["chat_summary"], OUTPUT_BUDGETS["market"]]
+        assert summary["usage"]["input_tokens"] == 120
+        assert summary["usage"]["output_tokens"] == 40
+        assert agent.cache_key("Kenya", "fintech", "chat_summary") != agent.cache_key("Kenya", "fintech")
+
+
+RESEARCH_CORPUS = [
+    ("Germany fintech regulation: BaFin licensing is required for payment and lending services.", "bafin.pdf"),
+    ("The German fintech market grew strongly, led by neobanks and payment providers.", "de_market.pdf"),
+    ("Kenya mobile money: M-Pesa dominates payments and drives fintech adoption.", "kenya.pdf"),
+    ("Japan healthcare spending is rising with an ageing population.", "japan_health.pdf"),
+    ("Mongolia mining exports depend on copper and coal demand from China.", "mongolia.pdf"),
+]
+
+
+class HashingEmbedder:
+    """Local stand-in for the Bedrock embedding model"""
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return np.stack([query_vector(text, self.dimensions) for text in texts])
+
+
+def build_research_index(directory, embedder):
+    texts = [text for text, _ in RESEARCH_CORPUS]
+    return write_index(str(directory), texts, [{"source": source} for _, source in RESEARCH_CORPUS], embedder.embed(texts))
+
+
+class TestRetrieval:
+    """Tests for the memory-mapped research document index"""
+
+    def test_search_is_memory_mapped_and_ranked(self, tmp_path):
+        """Test that the index is served from mapped files and returns the most relevant chunks first"""
+        embedder = HashingEmbedder()
+        build_research_index(tmp_path / "index", embedder)
+        index = VectorIndex(str(tmp_path / "index"))
+        retriever = Retriever(index, embedder, k=2, min_score=0.0)
+
+        passages = retriever.retrieve("fintech regulation in Germany")
+        retriever.retrieve("fintech regulation in Germany")
+
+        assert isinstance(index._vectors, np.memmap)
+        assert [p.metadata["source"] for p in passages][0] == "bafin.pdf"
+        assert passages[0].score >= passages[1].score
+        assert embedder.calls == 2  # One to build the index, one for the repeated query
+        assert index.stats()["chunks"] == len(RESEARCH_CORPUS)
+
+    def test_agent_prompt_carries_context_and_index_version(self, tmp_path):
+        """Test that agents quote retrieved passages, cite their sources and key the cache by index"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+
+        embedder = HashingEmbedder()
+        build_research_index(tmp_path / "index", embedder)
+        retriever = Retriever(VectorIndex(str(tmp_path / "index")), embedder, k=2, min_score=0.1)
+        client = StubClient('```json\n{"market_size": 1000000000, "growth_rate": 8}\n```', {"input_tokens": 300, "output_tokens": 40})
+        agent = MarketResearchAgent(cache=LRUCache(), bedrock_client=client, retriever=retriever)
+
+        result = agent.analyze_market("Germany", "fintech", "chat_summary")
+
+        prompt = client.bodies[0]["messages"][0]["content"]
+        assert "de_market.pdf" in prompt and "neobanks" in prompt
+        assert prompt.index("neobanks") < prompt.index("summarize the fintech market in Germany")
+        assert "de_market.pdf" in [source["source"] for source in result["sources"]]
+        plain = MarketResearchAgent(bedrock_client=client)
+        assert agent.cache_key("Germany", "fintech") != plain.cache_key("Germany", "fintech")
+        assert f"+rag.{retriever.version}:" in agent.cache_key("Germany", "fintech")
+
+    def test_archive_is_unpacked_once(self, tmp_path):
+        """Test that a .tar.gz index (the notebook's S3 upload format) is unpacked once and reused"""
+        build_research_index(tmp_path / "market_research_vectorstore", HashingEmbedder())
+        archive = tmp_path / "store.tar.gz"
+        with tarfile.open(archive, "w:gz") as tar:
+            tar.add(tmp_path / "market_research_vectorstore", arcname="market_research_vectorstore")
+
+        first = fetch_index(str(archive), cache_dir=str(tmp_path / "cache"))
+        second = fetch_index(str(archive), cache_dir=str(tmp_path / "cache"))
+
+        assert first == second and first.endswith("market_research_vectorstore")
+        assert VectorIndex(first).count == len(RESEARCH_CORPUS)
+
+
+def research_documents(embedder, corpus=RESEARCH_CORPUS):
+    return [DocumentChunks(source, [text], embedder.embed([text]), {"source": source}) for text, source in corpus]
+
+
+class RacingStore(LocalObjectStore):
+    """Local store that runs another writer's commit during its first upload"""
+
+    def __init__(self, root, race):
+        super().__init__(root)
+        self.race = race
+
+    def upload(self, key, path):
+        race, self.race = self.race, None
+        if race is not None:
+            race()
+        super().upload(key, path)
+
+
+class TestVectorStore:
+    """Tests for the segmented, incrementally updated index"""
+
+    def test_commits_add_only_changed_segments_and_readers_hot_swap(self, tmp_path):
+        """Test that updates write one small segment and readers switch generations without reopening"""
+        embedder = HashingEmbedder()
+        store = LocalObjectStore(str(tmp_path / "store"))
+        writer = IndexWriter(store, embedding_model="local")
+        writer.commit(research_documents(embedder))
+        reader = SegmentedIndex(store, cache_dir=str(tmp_path / "cache"))
+        assert reader.refresh() is True and reader.refresh() is False
+        query = embedder.embed(["Kenya mobile money payments"])[0]
+        assert reader.search(query, 1)[0].metadata["source"] == "kenya.pdf"
+        first_id = reader.id
+
+        update = "Kenya fintech: mobile money and M-Pesa payments now face new central bank lending rules."
+        manifest = writer.commit([DocumentChunks("kenya.pdf", [update], embedder.embed([update]), {"source": "kenya.pdf"})],
+                                 deletions=["mongolia.pdf"], compact=False)
+
+        assert [segment["count"] for segment in manifest["segments"]] == [len(RESEARCH_CORPUS), 1]
+        assert manifest["segments"][0]["deleted"] == 2
+        assert reader.search(query, 1)[0].text.startswith("Kenya mobile money")  # Still the old generation
+        assert reader.refresh() is True and reader.id != first_id
+        hits = reader.search(query, len(RESEARCH_CORPUS))
+        assert hits[0].text == update
+        assert [hit.metadata["source"] for hit in hits].count("kenya.pdf") == 1
+        assert "mongolia.pdf" not in [hit.metadata["source"] for hit in hits]
+        assert reader.count == len(RESEARCH_CORPUS) - 1
+
+    def test_compaction_merges_segments_and_drops_deleted_chunks(self, tmp_path):
+        """Test that compaction keeps search results, clears tombstones and lets old segments be collected"""
+        embedder = HashingEmbedder()
+        store = LocalObjectStore(str(tmp_path / "store"))
+        writer = IndexWriter(store, embedding_model="local", max_segments=2)
+        for document in research_documents(embedder):
+            manifest = writer.commit([document])
+        writer.commit(deletions=["japan_health.pdf"], compact=False)
+        reader = SegmentedIndex(store, cache_dir=str(tmp_path / "cache"))
+        reader.refresh()
+        query = embedder.embed(["German fintech market"])[0]
+        before = [(hit.text, round(hit.score, 5)) for hit in reader.search(query, 3)]
+
+        manifest = writer.compact()
+        reader.refresh()
+
+        assert len(manifest["segments"]) == 1 and manifest["tombstones"] == {}
+        assert manifest["segments"][0]["count"] == len(RESEARCH_CORPUS) - 1
+        assert [(hit.text, round(hit.score, 5)) for hit in reader.search(query, 3)] == before
+        assert writer.collect_garbage(keep_manifests=1) > 0
+        assert {key.split("/")[1] for key in store.list("segments/")} == {manifest["segments"][0]["id"]}
+
+    def test_concurrent_writers_conflict(self, tmp_path):
+        """Test that a commit is refused if another writer published while it was uploading"""
+        documents = research_documents(HashingEmbedder())
+        first = IndexWriter(LocalObjectStore(str(tmp_path / "store")), embedding_model="local")
+        second = IndexWriter(RacingStore(str(tmp_path / "store"), lambda: first.commit(documents[:1])), embedding_model="local")
+
+        with pytest.raises(IndexConflictError):
+            second.commit(documents[1:2])
+        assert first.manifest()["generation"] == 1
+
+
+class RecordingEmbedder(HashingEmbedder):
+    """Deterministic embedder that records batch sizes and peak concurrency"""
+
+    def __init__(self, dimensions=256, delay=0.0):
+        super().__init__(dimensions)
+        self.delay = delay
+        self.batches = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        with self._lock:
+            self.batches.append(len(texts))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        try:
+            return super().embed(texts)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class ThrottledEmbedder(HashingEmbedder):
+    """Embeds one text per model call, like Titan, and refuses the calls numbered in ``refuse``"""
+
+    def __init__(self, refuse, dimensions=256):
+        super().__init__(dimensions)
+        self.refuse = set(refuse)
+        self.texts = []
+
+    def embed(self, texts):
+        rows = []
+        for text in texts:
+            if len(self.texts) + 1 in self.refuse:
+                self.refuse.discard(len(self.texts) + 1)
+                raise BedrockThrottledError("embedding throttled")
+            self.texts.append(text)
+            rows.append(query_vector(text, self.dimensions))
+        return np.stack(rows)
+
+
+class TestIngestion:
+    """Tests for the batched, cached ingestion pipeline"""
+
+    def test_splitter_prefers_paragraphs_and_overlaps(self):
+        """Test that chunks respect the size limit, break on paragraphs first and overlap when split mid-text"""
+        splitter = TextSplitter(chunk_size=100, chunk_overlap=20)
+        paragraphs = ["Germany fintech licensing is handled by BaFin.", "Kenya leads mobile money adoption."]
+
+        assert splitter.split("\n\n".join(paragraphs)) == ["\n\n".join(paragraphs)]
+        assert TextSplitter(chunk_size=50, chunk_overlap=10).split("\n\n".join(paragraphs)) == paragraphs
+        chunks = splitter.split("risk " * 80)
+        assert all(len(chunk) <= 100 for chunk in chunks)
+        assert chunks[0][-14:] == chunks[1][:14]
+
+    def test_reingestion_embeds_only_new_chunks(self, tmp_path):
+        """Test that unchanged documents are skipped and only new chunks reach the model"""
+        corpus = tmp_path / "docs"
+        corpus.mkdir()
+        for text, source in RESEARCH_CORPUS:
+            (corpus / source.replace(".pdf", ".txt")).write_text(f"{text}\n\n{text}")  # Repeated paragraph
+        embedder = RecordingEmbedder()
+        store = LocalObjectStore(str(tmp_path / "store"))
+        cache = EmbeddingCache(str(tmp_path / "embeddings.db"), "local")
+
+        def pipeline():
+            return IngestionPipeline(IndexWriter(store, embedding_model="local"), embedder.embed, cache,
+                                     TextSplitter(chunk_size=120, chunk_overlap=0))
+
+        first = pipeline().run(load_documents([str(corpus)], root=str(corpus)))
+        assert first["ingested"] == 5 and first["duplicate_chunks"] == 5 and first["embedded"] == 5
+
+        again = pipeline().run(load_documents([str(corpus)], root=str(corpus)))
+        assert again["unchanged"] == 5 and again["embedded"] == 0
+
+        (corpus / "kenya.txt").write_text(f"{RESEARCH_CORPUS[2][0]}\n\nSafaricom also offers micro-loans over M-Pesa.")
+        (corpus / "mongolia.txt").unlink()
+        changed = pipeline().run(load_documents([str(corpus)], root=str(corpus)), delete_missing=True)
+        assert changed["ingested"] == 1 and changed["cached"] == 1 and changed["embedded"] == 1
+        assert changed["deleted"] == 1
+
+        reader = SegmentedIndex(store, cache_dir=str(tmp_path / "cache"))
+        reader.refresh()
+        sources = [hit.metadata["source"] for hit in reader.search(embedder.embed(["micro-loans M-Pesa"])[0], 10)]
+        assert sources[0] == "kenya.txt" and "mongolia.txt" not in sources
+        assert len(cache) == 6
+
+    def test_embedding_requests_are_batched_with_bounded_concurrency(self, tmp_path):
+        """Test that chunks are embedded in batches with a cap on requests in flight, shared chunks once"""
+        embedder = RecordingEmbedder(delay=0.02)
+        pipeline = IngestionPipeline(IndexWriter(LocalObjectStore(str(tmp_path / "store")), embedding_model="local"),
+                                     embedder.embed, splitter=TextSplitter(chunk_size=40, chunk_overlap=0),
+                                     batch_size=3, max_concurrency=2)
+        documents = [SourceDocument(f"doc{i}", "\n\n".join(f"Doc {i} fact {j} about markets" for j in range(5)))
+                     for i in range(3)]
+        documents.append(SourceDocument("copy", documents[0].text))
+
+        stats = pipeline.run(documents)
+
+        assert stats["chunks"] == 20 and stats["embedded"] == 15
+        assert max(embedder.batches) <= 3 and sum(embedder.batches) == 15
+        assert embedder.peak == 2
+
+
+    def test_throttled_batch_is_retried_one_text_at_a_time(self, tmp_path, monkeypatch):
+        """Test that a throttle partway through a retry repeats only the refused text"""
+        monkeypatch.setattr("agents.ingestion.time.sleep", lambda seconds: None)
+        embedder = ThrottledEmbedder(refuse=[3, 5])
+        pipeline = IngestionPipeline(IndexWriter(LocalObjectStore(str(tmp_path / "store")), embedding_model="local"),
+                                     embedder.embed, splitter=TextSplitter(chunk_size=40, chunk_overlap=0),
+                                     batch_size=4, max_concurrency=1)
+        facts = [f"Fact {i} about markets" for i in range(4)]
+
+        stats = pipeline.run([SourceDocument("doc", "\n\n".join(facts))])
+
+        # The batch request got two texts in before the first refusal; after it, each text is sent once
+        assert stats["embedded"] == 4
+        assert embedder.texts == facts[:2] + facts
+
+        with pytest.raises(ValueError):
+            IngestionPipeline(pipeline.writer, embedder.embed, max_retries=0)
+
+class TestMetrics:
+    """Tests for the Prometheus instrumentation"""
+
+    def test_middleware_labels_requests_by_route_template(self):
+        """Test that request latency is recorded under the route template, not the raw path"""
+        prometheus_client = pytest.importorskip("prometheus_client")
+        from agents.metrics import PrometheusMiddleware
+
+        class Route:
+            path = "/api/v1/session/{session_id}"
+
+        async def app(scope, receive, send):
+            scope["route"] = Route()
+            await send({"type": "http.response.start", "status": 404})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            pass
+
+        scope = {"type": "http", "method": "GET", "path": "/api/v1/session/abc"}
+        asyncio.run(PrometheusMiddleware(app)(scope, None, send))
+
+        labels = {"method": "GET", "endpoint": "/api/v1/session/{session_id}", "status": "404"}
+        assert prometheus_client.REGISTRY.get_sample_value("market_research_http_request_duration_seconds_count", labels) == 1
+
+
+class TestTracing:
+    """Tests for request tracing spans"""
+
+    def test_spans_nest_across_tasks_and_executor_threads(self):
+        """Test that spans opened in gathered tasks and pool threads get the right parent"""
+        from agents.bedrock_executor import BedrockExecutor
+        from agents.tracing import span, start_trace
+
+        executor = BedrockExecutor(max_workers=2)
+
+        def blocking_call():
+            with span("bedrock.invoke_model"):
+                time.sleep(0.01)
+
+        async def agent(name):
+            with span(name):
+                await executor.run(blocking_call)
+
+        async def request():
+            with start_trace("POST /api/v1/chat") as root:
+                with span("orchestrator.comprehensive"):
+                    await asyncio.gather(agent("market_research"), agent("risk_assessment"))
+            return root
+
+        root = asyncio.run(request())
+        executor.shutdown()
+
+        spans = {s.span_id: s for s in root.trace.spans}
+        by_name = {}
+        for s in spans.values():
+            by_name.setdefault(s.name, []).append(s)
+        orchestrator = by_name["orchestrator.comprehensive"][0]
+        assert orchestrator.parent_id == root.span_id
+        assert {s.parent_id for s in by_name["market_research"] + by_name["risk_assessment"]} == {orchestrator.span_id}
+        assert {spans[s.parent_id].name for s in by_name["bedrock.invoke_model"]} == {"market_research", "risk_assessment"}
+
+    def test_untraced_requests_use_noop_span(self):
+        """Test that spans outside a trace cost nothing and record nothing"""
+        from agents.tracing import NOOP_SPAN, span
+
+        assert span("chat.parse_query") is NOOP_SPAN
+
+    def test_middleware_headers_and_file_export(self, tmp_path):
+        """Test the debug timing headers and the JSON lines exporter"""
+        from agents.tracing import JsonlTraceExporter, TracingMiddleware, span
+
+        async def app(scope, receive, send):
+            with span("chat.parse_query"):
+                pass
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        path = tmp_path / "traces.jsonl"
+        middleware = TracingMiddleware(app, exporter=JsonlTraceExporter(str(path)), response_headers=True)
+        asyncio.run(middleware({"type": "http", "method": "POST", "path": "/api/v1/chat"}, None, send))
+
+        headers = dict(sent[0]["headers"])
+        assert headers[b"server-timing"].startswith(b"total;dur=")
+        assert b"chat.parse_query;dur=" in headers[b"server-timing"]
+
+        for _ in range(100):
+            if path.exists() and path.read_text():
+                break
+            time.sleep(0.01)
+        trace = json.loads(path.read_text().splitlines()[0])
+        assert trace["trace_id"] == headers[b"x-trace-id"].decode()
+        assert {s["name"] for s in trace["spans"]} == {"chat.parse_query", "POST /api/v1/chat"}
+
+
+class TestEntityRegistry:
+    """Tests for the canonical country and industry registry"""
+
+    def test_aliases_and_codes_resolve_to_one_entity(self):
+        """Test that names, aliases and ISO codes in any case give the same canonical name and ID"""
+        registry = get_registry()
+
+        for text in ("United Kingdom", "UK", " britain ", "gb", "GBR"):
+            assert registry.canonical_country(text) == "United Kingdom"
+            assert registry.country_id(text) == "GB"
+        assert registry.canonical_industry("AI") == "artificial intelligence"
+        assert registry.industry_id("Fintech") == registry.industry_id("fintech")
+        assert registry.country("DE").iso3 == "DEU"
+        assert get_registry() is registry
+
+    def test_unknown_names_pass_through(self):
+        """Test that names outside the registry are tidied but kept"""
+        registry = get_registry()
+
+        assert registry.canonical_country("  Atlantis ") == "Atlantis"
+        assert registry.country_id("Atlantis") == "atlantis"
+        assert registry.canonical_industry("space  mining") == "space mining"
+
+    def test_every_country_has_unique_codes_and_a_region(self):
+        """Test that the built-in table has no clashing codes or aliases"""
+        registry = EntityRegistry()
+        # A term may repeat within one country ("USA" is a code and an alias), never across two
+        terms = [term for country in registry.countries
+                 for term in {t.lower() for t in (country.name, country.iso2, country.iso3) + country.aliases + country.demonyms}]
+
+        assert len(terms) == len(set(terms))
+        assert not set(terms) & {term.lower() for term in NON_COUNTRY_TERMS}
+        assert all(country.region in REGIONS for country in registry.countries)
+        assert sum(len(registry.region(region)) for region in REGIONS) == len(registry.countries)
+
+    def test_aliases_share_cache_keys_and_batch_items(self):
+        """Test that "UK" and "United Kingdom" are one cache entry and one batch item"""
+        pytest.importorskip("boto3")
+        from agents.market_research_agent import MarketResearchAgent
+
+        agent = MarketResearchAgent(bedrock_client=object())
+        assert agent.cache_key("UK", "Fintech") == agent.cache_key("United Kingdom", "fintech")
+        assert agent.cache_key("UK", "fintech") != agent.cache_key("Germany", "fintech")
+
+        unique, duplicates = dedupe_items([
+            ("UK", "fintech", "comprehensive"),
+            ("United Kingdom", "Fintech", "comprehensive"),
+            ("gb", "fintech", "quick"),
+        ])
+        assert unique == [("UK", "fintech", "comprehensive"), ("gb", "fintech", "quick")]
+        assert duplicates == 1
+
+    def test_demonyms_yield_to_country_names(self, chatbot):
+        """Test that a demonym names a country only when the query names none, and regions never do"""
+        assert chatbot.parse_query("Should I enter the Latin America e-commerce market?")["countries"] == []
+        assert chatbot.parse_query("We are a South American retailer, what about fintech in Kenya?")["countries"] == ["Kenya"]
+        assert chatbot.parse_query("We are a British retailer, what about fintech in Kenya?")["countries"] == ["Kenya"]
+        assert chatbot.parse_query("Is the Latin American fintech market risky?")["countries"] == []
+        assert chatbot.parse_query("What are the risks of entering the German fintech market?")["countries"] == ["Germany"]
+        assert get_registry().canonical_country("German") == "Germany"
+
+
+class TestBaselineScores:
+    """Tests for the precomputed deterministic score tables"""
+
+    def test_grid_matches_mock_answers(self):
+        """Test that one grid lookup gives the same figures as the per-pair mock analyses"""
+        pytest.importorskip("boto3")
+        from agents.baseline_scores import MARKET_SIZE_TABLE, RISK_SCORE_NAMES, RISK_TABLE, score_grid
+        from agents.market_research_agent import MarketResearchAgent
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        countries, industries = ["Germany", "Mongolia", "Atlantis"], ["fintech", "agriculture", "mining"]
+        grid = score_grid(countries, industries)
+        risk_agent, market_agent = RiskAssessmentAgent(bedrock_client=object()), MarketResearchAgent(bedrock_client=object())
+
+        assert grid["overall_risk_score"].shape == (3, 3)
+        for i, country in enumerate(countries):
+            for j, industry in enumerate(industries):
+                risk = risk_agent._assess_mock(country, industry)
+                market = market_agent._analyze_mock(country, industry)
+                assert round(float(grid["overall_risk_score"][i, j]), 1) == risk["overall_risk_score"]
+                for name in RISK_SCORE_NAMES:
+                    assert round(float(grid[name][i, j]), 1) == risk["risk_scores"][name]
+                assert grid["market_size"][i, j] == market["market_size"]
+                assert grid["growth_rate"][i, j] == market["growth_rate"]
+
+        assert risk_agent._assess_mock("Germany", "fintech")["overall_risk_score"] == 3.0
+        assert market_agent._analyze_mock("Japan", "technology")["market_size"] == 120000000000
+        assert not RISK_TABLE.flags.writeable and not MARKET_SIZE_TABLE.flags.writeable
+
+
+@pytest.fixture(scope="module")
+def chatbot():
+    pytest.importorskip("fastapi")
+    import main
+
+    return main.GlobalMarketResearchChatbot()
+
+
+class TestQueryParser:
+    """Tests for extracting intent, countries and industries from chat queries"""
+
+    def test_whole_word_matches(self, chatbot):
+        """Test that short names do not match inside longer ones"""
+        assert chatbot.parse_query("What are the risks in the UK?")["countries"] == ["United Kingdom"]
+        assert chatbot.parse_query("Ukraine fintech risks")["countries"] == ["Ukraine"]
+        assert chatbot.parse_query("Niger vs Nigeria")["countries"] == ["Niger", "Nigeria"]
+        assert chatbot.parse_query("Is Nigeria safe for fintech?")["countries"] == ["Nigeria"]
+
+    def test_multi_word_names(self, chatbot):
+        """Test that multi-word countries and industries are found as one entity"""
+        parsed = chatbot.parse_query("Market size of e-commerce in South Africa and New Zealand")
+
+        assert parsed["countries"] == ["South Africa", "New Zealand"]
+        assert parsed["industries"] == ["e-commerce"]
+
+    def test_aliases_resolve_but_two_letter_codes_do_not(self, chatbot):
+        """Test that aliases map to canonical names, while ISO codes that are also words are ignored"""
+        parsed = chatbot.parse_query("USA and Britain healthcare")
+
+        assert parsed["countries"] == ["United States", "United Kingdom"]
+        assert parsed["industries"] == ["healthcare"]
+        assert chatbot.parse_query("Is IT in DE risky?")["countries"] == []
+
+    def test_intent_precedence(self, chatbot):
+        """Test that the earliest intent in INTENT_PRIORITY wins when several match"""
+        assert chatbot.parse_query("Compare risks of India and Brazil")["intent"] == "comparison"
+        assert chatbot.parse_query("Is it safe to enter the Chinese market?")["intent"] == "risk_assessment"
+        assert chatbot.parse_query("Market opportunities if we expand to Chile")["intent"] == "market_research"
+        assert chatbot.parse_query("Should we expand to Chile?")["intent"] == "recommendation"
+        assert chatbot.parse_query("Tell me about Chile")["intent"] == "general"
+
+
+class TestSemanticChatCache:
+    """Tests for reusing chat answers across paraphrased questions"""
+
+    RISK = ("risk_assessment", ("Germany",), ("fintech",))
+
+    def test_same_parse_shares_an_entry(self):
+        """Test that any wording with the same parse hits, and other countries miss"""
+        from agents.semantic_cache import SemanticChatCache
+
+        cache = SemanticChatCache(LRUCache(), version="1")
+        cache.set("risks of German fintech", self.RISK, {"response_type": "risk_assessment", "country": "Germany"})
+
+        assert cache.get("Is fintech in Germany risky?", self.RISK) == (
+            {"response_type": "risk_assessment", "country": "Germany"}, "exact"
+        )
+        assert cache.get("risks of Japanese fintech", ("risk_assessment", ("Japan",), ("fintech",))) == (None, None)
+
+    def test_similar_wording_without_intent_keyword(self):
+        """Test the vector lookup: close enough wording with a general intent hits, other intents never do"""
+        from agents.semantic_cache import SemanticChatCache, query_vector
+
+        cache = SemanticChatCache(LRUCache(), version="1", threshold=0.6)
+        cache.set("fintech Germany risks outlook", self.RISK, {"response_type": "risk_assessment"})
+
+        general = ("general", ("Germany",), ("fintech",))
+        assert cache.get("fintech germany outlook", general) == ({"response_type": "risk_assessment"}, "similar")
+        assert cache.get("weather in Lisbon", general) == (None, None)
+        assert cache.get("fintech Germany outlook", ("market_research", ("Germany",), ("fintech",))) == (None, None)
+        assert cache.get("fintech Japan outlook", ("general", ("Japan",), ("fintech",))) == (None, None)
+        assert abs(float(query_vector("Risky fintech!") @ query_vector("risks fintech")) - 1.0) < 1e-6
+
+    def test_incomplete_answers_are_not_cached(self):
+        """Test that errors and partial analyses are never shared"""
+        from agents.semantic_cache import is_cacheable
+
+        assert is_cacheable({"response_type": "risk_assessment", "overall_risk_score": 4.0})
+        assert not is_cacheable({"response_type": "error", "message": "boom"})
+        assert not is_cacheable({"response_type": "comprehensive", "full_analysis": {"partial": True}})
+        assert not is_cacheable({"response_type": "comparison", "comparisons": [{"country": "Kenya", "error": "x"}]})
+        assert not is_cacheable({"response_type": "recommendation", "risk_assessment": {"overall_risk_score": 4.0, "source": "mock"}})
+        assert not is_cacheable({"response_type": "risk_assessment", "risk_score": None, "risk_level": None})
+        assert not is_cacheable({"response_type": "market_research", "market_size": None, "growth_rate": 8.0})
+        assert not is_cacheable({"response_type": "recommendation", "market_analysis": {"market_size": 1e9, "extraction": "none"}})
+
+    def test_mock_fallback_answers_are_not_cached(self, chatbot, monkeypatch):
+        """Test that a chat answer built from the mock fallback of a failing model is not shared"""
+        pytest.importorskip("boto3")
+        import main
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+        from agents.semantic_cache import SemanticChatCache
+
+        class FailingClient:
+            def invoke_model(self, modelId, body):
+                raise RuntimeError("model unavailable")
+
+        agent = RiskAssessmentAgent(cache=LRUCache(), bedrock_client=FailingClient())
+        monkeypatch.setattr(main, "risk_agent", agent)
+        monkeypatch.setattr(chatbot, "response_cache", SemanticChatCache(LRUCache(), version="1"))
+        query = "What are the risks of fintech in Kenya?"
+
+        response = asyncio.run(chatbot.handle_query(query))
+
+        assert response["response_type"] == "risk_assessment" and response["source"] == "mock"
+        assert chatbot.response_cache.get(query, ("risk_assessment", ("Kenya",), ("fintech",))) == (None, None)
+        assert agent.cache.stats()["entries"] == 0
+
+    def test_answers_without_figures_are_not_cached(self, chatbot, monkeypatch):
+        """Test that a chat answer whose model text held no risk scores is not shared"""
+        pytest.importorskip("boto3")
+        import main
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+        from agents.semantic_cache import SemanticChatCache
+
+        client = StubClient("Kenya's fintech sector is dynamic but hard to read.", {"input_tokens": 10, "output_tokens": 10})
+        monkeypatch.setattr(main, "risk_agent", RiskAssessmentAgent(cache=LRUCache(), bedrock_client=client))
+        monkeypatch.setattr(chatbot, "response_cache", SemanticChatCache(LRUCache(), version="1"))
+        query = "What are the risks of fintech in Kenya?"
+
+        response = asyncio.run(chatbot.handle_query(query))
+
+        assert response["response_type"] == "risk_assessment" and response["risk_score"] is None
+        assert chatbot.response_cache.get(query, ("risk_assessment", ("Kenya",), ("fintech",))) == (None, None)
+
+
+class FakeBatchAgent:
+    """Market and risk agent stand-in that fails for one country and can report cached results"""
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.bedrock_client = object()
+        self.calls = []
+
+    def cache_key(self, country, industry, analysis_type=None):
+        return f"{analysis_type}:{country.lower()}:{industry}"
+
+    async def comprehensive_risk_assessment_async(self, country, industry):
+        self.calls.append(country)
+        if country == "Atlantis":
+            raise RuntimeError("no data")
+        return {"overall_risk_score": 4.0}
+
+
+class TestBatchAnalyzer:
+    """Tests for bulk grid analyses"""
+
+    def test_dedupe_ignores_case_and_spaces(self):
+        """Test that repeated combinations collapse to their first spelling"""
+        items, duplicates = dedupe_items([("Kenya", "fintech", "risk"), (" kenya", "FINTECH", "risk"), ("Kenya", "fintech", "market")])
+
+        assert items == [("Kenya", "fintech", "risk"), ("Kenya", "fintech", "market")]
+        assert duplicates == 1
+
+    def test_cached_first_and_errors_per_item(self):
+        """Test that cached items are served first and a failing item does not stop the batch"""
+        cache = LRUCache()
+        agent = FakeBatchAgent(cache)
+        cache.set(agent.cache_key("Japan", "energy", "risk"), {"overall_risk_score": 3.0})
+        analyzer = BatchAnalyzer(market_agent=None, risk_agent=agent, orchestrator=None, max_concurrency=2)
+        items = [(country, "energy", "risk") for country in ("Kenya", "Atlantis", "Japan", "Chile", "kenya")]
+
+        async def collect():
+            return [event async for event in analyzer.run(items)]
+
+        events = asyncio.run(collect())
+
+        assert events[0] == {"event": "batch", "total": 5, "unique": 4, "duplicates": 1, "cached": 1}
+        assert events[1]["country"] == "Japan" and events[1]["cached"] is True
+        assert sorted(event["country"] for event in events[1:-1] if event["event"] == "result") == ["Chile", "Japan", "Kenya"]
+        assert [event["error"] for event in events if event["event"] == "error"] == ["no data"]
+        assert events[-1]["completed"] == 3 and events[-1]["failed"] == 1
+
+    def test_mock_mode_grid_is_read_in_one_lookup(self, monkeypatch):
+        """Test that mock-mode items come from one score_grid call and match the per-item answers"""
+        pytest.importorskip("boto3")
+        import agents.batch_analyzer as batch_analyzer
+        from agents.baseline_scores import score_grid
+        from agents.market_research_agent import MarketResearchAgent
+        from agents.multi_agent_orchestrator import MultiAgentOrchestrator
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        market_agent, risk_agent = MarketResearchAgent(bedrock_client=object()), RiskAssessmentAgent(bedrock_client=object())
+        market_agent.bedrock_client = risk_agent.bedrock_client = None
+        orchestrator = MultiAgentOrchestrator(market_agent=market_agent, risk_agent=risk_agent)
+        analyzer = BatchAnalyzer(market_agent, risk_agent, orchestrator)
+        grids = []
+        monkeypatch.setattr(batch_analyzer, "score_grid", lambda *axes: grids.append(axes) or score_grid(*axes))
+        items = [(country, industry, analysis_type) for country in ("Germany", "Mongolia", "Atlantis")
+                 for industry in ("fintech", "mining") for analysis_type in ("market", "risk", "comprehensive")]
+
+        async def collect():
+            events = [event async for event in analyzer.run(items)]
+            return events, [await analyzer.analyze(*item) for item in items]
+
+        events, expected = asyncio.run(collect())
+
+        assert grids == [(["Germany", "Mongolia", "Atlantis"], ["fintech", "mining"])]
+        results = {event["index"]: event["data"] for event in events if event["event"] == "result"}
+        assert len(results) == len(items) and events[-1]["failed"] == 0
+        for index, data in results.items():
+            if data["response_type"] == "comprehensive":
+                data = {**data, "analysis": {**data["analysis"], "analysis_timestamp": None}}
+                expected[index] = {**expected[index], "analysis": {**expected[index]["analysis"], "analysis_timestamp": None}}
+            assert data == expected[index]
@@ -47,6 +47,16 @@ class TestGlobalMarketResearchAPI:
         assert "timestamp" in data
         assert "supported_countries" in data
     
+    def test_metrics_endpoint(self):
+        """Test Prometheus metrics endpoint"""
+        requests.get(f"{self.base_url}/health")
+        response = requests.get(f"{self.base_url}/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        if "prometheus_client is not installed" not in response.text:
+            assert 'endpoint="/health"' in response.text
+    
     def test_root_endpoint(self):
         """Test root endpoint"""
         response = requests.get(f"{self.base_url}/")
@@ -157,6 +167,35 @@ class TestGlobalMarketResearchAPI:
         assert "comparisons" in response_data
         assert len(response_data["comparisons"]) >= 2
     
+    def test_chat_stream_endpoint(self):
+        """Test streaming chat endpoint emits parsed, delta and result events"""
+        payload = {
+            "query": "What are the risks of investing in Bangladesh healthcare?",
+            "session_id": "test_session_stream"
+        }
+        
+        response = requests.post(
+            f"{self.base_url}/api/v1/chat/stream",
+            headers=self.headers,
+            json=payload,
+            stream=True
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.iter_lines() if line]
+        
+        assert events[0]["event"] == "parsed"
+        assert events[0]["intent"] == "risk_assessment"
+        assert any(event["event"] == "delta" for event in events)
+        assert events[-1]["event"] == "result"
+        assert events[-1]["session_id"] == "test_session_stream"
+        
+        result = events[-1]["data"]
+        assert result["response_type"] == "risk_assessment"
+        assert result["country"] == "Bangladesh"
+        assert "risk_breakdown" in result
+    
     def test_analyze_endpoint_market(self):
         """Test analyze endpoint with market analysis"""
         payload = {
@@ -0,0 +1,86 @@
+"""
+Unit tests for the offline benchmark harness (no server or AWS access needed)
+"""
+
+import json
+import time
+
+import pytest
+
+from benchmarks.bedrock_stub import LatencyProfile, SimulatedBedrockClient, ThrottlingException
+from benchmarks.load import compare_to_baseline, percentile, summarize
+
+
+def request_body(max_tokens=1000):
+    return json.dumps({"max_tokens": max_tokens, "messages": [{"role": "user", "content": "x" * 400}]})
+
+
+class TestSimulatedBedrock:
+    """Tests for the simulated Bedrock client"""
+
+    def test_latency_follows_profile(self):
+        """Test that a call takes first-token time plus generation time and reports usage"""
+        profile = LatencyProfile(first_token_ms=40, first_token_sigma=0, tokens_per_second=1000,
+                                 tokens_per_second_stddev=0, min_output_tokens=50, output_fill=0.05)
+        client = SimulatedBedrockClient(profile)
+
+        start = time.perf_counter()
+        response = json.loads(client.invoke_model(modelId="model", body=request_body())["body"].read())
+        elapsed = time.perf_counter() - start
+
+        assert response["usage"] == {"input_tokens": 100, "output_tokens": 50}
+        assert 0.09 <= elapsed < 0.5
+        assert "```json" in response["content"][0]["text"]
+
+    def test_seeded_draws_repeat(self):
+        """Test that the same seed reproduces the same latencies and token counts"""
+        draws = [SimulatedBedrockClient(LatencyProfile(), seed=3)._draw(request_body()) for _ in range(2)]
+
+        assert draws[0] == draws[1]
+
+    def test_stream_and_errors(self):
+        """Test that streamed answers carry usage events and the error rate raises throttling"""
+        profile = LatencyProfile(first_token_ms=1, time_scale=0.001)
+        events = SimulatedBedrockClient(profile, chunks=4).invoke_model_with_response_stream(modelId="model", body=request_body())["body"]
+        types = [json.loads(event["chunk"]["bytes"])["type"] for event in events]
+
+        assert types[0] == "message_start" and types[-2:] == ["message_delta", "message_stop"]
+        assert types.count("content_block_delta") == 4
+        with pytest.raises(ThrottlingException):
+            SimulatedBedrockClient(LatencyProfile(error_rate=1.0, time_scale=0.001)).invoke_model(modelId="model", body=request_body())
+
+    def test_agent_parses_simulated_answer(self):
+        """Test that the agents extract structured fields from the simulated answer"""
+        pytest.importorskip("boto3")
+        from agents.risk_assessment_agent import RiskAssessmentAgent
+
+        client = SimulatedBedrockClient(LatencyProfile(time_scale=0.001))
+        result = RiskAssessmentAgent(bedrock_client=client).comprehensive_risk_assessment("Kenya", "fintech")
+
+        assert result["overall_risk_score"] == 5.2
+        assert result["extraction"] == "json"
+
+
+class TestLoadReport:
+    """Tests for the load summary and baseline comparison"""
+
+    def test_percentiles(self):
+        """Test interpolated percentiles and the summary layout"""
+        values = [i / 1000 for i in range(1, 101)]
+        summary = summarize(values, errors=2, elapsed=2.0, lags=[0.001, 0.002])
+
+        assert percentile(sorted(values), 50) == pytest.approx(0.0505)
+        assert summary["requests"] == 102
+        assert summary["throughput_rps"] == 50.0
+        assert summary["latency_ms"]["p99"] == pytest.approx(99.01)
+
+    def test_regressions_beyond_tolerance(self):
+        """Test that only changes larger than the tolerance are reported"""
+        run = summarize([0.1] * 10, errors=0, elapsed=1.0, lags=[0.0005])
+        baseline = {"results": {"chat": {"16": run}}}
+        slower = summarize([0.13] * 10, errors=0, elapsed=1.3, lags=[0.0008])
+
+        assert compare_to_baseline({"results": {"chat": {"16": run}}}, baseline) == []
+        assert compare_to_baseline({"results": {"chat": {"16": summarize([0.11] * 10, 0, 1.1, [0.0009])}}}, baseline) == []
+        regressions = compare_to_baseline({"results": {"chat": {"16": slower}, "compare": {"1": slower}}}, baseline)
+        assert [line.split(":")[0] for line in regressions] == ["chat @ 16"] * 3
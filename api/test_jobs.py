@@ -0,0 +1,271 @@
+"""
+Unit tests for the background job queue
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from jobs import (CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, InMemoryJobStore, JobRunner, QueueFullError,
+                  SQLiteJobStore, new_job)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+
+class TestJobStore:
+    """Tests shared by both job stores"""
+
+    def test_claims_by_priority_then_age(self, store):
+        """Test that higher priorities run first and equal priorities in submission order"""
+        for name, priority in [("low", 0), ("high", 5), ("low-later", 0)]:
+            store.create(new_job("analyze", {"name": name}, priority))
+            time.sleep(0.001)
+
+        claimed = [store.claim_next(lease=60)["params"]["name"] for _ in range(3)]
+
+        assert claimed == ["high", "low", "low-later"]
+        assert store.claim_next(lease=60) is None
+
+    def test_cancel_and_finish(self, store):
+        """Test that a cancelled job is never claimed and a cancelled running job cannot be finished"""
+        queued = new_job("analyze", {})
+        running = new_job("analyze", {})
+        store.create(queued)
+        store.create(running)
+        assert store.cancel(queued["job_id"]) is True
+        claimed = store.claim_next(lease=60)
+        assert claimed["job_id"] == running["job_id"] and claimed["status"] == RUNNING
+
+        assert store.renew(running["job_id"], 60, {"completed": 1, "total": 2}) == RUNNING
+        assert store.cancel(running["job_id"]) is True
+        assert store.finish(running["job_id"], SUCCEEDED, result={"x": 1}) is False
+        assert store.get(running["job_id"])["progress"] == {"completed": 1, "total": 2}
+        assert store.get(queued["job_id"])["status"] == CANCELLED
+        assert store.cancel(queued["job_id"]) is False
+        assert store.queued() == 0
+
+    def test_requeued_job_waits_out_its_delay(self, store):
+        """Test that a job requeued with a delay is not claimed again before the delay has passed"""
+        job = new_job("analyze", {})
+        store.create(job)
+        store.claim_next(lease=60)
+
+        assert store.requeue(job["job_id"], delay=0.2) is True
+        assert store.get(job["job_id"])["status"] == QUEUED
+        assert store.claim_next(lease=60) is None
+        time.sleep(0.25)
+        claimed = store.claim_next(lease=60)
+        assert claimed["job_id"] == job["job_id"] and claimed["attempts"] == 2
+
+    def test_purge_keeps_unfinished_jobs(self, store):
+        """Test that purging drops finished jobs only"""
+        done, waiting = new_job("analyze", {}), new_job("analyze", {})
+        store.create(done)
+        store.claim_next(lease=60)
+        store.finish(done["job_id"], SUCCEEDED, result={"ok": True})
+        store.create(waiting)
+
+        store.purge(time.time() + 1)
+
+        assert store.get(done["job_id"]) is None
+        assert store.get(waiting["job_id"])["status"] == QUEUED
+
+
+class TestSQLiteJobStore:
+    """Tests for the job store shared between worker processes"""
+
+    def test_expired_lease_is_claimed_again(self, tmp_path):
+        """Test that a job whose worker stopped renewing is picked up by another worker"""
+        path = str(tmp_path / "jobs.db")
+        first, second = SQLiteJobStore(path), SQLiteJobStore(path)
+        job = new_job("compare", {"countries": ["Kenya"]})
+        first.create(job)
+
+        assert first.claim_next(lease=0.05)["attempts"] == 1
+        assert second.claim_next(lease=60) is None
+        time.sleep(0.06)
+        reclaimed = second.claim_next(lease=60)
+
+        assert reclaimed["job_id"] == job["job_id"]
+        assert reclaimed["attempts"] == 2
+        assert reclaimed["params"] == {"countries": ["Kenya"]}
+
+
+class TestJobRunner:
+    """Tests for running jobs in the background"""
+
+    def test_runs_jobs_and_records_outcomes(self):
+        """Test success with progress, handler failure and the queue limit"""
+        async def analyze(params, progress):
+            progress(1, 2)
+            await asyncio.sleep(0.01)
+            progress(2, 2)
+            return {"country": params["country"]}
+
+        async def broken(params, progress):
+            raise RuntimeError("model unavailable")
+
+        runner = JobRunner(InMemoryJobStore(), {"analyze": analyze, "broken": broken}, workers=2, max_queued=2,
+                           poll_interval=0.01)
+
+        async def scenario():
+            runner.start()
+            ok = runner.submit("analyze", {"country": "Kenya"})
+            failing = runner.submit("broken", {})
+            for _ in range(100):
+                if all(runner.store.get(job["job_id"])["status"] in (SUCCEEDED, FAILED) for job in (ok, failing)):
+                    break
+                await asyncio.sleep(0.01)
+            await runner.stop()
+            return runner.store.get(ok["job_id"]), runner.store.get(failing["job_id"])
+
+        ok, failing = asyncio.run(scenario())
+
+        assert ok["status"] == SUCCEEDED and ok["result"] == {"country": "Kenya"}
+        assert ok["progress"] == {"completed": 2, "total": 2}
+        assert failing["status"] == FAILED and failing["error"] == "model unavailable"
+        with pytest.raises(ValueError):
+            runner.submit("unknown", {})
+        runner.submit("analyze", {"country": "Chile"})
+        runner.submit("analyze", {"country": "Peru"})
+        with pytest.raises(QueueFullError):
+            runner.submit("analyze", {"country": "Ghana"})
+
+    def test_cancel_stops_running_job(self):
+        """Test that cancelling a running job stops its handler"""
+        stopped = []
+
+        async def slow(params, progress):
+            try:
+                await asyncio.sleep(10)
+            finally:
+                stopped.append(True)
+
+        runner = JobRunner(InMemoryJobStore(), {"slow": slow}, workers=1, lease=0.03, poll_interval=0.01)
+
+        async def scenario():
+            runner.start()
+            job = runner.submit("slow", {})
+            await asyncio.sleep(0.02)
+            runner.store.cancel(job["job_id"])
+            await asyncio.sleep(0.05)
+            await runner.stop()
+            return runner.store.get(job["job_id"])
+
+        job = asyncio.run(scenario())
+
+        assert job["status"] == CANCELLED
+        assert stopped == [True]
+
+    def test_retryable_failure_is_requeued(self):
+        """Test that a retry_on exception sends the job back to the queue until max_attempts"""
+        class Busy(Exception):
+            retry_after = 0.01
+
+        calls = []
+
+        async def flaky(params, progress):
+            calls.append(True)
+            if len(calls) < 2:
+                raise Busy("throttled")
+            return {"attempt": len(calls)}
+
+        async def always_busy(params, progress):
+            raise Busy("still throttled")
+
+        runner = JobRunner(InMemoryJobStore(), {"flaky": flaky, "busy": always_busy}, workers=1, max_attempts=2,
+                           poll_interval=0.01, retry_on=(Busy,))
+
+        async def scenario():
+            runner.start()
+            jobs = [runner.submit("flaky", {}), runner.submit("busy", {})]
+            for _ in range(200):
+                if all(runner.store.get(job["job_id"])["status"] in (SUCCEEDED, FAILED) for job in jobs):
+                    break
+                await asyncio.sleep(0.01)
+            await runner.stop()
+            return [runner.store.get(job["job_id"]) for job in jobs]
+
+        recovered, exhausted = asyncio.run(scenario())
+
+        assert recovered["status"] == SUCCEEDED and recovered["result"] == {"attempt": 2}
+        assert recovered["attempts"] == 2
+        assert exhausted["status"] == FAILED and exhausted["error"] == "still throttled"
+        assert exhausted["attempts"] == 2
+
+    def test_retry_after_holds_for_every_worker(self, tmp_path):
+        """Test that a throttled job is not picked up by another worker before its retry_after"""
+        class Busy(Exception):
+            retry_after = 0.3
+
+        started = []
+
+        async def throttled_once(params, progress):
+            started.append(time.monotonic())
+            if len(started) == 1:
+                raise Busy("throttled")
+            return {"attempt": len(started)}
+
+        path = str(tmp_path / "jobs.db")
+        runners = [JobRunner(SQLiteJobStore(path), {"analyze": throttled_once}, workers=1, poll_interval=0.01,
+                             retry_on=(Busy,)) for _ in range(2)]
+
+        async def scenario():
+            for runner in runners:
+                runner.start()
+            job = await runners[0].submit_async("analyze", {})
+            for _ in range(200):
+                finished = await runners[1].get_job(job["job_id"])
+                if finished["status"] == SUCCEEDED:
+                    break
+                await asyncio.sleep(0.01)
+            for runner in runners:
+                await runner.stop()
+            return finished
+
+        assert asyncio.run(scenario())["result"] == {"attempt": 2}
+        assert started[1] - started[0] >= 0.3
+
+    def test_sqlite_calls_run_off_the_event_loop(self, tmp_path):
+        """Test that a SQLite-backed runner never touches the database from the event loop thread"""
+        loop_thread = threading.current_thread()
+        callers = set()
+
+        class RecordingStore(SQLiteJobStore):
+            def claim_next(self, lease):
+                callers.add(threading.current_thread())
+                return super().claim_next(lease)
+
+            def finish(self, job_id, status, result=None, error=None):
+                callers.add(threading.current_thread())
+                return super().finish(job_id, status, result, error)
+
+            def create(self, job):
+                callers.add(threading.current_thread())
+                super().create(job)
+
+        async def analyze(params, progress):
+            return {"country": params["country"]}
+
+        runner = JobRunner(RecordingStore(str(tmp_path / "jobs.db")), {"analyze": analyze}, workers=1, poll_interval=0.01)
+
+        async def scenario():
+            runner.start()
+            job = await runner.submit_async("analyze", {"country": "Kenya"})
+            for _ in range(100):
+                finished = await runner.get_job(job["job_id"])
+                if finished["status"] == SUCCEEDED:
+                    break
+                await asyncio.sleep(0.01)
+            await runner.stop()
+            return finished
+
+        assert asyncio.run(scenario())["result"] == {"country": "Kenya"}
+        assert callers and loop_thread not in callers
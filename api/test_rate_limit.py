@@ -0,0 +1,85 @@
+"""
+Unit tests for per-token rate limiting
+"""
+
+import time
+
+from rate_limit import RedisTokenBucketLimiter, TokenBucketLimiter, bucket_key, create_rate_limiter, retry_after_header
+
+
+class FakeScriptRedis:
+    """Redis stand-in whose token bucket script returns canned replies"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def register_script(self, source):
+        def script(keys, args):
+            self.calls.append((keys, args))
+            reply = self.replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        return script
+
+
+class TestTokenBucketLimiter:
+    """Tests for the per-process token bucket"""
+
+    def test_burst_then_refill(self):
+        """Test that a spent bucket refuses with a wait and refills over time"""
+        limiter = TokenBucketLimiter(rate=100.0, burst=2)
+
+        assert limiter.acquire("a") == (True, 0.0)
+        assert limiter.acquire("a") == (True, 0.0)
+        allowed, wait = limiter.acquire("a")
+        assert allowed is False and 0 < wait <= 0.01
+        assert limiter.acquire("b")[0] is True
+
+        time.sleep(0.02)
+        assert limiter.acquire("a")[0] is True
+
+    def test_least_recently_used_buckets_are_dropped(self):
+        """Test that the number of buckets stays bounded"""
+        limiter = TokenBucketLimiter(rate=1.0, burst=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.acquire(key)
+
+        assert limiter.stats()["keys"] == 2
+        assert limiter.acquire("a")[0] is True  # Evicted, so it starts full again
+        assert limiter.acquire("c")[0] is False
+
+    def test_config_sets_rate_and_burst(self):
+        """Test that requests per window become a per-second refill rate"""
+        limiter = create_rate_limiter(requests=120, window=60, burst=10)
+
+        assert isinstance(limiter, TokenBucketLimiter)
+        assert limiter.rate == 2.0 and limiter.burst == 10
+        assert create_rate_limiter(requests=5, window=1).burst == 5
+        assert retry_after_header(0.2) == "1" and retry_after_header(2.5) == "3"
+
+
+class TestRedisTokenBucketLimiter:
+    """Tests for the limiter shared through Redis"""
+
+    def test_script_reply_and_hashed_key(self):
+        """Test that the script's reply is turned into a decision and tokens are not stored raw"""
+        client = FakeScriptRedis([[1, "4.0"], [0, "0.5"]])
+        limiter = RedisTokenBucketLimiter("redis://unused", rate=0.5, burst=5, client=client)
+
+        assert limiter.acquire(bucket_key("demo_secret")) == (True, 0.0)
+        assert limiter.acquire(bucket_key("demo_secret")) == (False, 1.0)
+        keys, args = client.calls[0]
+        assert "demo_secret" not in keys[0] and keys[0].startswith("mra:ratelimit:")
+        assert args[:2] == [0.5, 5]
+
+    def test_falls_back_to_local_buckets_when_redis_is_down(self):
+        """Test that an unreachable Redis limits per worker instead of refusing requests"""
+        client = FakeScriptRedis([ConnectionError("redis down")])
+        limiter = RedisTokenBucketLimiter("redis://unused", rate=0.001, burst=1, client=client)
+
+        assert limiter.acquire("k")[0] is True
+        assert limiter.acquire("k")[0] is False
+        assert len(client.calls) == 1
+        assert limiter.stats()["remote_available"] is False
@@ -0,0 +1,88 @@
+"""
+Unit tests for chat session storage
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from session_store import InMemorySessionStore, SQLiteSessionStore, sqlite_path_from_url
+
+PARSED = {"intent": "risk_assessment", "countries": ["Germany"], "industries": ["fintech"], "original_query": "q"}
+
+
+class TestInMemorySessionStore:
+    """Tests for the per-process session store"""
+
+    def test_turn_cap_keeps_latest_turns(self):
+        """Test that only the most recent turns are kept"""
+        store = InMemorySessionStore(max_turns=3)
+        for i in range(5):
+            store.add_turn("s1", f"query {i}", PARSED)
+
+        history = store.get_history("s1")
+        assert [turn["user_query"] for turn in history] == ["query 2", "query 3", "query 4"]
+        assert history[0]["parsed"] == {"intent": "risk_assessment", "countries": ["Germany"], "industries": ["fintech"]}
+
+    def test_idle_sessions_expire(self):
+        """Test that idle sessions are dropped after the TTL"""
+        store = InMemorySessionStore(idle_ttl=0.01)
+        store.add_turn("s1", "query", PARSED)
+        time.sleep(0.02)
+
+        assert store.get_history("s1") is None
+        assert len(store) == 0
+
+    def test_memory_budget_evicts_least_recent_session(self):
+        """Test that the memory budget evicts the least recently used session"""
+        store = InMemorySessionStore(memory_budget=2000)
+        store.add_turn("old", "x" * 500, PARSED)
+        store.add_turn("recent", "y" * 500, PARSED)
+        store.add_turn("new", "z" * 500, PARSED)
+
+        assert store.get_history("old") is None
+        assert store.get_history("new") is not None
+        assert store.stats()["estimated_bytes"] <= 2000
+
+
+class TestSQLiteSessionStore:
+    """Tests for the SQLite session store shared by workers"""
+
+    def test_history_visible_to_other_store_instances(self, tmp_path):
+        """Test that a second worker sees sessions written by the first"""
+        path = str(tmp_path / "sessions.db")
+        writer = SQLiteSessionStore(path, max_turns=2)
+        reader = SQLiteSessionStore(path, max_turns=2)
+        for i in range(3):
+            writer.add_turn("s1", f"query {i}", PARSED)
+
+        history = reader.get_history("s1")
+        assert [turn["user_query"] for turn in history] == ["query 1", "query 2"]
+        assert reader.get_history("missing") is None
+
+    def test_async_calls_run_off_the_event_loop(self, tmp_path):
+        """Test that coroutines reach SQLite from a worker thread"""
+        threads = []
+
+        class RecordingStore(SQLiteSessionStore):
+            def add_turn(self, session_id, query, parsed):
+                threads.append(threading.current_thread())
+                super().add_turn(session_id, query, parsed)
+
+        store = RecordingStore(str(tmp_path / "sessions.db"))
+
+        async def round_trip():
+            await store.add_turn_async("s1", "query", PARSED)
+            return await store.get_history_async("s1")
+
+        assert [turn["user_query"] for turn in asyncio.run(round_trip())] == ["query"]
+        assert threads and threads[0] is not threading.main_thread()
+        assert not InMemorySessionStore.blocking
+
+    def test_database_url_parsing(self):
+        """Test that only sqlite URLs are accepted"""
+        assert sqlite_path_from_url("sqlite:///./market_research.db") == "./market_research.db"
+        with pytest.raises(ValueError):
+            sqlite_path_from_url("postgresql://localhost/db")
@@ -0,0 +1,128 @@
+"""
+Unit tests for the server startup helpers
+"""
+
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("uvicorn")
+
+import start_server
+from config import settings
+
+API_DIR = Path(__file__).parent
+
+
+@pytest.fixture
+def production(monkeypatch):
+    """Production mode with four workers, Redis, SQLite sessions and SQLite jobs"""
+    monkeypatch.setattr(settings, "SERVER_MODE", "production")
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "SESSION_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "JOB_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://redis:6379/0")
+    return monkeypatch
+
+
+class TestGunicornOptions:
+    """Tests for the embedded gunicorn configuration"""
+
+    def test_options_follow_settings(self, production):
+        """Test that bind address, worker count and limits come from config.Settings"""
+        production.setattr(settings, "HOST", "0.0.0.0")
+        production.setattr(settings, "PORT", 9000)
+        production.setattr(settings, "LOG_LEVEL", "WARNING")
+
+        options = start_server.gunicorn_options()
+
+        assert options["bind"] == "0.0.0.0:9000"
+        assert options["workers"] == 4
+        assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+        assert options["timeout"] == settings.GUNICORN_TIMEOUT
+        assert options["max_requests"] == settings.GUNICORN_MAX_REQUESTS
+        assert options["loglevel"] == "warning"
+        assert options["child_exit"] is start_server.on_child_exit
+
+
+class TestSharedStateCheck:
+    """Tests for the multi-worker shared state warnings"""
+
+    def test_shared_backends_do_not_warn(self, production, caplog):
+        """Test that Redis, SQLite sessions and SQLite jobs satisfy the check"""
+        with caplog.at_level(logging.WARNING):
+            start_server.check_shared_state()
+
+        assert caplog.records == []
+
+    def test_per_process_state_warns(self, production, caplog):
+        """Test that in-memory sessions, in-memory jobs and a missing REDIS_URL are all reported"""
+        production.setattr(settings, "SESSION_BACKEND", "memory")
+        production.setattr(settings, "JOB_BACKEND", "memory")
+        production.setattr(settings, "REDIS_URL", None)
+
+        with caplog.at_level(logging.WARNING):
+            start_server.check_shared_state()
+
+        messages = [record.getMessage() for record in caplog.records]
+        assert len(messages) == 3
+        assert "SESSION_BACKEND=memory" in messages[0]
+        assert "JOB_BACKEND=memory" in messages[1]
+        assert "REDIS_URL is not set" in messages[2]
+
+    def test_single_worker_is_not_checked(self, production, caplog):
+        """Test that one worker, or development mode, never warns"""
+        production.setattr(settings, "SESSION_BACKEND", "memory")
+        production.setattr(settings, "JOB_BACKEND", "memory")
+        production.setattr(settings, "REDIS_URL", None)
+
+        with caplog.at_level(logging.WARNING):
+            production.setattr(settings, "WEB_CONCURRENCY", 1)
+            start_server.check_shared_state()
+            production.setattr(settings, "WEB_CONCURRENCY", 4)
+            production.setattr(settings, "SERVER_MODE", "development")
+            start_server.check_shared_state()
+
+        assert caplog.records == []
+
+
+def start_production(tmp_path, run_production):
+    """Run start_server.main() in production mode in a fresh process, with ``run_production`` standing in for gunicorn"""
+    env = dict(os.environ, SERVER_MODE="production", WEB_CONCURRENCY="2", DEBUG="true",
+               PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "prometheus_multiproc"),
+               PYTHONPATH=os.pathsep.join(filter(None, [str(API_DIR), os.getenv("PYTHONPATH")])))
+    script = (
+        "import sys\n"
+        "import start_server\n"
+        "start_server.check_aws_credentials = lambda: False\n"
+        "def run_production():\n"
+        f"    {run_production}\n"
+        "start_server.run_production = run_production\n"
+        "start_server.main()\n"
+    )
+    return subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+class TestProductionStartup:
+    """Tests for main() in production mode"""
+
+    def test_metrics_dir_is_created_before_the_app_is_imported(self, tmp_path):
+        """Test that a PROMETHEUS_MULTIPROC_DIR that does not exist yet does not stop the app from loading"""
+        # A worker imports the app once the master has started
+        result = start_production(tmp_path, "from main import app; print('loaded', app.title)")
+
+        assert result.returncode == 0, result.stderr
+        assert "loaded" in result.stdout
+        assert (tmp_path / "prometheus_multiproc").is_dir()
+
+    def test_master_leaves_loading_the_app_to_gunicorn(self, tmp_path):
+        """Test that the app is not imported before gunicorn starts, so GUNICORN_PRELOAD decides where it is"""
+        result = start_production(tmp_path, "print('imported' if 'main' in sys.modules else 'not imported')")
+
+        assert result.returncode == 0, result.stderr
+        assert "not imported" in result.stdout